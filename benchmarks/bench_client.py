@@ -0,0 +1,192 @@
+#!/usr/bin/python
+"""
+Micro-benchmarks for the request signing and response parsing hot paths
+in duo_client.client.
+
+Results are written as JSON so runs can be compared across releases:
+
+    python benchmarks/bench_client.py --output before.json
+    python benchmarks/bench_client.py --output after.json
+
+Synthetic inputs are generated from a fixed seed, so every run measures
+the same data.
+"""
+
+import argparse
+import base64
+import json
+import os
+import platform
+import random
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import duo_client
+from duo_client import client
+
+IKEY = 'DIXXXXXXXXXXXXXXXXXX'
+SKEY = 'gtdfxv9YgVBYcF6dl2Eq17KUQJN2PLM2ODVTkvoT'
+HOST = 'api-xxxxxxxx.duosecurity.com'
+DATE = 'Fri, 07 Dec 2012 17:18:00 -0000'
+
+RESPONSE_SIZES = (1, 100, 1000, 10000, 100000)
+
+
+def unicode_text(rng, length):
+    return u''.join(unichr(rng.randint(0xa0, 0xd7ff)) for _ in range(length))
+
+
+def make_param_sets(rng):
+    """
+    Return a dict of named, realistic request parameter sets.
+    """
+    pushinfo = '&'.join('field%d=%s' % (i, 'x' * rng.randint(10, 60))
+                        for i in range(40))
+    logo = base64.b64encode(
+        ''.join(chr(rng.randint(0, 255)) for _ in range(256 * 1024)))
+    return {
+        'ping': {},
+        'add_user': {
+            'username': 'jdoe',
+            'realname': 'John Doe',
+            'status': 'active',
+            'notes': 'Created by provisioning',
+        },
+        'unicode_user': {
+            u'username': unicode_text(rng, 12),
+            u'realname': unicode_text(rng, 24),
+            u'notes': unicode_text(rng, 200),
+        },
+        'auth_push': {
+            'factor': 'push',
+            'username': 'jdoe',
+            'device': 'auto',
+            'async': '1',
+            'ipaddr': '192.0.2.10',
+            'pushinfo': pushinfo,
+        },
+        'update_logo': {
+            'logo': logo,
+        },
+    }
+
+
+def make_response(rng, count):
+    """
+    Return a JSON body listing count authentication log events.
+    """
+    events = []
+    for i in range(count):
+        events.append({
+            'timestamp': 1350000000 + i,
+            'username': 'user%06d' % rng.randint(0, 200000),
+            'factor': rng.choice(['Duo Push', 'Passcode', 'Phone Call']),
+            'result': rng.choice(['SUCCESS', 'FAILURE', 'ERROR']),
+            'ip': '198.51.100.%d' % rng.randint(1, 254),
+            'integration': 'Integration %d' % rng.randint(1, 20),
+        })
+    return json.dumps({'stat': 'OK', 'response': events})
+
+
+class FakeResponse(object):
+    status = 200
+    reason = 'OK'
+
+
+def measure(func, repeat, min_time):
+    """
+    Return (iterations, per-call timings in seconds over repeat runs).
+    """
+    timer = timeit.Timer(func)
+    number = 1
+    while True:
+        if timer.timeit(number) >= min_time:
+            break
+        number *= 2
+    timings = [t / number for t in timer.repeat(repeat, number)]
+    return (number, timings)
+
+
+def benchmarks(rng, max_objects):
+    """
+    Yield (name, case, callable) for every benchmark.
+    """
+    param_sets = make_param_sets(rng)
+    signer = client.Signer(IKEY, SKEY)
+    for (case, params) in sorted(param_sets.items()):
+        encoded = client.encode_params(params)
+        yield ('encode_params', case,
+               lambda p=params: client.encode_params(p))
+        yield ('canon_params', case,
+               lambda p=encoded: client.canon_params(p))
+        yield ('canonicalize', case,
+               lambda p=encoded: client.canonicalize(
+                   'POST', HOST, '/admin/v1/users', p, DATE, 2))
+        yield ('sign', case,
+               lambda p=encoded: client.sign(
+                   IKEY, SKEY, 'POST', HOST, '/admin/v1/users', DATE, 2, p))
+        yield ('Signer.sign', case,
+               lambda p=encoded: signer.sign(
+                   'POST', HOST, '/admin/v1/users', DATE, 2, p))
+
+    api = duo_client.Admin(IKEY, SKEY, HOST)
+    for count in RESPONSE_SIZES:
+        if count > max_objects:
+            continue
+        data = make_response(rng, count)
+        yield ('parse_json_response', '%d_objects' % count,
+               lambda d=data: api.parse_json_response(FakeResponse(), d))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--output', default='-',
+                        help='File to write JSON results to (default: stdout)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Timing runs per benchmark (default: 5)')
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help='Minimum seconds per timing run (default: 0.2)')
+    parser.add_argument('--max-objects', type=int, default=max(RESPONSE_SIZES),
+                        help='Largest response size to parse')
+    parser.add_argument('--filter', default='',
+                        help='Only run benchmarks whose name contains this')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    results = []
+    for (name, case, func) in benchmarks(rng, args.max_objects):
+        if args.filter not in name:
+            continue
+        (iterations, timings) = measure(func, args.repeat, args.min_time)
+        results.append({
+            'name': name,
+            'case': case,
+            'iterations': iterations,
+            'best_us': min(timings) * 1e6,
+            'mean_us': sum(timings) / len(timings) * 1e6,
+        })
+        sys.stderr.write('%-20s %-20s %12.2f us\n'
+                         % (name, case, min(timings) * 1e6))
+
+    report = {
+        'timestamp': int(time.time()),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'results': results,
+    }
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/python
+"""
+Drive duo_client against a Duo API host and report throughput and
+latency percentiles as JSON.
+
+By default an in-process mock server (see mock_server.py) is started,
+so no Duo account is needed:
+
+    python benchmarks/loadgen.py --operation preauth --threads 16 \\
+        --duration 30 --latency 0.01
+
+Use --host/--ikey/--skey/--ca to run against another server instead.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import duo_client
+from duo_client.auth_v1 import AuthV1
+from duo_client.ratelimit import RetryPolicy
+from duo_client.ratelimit import TokenBucket
+
+import mock_server
+
+# operation name -> (client class, function calling the client)
+OPERATIONS = {
+    'ping': (duo_client.Auth, lambda c, i: c.ping()),
+    'check': (duo_client.Auth, lambda c, i: c.check()),
+    'preauth': (duo_client.Auth,
+                lambda c, i: c.preauth(username='user%06d' % (i % 1000))),
+    'auth_v1_ping': (AuthV1, lambda c, i: c.ping()),
+    'verify_sms': (duo_client.Verify,
+                   lambda c, i: c.sms(phone='+15555550100')),
+    'get_users_by_name': (duo_client.Admin,
+                          lambda c, i: c.get_users_by_name(
+                              'user%06d' % (i % 1000))),
+    'iter_users': (duo_client.Admin,
+                   lambda c, i: sum(1 for _ in c.iter_users(limit=300))),
+    'authentication_log': (duo_client.Admin,
+                           lambda c, i: len(c.get_authentication_log())),
+    'child_accounts': (duo_client.Accounts,
+                       lambda c, i: c.get_child_accounts()),
+}
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1,
+                int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Worker(threading.Thread):
+    def __init__(self, api, operation, stop_at, counter, max_requests):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.api = api
+        self.operation = operation
+        self.stop_at = stop_at
+        self.counter = counter
+        self.max_requests = max_requests
+        self.latencies = []
+        self.errors = {}
+
+    def run(self):
+        while time.time() < self.stop_at:
+            i = next(self.counter)
+            if self.max_requests is not None and i >= self.max_requests:
+                return
+            start = time.time()
+            try:
+                self.operation(self.api, i)
+            except Exception as e:
+                key = '%s: %s' % (e.__class__.__name__,
+                                  getattr(e, 'status', e))
+                self.errors[key] = self.errors.get(key, 0) + 1
+            else:
+                self.latencies.append(time.time() - start)
+
+
+def run(api, operation, threads, duration, max_requests=None):
+    """
+    Return a report dict for calling operation from threads threads for
+    duration seconds (or until max_requests calls have been started).
+    """
+    counter = itertools.count()
+    stop_at = time.time() + duration
+    workers = [Worker(api, operation, stop_at, counter, max_requests)
+               for _ in range(threads)]
+    start = time.time()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.time() - start
+
+    latencies = sorted(l for w in workers for l in w.latencies)
+    errors = {}
+    for worker in workers:
+        for (key, count) in worker.errors.items():
+            errors[key] = errors.get(key, 0) + count
+    report = {
+        'elapsed_s': elapsed,
+        'requests': len(latencies),
+        'errors': errors,
+        'requests_per_s': len(latencies) / elapsed if elapsed else 0,
+    }
+    for (name, fraction) in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99),
+                             ('p999', 0.999), ('max', 1.0)):
+        value = percentile(latencies, fraction)
+        report['latency_%s_ms' % name] = (value * 1000
+                                          if value is not None else None)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--operation', default='ping',
+                        choices=sorted(OPERATIONS))
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--requests', type=int, default=None,
+                        help='Stop after this many requests')
+    parser.add_argument('--client-rate', type=float, default=None,
+                        help='Client-side rate limit in requests/sec')
+    parser.add_argument('--retries', type=int, default=0,
+                        help='Retry 429/5xx responses this many times')
+    parser.add_argument('--host', default=None,
+                        help='API host (default: start a mock server)')
+    parser.add_argument('--ca', default='HTTP')
+    parser.add_argument('--output', default='-')
+    mock_server.add_arguments(parser)
+    args = parser.parse_args()
+
+    server = None
+    host = args.host
+    if host is None:
+        server = mock_server.server_from_args(args, ('127.0.0.1', 0))
+        server.start()
+        host = server.host
+
+    (client_class, operation) = OPERATIONS[args.operation]
+    api = client_class(ikey=args.ikey, skey=args.skey, host=host,
+                       ca_certs=args.ca, pool_size=args.threads)
+    if args.client_rate:
+        api.rate_limiter = TokenBucket(args.client_rate)
+    if args.retries:
+        api.retry_policy = RetryPolicy(max_retries=args.retries)
+
+    report = run(api, operation, args.threads, args.duration, args.requests)
+    api.close()
+    if server is not None:
+        server.shutdown()
+    report.update({
+        'operation': args.operation,
+        'threads': args.threads,
+        'host': host if server is None else 'mock',
+        'python': platform.python_version(),
+    })
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
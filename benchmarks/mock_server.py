@@ -0,0 +1,624 @@
+#!/usr/bin/python
+"""
+Local stand-in for the Duo API, for load testing duo_client.
+
+Serves plain HTTP (use ca_certs='HTTP' in the client), verifies request
+signatures made by duo_client.client.sign() with either signature
+version, and implements the endpoint shapes used by Admin, Auth,
+AuthV1, Verify and Accounts over an in-memory synthetic dataset.
+
+    python benchmarks/mock_server.py --port 8080 --users 200000 \\
+        --latency 0.02 --error-rate 0.01 --throttle-rate 0.05
+
+    admin = duo_client.Admin(ikey='DIMOCK', skey='mock', ca_certs='HTTP',
+                             host='127.0.0.1:8080')
+"""
+
+import argparse
+import base64
+import BaseHTTPServer
+import itertools
+import json
+import os
+import random
+import re
+import SocketServer
+import sys
+import threading
+import time
+import urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from duo_client import client
+from duo_client.ratelimit import TokenBucket
+
+DEFAULT_IKEY = 'DIMOCK'
+DEFAULT_SKEY = 'mock'
+
+# Most events returned by one call to a /admin/v1/logs endpoint.
+LOG_PAGE_SIZE = 1000
+# Most seconds an auth_status long-poll waits for a result.
+LONG_POLL_SECS = 5
+
+
+class ApiError(Exception):
+    def __init__(self, status, code, message):
+        Exception.__init__(self, message)
+        self.status = status
+        self.code = code
+        self.message = message
+
+
+class Dataset(object):
+    """
+    Synthetic, mutable Duo account contents.
+    """
+
+    def __init__(self, users=100, phones=None, integrations=10, admins=5,
+                 log_events=10000, accounts=0, seed=1):
+        rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        if phones is None:
+            phones = users
+        self.users = {}
+        for i in range(users):
+            self._add(self.users, 'user_id', {
+                'username': 'user%06d' % i,
+                'realname': 'User %d' % i,
+                'status': 'active',
+                'notes': '',
+                'last_login': None,
+                'phones': [],
+                'tokens': [],
+            })
+        self.phones = {}
+        for i in range(phones):
+            self._add(self.phones, 'phone_id', {
+                'number': '+1555%07d' % i,
+                'extension': '',
+                'type': 'Mobile',
+                'platform': rng.choice(['Apple iOS', 'Google Android']),
+                'activated': True,
+                'sms_passcodes_sent': False,
+                'users': [],
+            })
+        self.tokens = {}
+        self.integrations = {}
+        for i in range(integrations):
+            ikey = 'DI%018d' % i
+            self.integrations[ikey] = {
+                'integration_key': ikey,
+                'name': 'Integration %d' % i,
+                'type': rng.choice(['adminapi', 'authapi', 'websdk']),
+                'notes': '',
+            }
+        self.admins = {}
+        for i in range(admins):
+            self._add(self.admins, 'admin_id', {
+                'name': 'Admin %d' % i,
+                'email': 'admin%d@example.com' % i,
+                'phone': '+1555000%04d' % i,
+            })
+        self.accounts = {}
+        for i in range(accounts):
+            self._add(self.accounts, 'account_id', {
+                'name': 'Child Account %d' % i,
+                'api_hostname': None,
+            })
+
+        usernames = [u['username'] for u in self.users.values()] or ['none']
+        names = [i['name'] for i in self.integrations.values()] or ['none']
+        start = int(time.time()) - 30 * 86400
+        self.logs = {'authentication': [], 'administrator': [],
+                     'telephony': []}
+        for i in range(log_events):
+            timestamp = start + i * (30 * 86400) // max(1, log_events)
+            self.logs['authentication'].append({
+                'timestamp': timestamp,
+                'username': rng.choice(usernames),
+                'factor': rng.choice(['Duo Push', 'Passcode', 'Phone Call']),
+                'result': rng.choice(['SUCCESS', 'SUCCESS', 'FAILURE']),
+                'ip': '198.51.100.%d' % rng.randint(1, 254),
+                'integration': rng.choice(names),
+            })
+            if i % 10 == 0:
+                self.logs['administrator'].append({
+                    'timestamp': timestamp,
+                    'username': 'Admin 0',
+                    'action': 'user_update',
+                    'object': rng.choice(usernames),
+                    'description': '{"status": "active"}',
+                })
+                self.logs['telephony'].append({
+                    'timestamp': timestamp,
+                    'context': 'authentication',
+                    'type': 'sms',
+                    'phone': '+1555%07d' % rng.randint(0, 9999999),
+                    'credits': 1,
+                })
+        # txid -> (time the result becomes available, result)
+        self.transactions = {}
+
+    def _add(self, table, id_field, obj):
+        obj[id_field] = 'D%018d' % next(self.ids)
+        table[obj[id_field]] = obj
+        return obj
+
+
+def one(params, name, required=True):
+    value = params.get(name)
+    if value is None and required:
+        raise ApiError(400, 40002, 'Missing required request parameters')
+    return value
+
+
+def paged(objects, params):
+    """
+    Return (page, metadata) honoring limit/offset, or everything if the
+    request is not paged.
+    """
+    if 'limit' not in params and 'offset' not in params:
+        return (objects, None)
+    limit = int(params.get('limit', 100))
+    offset = int(params.get('offset', 0))
+    page = objects[offset:offset + limit]
+    metadata = {'total_objects': len(objects)}
+    if offset + limit < len(objects):
+        metadata['next_offset'] = offset + limit
+    if offset > 0:
+        metadata['prev_offset'] = max(0, offset - limit)
+    return (page, metadata)
+
+
+class MockDuo(object):
+    """
+    Request routing and endpoint implementations.
+    """
+
+    def __init__(self, dataset, ikey=DEFAULT_IKEY, skey=DEFAULT_SKEY,
+                 latency=0, error_rate=0, throttle_rate=0, rate_limit=None,
+                 push_delay=1, seed=None):
+        self.data = dataset
+        self.keys = {ikey: skey}
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.limiter = None
+        if rate_limit:
+            self.limiter = TokenBucket(rate_limit, burst=rate_limit)
+        self.push_delay = push_delay
+        # Reported as the API host of child accounts; set by MockServer.
+        self.api_hostname = 'api-mock.example.com'
+        self.rng = random.Random(seed)
+        self.routes = []
+        for (method, pattern, handler) in [
+                ('GET', r'/auth/v2/ping', self.ping),
+                ('GET', r'/auth/v2/check', self.ping),
+                ('POST', r'/auth/v2/preauth', self.preauth),
+                ('POST', r'/auth/v2/auth', self.auth),
+                ('GET', r'/auth/v2/auth_status', self.auth_status),
+                ('POST', r'/auth/v2/enroll', self.enroll),
+                ('POST', r'/auth/v2/enroll_status', self.enroll_status),
+                ('POST', r'/auth/v2/bypass_codes', self.bypass_codes),
+                ('GET', r'/rest/v1/ping', lambda p: 'pong'),
+                ('GET', r'/rest/v1/check', lambda p: 'valid'),
+                ('POST', r'/rest/v1/preauth', self.preauth_v1),
+                ('POST', r'/rest/v1/auth', self.auth_v1),
+                ('GET', r'/rest/v1/status', self.status_v1),
+                ('POST', r'/verify/v1/call.json', self.verify),
+                ('POST', r'/verify/v1/sms.json', self.verify),
+                ('GET', r'/verify/v1/status.json', self.verify_status),
+                ('POST', r'/accounts/v1/account/list', self.account_list),
+                ('POST', r'/accounts/v1/account/create',
+                 self.account_create),
+                ('POST', r'/accounts/v1/account/delete',
+                 self.account_delete),
+                ('GET', r'/admin/v1/logs/(\w+)', self.logs),
+                ('GET', r'/admin/v1/users', self.get_users),
+                ('POST', r'/admin/v1/users', self.add_user),
+                ('GET', r'/admin/v1/users/(\w+)', self.getter('users')),
+                ('DELETE', r'/admin/v1/users/(\w+)', self.deleter('users')),
+                ('POST', r'/admin/v1/users/(\w+)/phones', self.add_user_phone),
+                ('GET', r'/admin/v1/phones', self.lister('phones')),
+                ('POST', r'/admin/v1/phones', self.add_phone),
+                ('GET', r'/admin/v1/phones/(\w+)', self.getter('phones')),
+                ('DELETE', r'/admin/v1/phones/(\w+)', self.deleter('phones')),
+                ('GET', r'/admin/v1/tokens', self.lister('tokens')),
+                ('GET', r'/admin/v1/integrations',
+                 self.lister('integrations')),
+                ('GET', r'/admin/v1/integrations/(\w+)',
+                 self.getter('integrations')),
+                ('GET', r'/admin/v1/admins', self.lister('admins')),
+                ('GET', r'/admin/v1/admins/(\w+)', self.getter('admins')),
+                ('GET', r'/admin/v1/info/summary', self.summary),
+                ('GET', r'/admin/v1/info/authentication_attempts',
+                 self.attempts),
+                ('GET', r'/admin/v1/info/user_authentication_attempts',
+                 self.attempts)]:
+            self.routes.append((method, re.compile(pattern + '$'), handler))
+
+    # Request handling
+
+    def verify_signature(self, method, host, path, params, headers):
+        try:
+            (scheme, encoded) = headers.get('Authorization', '').split(' ')
+            (ikey, sig) = base64.b64decode(encoded).split(':')
+        except (ValueError, TypeError):
+            raise ApiError(401, 40101, 'Missing request credentials')
+        skey = self.keys.get(ikey)
+        if skey is None:
+            raise ApiError(401, 40103, 'Invalid integration key')
+        date = headers.get('Date')
+        for sig_version in (2, 1):
+            expected = client.sign(ikey, skey, method, host, path, date,
+                                   sig_version, params)
+            if expected == headers.get('Authorization'):
+                return
+        raise ApiError(401, 40103, 'Invalid signature in request '
+                       'credentials')
+
+    def handle(self, method, host, path, params, headers):
+        """
+        Return (status, body dict, extra headers).
+        """
+        try:
+            if self.latency:
+                time.sleep(self.rng.expovariate(1.0 / self.latency))
+            self.verify_signature(method, host, path, params, headers)
+            throttled = self.rng.random() < self.throttle_rate
+            if self.limiter is not None and not self.limiter.try_acquire():
+                throttled = True
+            if throttled:
+                raise ApiError(429, 42901, 'Too Many Requests')
+            if self.rng.random() < self.error_rate:
+                raise ApiError(500, 50000, 'Internal server error')
+            for (route_method, pattern, handler) in self.routes:
+                match = pattern.match(path)
+                if match and route_method == method:
+                    result = handler(params, *match.groups())
+                    if isinstance(result, tuple):
+                        (response, metadata) = result
+                    else:
+                        (response, metadata) = (result, None)
+                    body = {'stat': 'OK', 'response': response}
+                    if metadata is not None:
+                        body['metadata'] = metadata
+                    return (200, body, {})
+            raise ApiError(404, 40401, 'Resource not found')
+        except ApiError as e:
+            extra = {}
+            if e.status == 429:
+                extra['Retry-After'] = '1'
+            return (e.status,
+                    {'stat': 'FAIL', 'code': e.code, 'message': e.message},
+                    extra)
+
+    # Auth API
+
+    def ping(self, params):
+        return {'time': int(time.time())}
+
+    def preauth(self, params):
+        username = params.get('username')
+        if username and username.startswith('deny'):
+            return {'result': 'deny', 'status_msg': 'Access denied.'}
+        if username and username.startswith('enroll'):
+            return {'result': 'enroll', 'status_msg': 'Enroll first.'}
+        return {
+            'result': 'auth',
+            'status_msg': 'Account is active',
+            'devices': [{'device': 'DPFZRS9FB0D46QFTM899',
+                         'type': 'phone',
+                         'capabilities': ['push', 'sms', 'phone'],
+                         'number': 'XXX-XXX-0100'}],
+        }
+
+    def _start_transaction(self):
+        txid = '%032x' % self.rng.getrandbits(128)
+        with self.data.lock:
+            self.data.transactions[txid] = (time.time() + self.push_delay,
+                                            'allow')
+        return txid
+
+    def auth(self, params):
+        one(params, 'factor')
+        if params.get('async') == '1':
+            return {'txid': self._start_transaction()}
+        time.sleep(self.push_delay)
+        return {'result': 'allow', 'status': 'allow',
+                'status_msg': 'Success. Logging you in...'}
+
+    def auth_status(self, params):
+        with self.data.lock:
+            transaction = self.data.transactions.get(one(params, 'txid'))
+        if transaction is None:
+            raise ApiError(400, 40002, 'Invalid request parameters (txid)')
+        (ready_at, result) = transaction
+        wait = ready_at - time.time()
+        if wait > LONG_POLL_SECS:
+            time.sleep(LONG_POLL_SECS)
+            return {'result': 'waiting', 'status': 'pushed',
+                    'status_msg': 'Pushed a login request to your phone.'}
+        if wait > 0:
+            time.sleep(wait)
+        return {'result': result, 'status': result,
+                'status_msg': 'Success. Logging you in...'}
+
+    def enroll(self, params):
+        return {'activation_barcode': 'https://example.com/qr',
+                'activation_code': 'duo://mock',
+                'user_id': 'DUMOCK',
+                'username': params.get('username', 'mock'),
+                'valid_secs': 86400}
+
+    def enroll_status(self, params):
+        return 'success'
+
+    def bypass_codes(self, params):
+        count = int(params.get('count', 10))
+        return {'codes': ['%09d' % self.rng.randint(0, 10 ** 9)
+                          for _ in range(count)],
+                'expiration': int(time.time()) + 3600}
+
+    # Auth API v1
+
+    def preauth_v1(self, params):
+        one(params, 'user')
+        return {'result': 'auth', 'factors': {'1': 'push1',
+                                              'default': 'push1'}}
+
+    def auth_v1(self, params):
+        one(params, 'user')
+        if params.get('async') == '1':
+            return {'txid': self._start_transaction()}
+        return {'result': 'allow', 'status': 'Success'}
+
+    def status_v1(self, params):
+        result = self.auth_status(params)
+        if result['result'] == 'waiting':
+            return {'status': result['status_msg']}
+        return {'result': result['result'], 'status': result['status_msg']}
+
+    # Verify API
+
+    def verify(self, params):
+        one(params, 'phone')
+        return {'pin': '%04d' % self.rng.randint(0, 9999),
+                'txid': '%032x' % self.rng.getrandbits(128)}
+
+    def verify_status(self, params):
+        one(params, 'txid')
+        return {'state': 'ended', 'event': 'ended', 'info': {}}
+
+    # Accounts API
+
+    def account_list(self, params):
+        with self.data.lock:
+            accounts = [dict(a) for a in self.data.accounts.values()]
+        for account in accounts:
+            account['api_hostname'] = self.api_hostname
+        return accounts
+
+    def account_create(self, params):
+        with self.data.lock:
+            account_id = 'DA%018d' % next(self.data.ids)
+            account = {'account_id': account_id,
+                       'name': one(params, 'name'),
+                       'api_hostname': self.api_hostname}
+            self.data.accounts[account_id] = account
+        return account
+
+    def account_delete(self, params):
+        with self.data.lock:
+            if self.data.accounts.pop(one(params, 'account_id'), None) is None:
+                raise ApiError(404, 40401, 'Resource not found')
+        return ''
+
+    # Admin API
+
+    def logs(self, params, logtype):
+        events = self.data.logs.get(logtype)
+        if events is None:
+            raise ApiError(404, 40401, 'Resource not found')
+        mintime = int(params.get('mintime', 0))
+        return [e for e in events if e['timestamp'] >= mintime][:LOG_PAGE_SIZE]
+
+    def lister(self, table):
+        def handler(params):
+            with self.data.lock:
+                objects = getattr(self.data, table).values()
+            return paged(objects, params)
+        return handler
+
+    def getter(self, table):
+        def handler(params, object_id):
+            with self.data.lock:
+                obj = getattr(self.data, table).get(object_id)
+            if obj is None:
+                raise ApiError(404, 40401, 'Resource not found')
+            return obj
+        return handler
+
+    def deleter(self, table):
+        def handler(params, object_id):
+            with self.data.lock:
+                getattr(self.data, table).pop(object_id, None)
+            return ''
+        return handler
+
+    def get_users(self, params):
+        username = params.get('username')
+        if username is None:
+            return self.lister('users')(params)
+        with self.data.lock:
+            return [u for u in self.data.users.values()
+                    if u['username'] == username]
+
+    def add_user(self, params):
+        with self.data.lock:
+            return self.data._add(self.data.users, 'user_id', {
+                'username': one(params, 'username'),
+                'realname': params.get('realname', ''),
+                'status': params.get('status', 'active'),
+                'notes': params.get('notes', ''),
+                'last_login': None,
+                'phones': [],
+                'tokens': [],
+            })
+
+    def add_phone(self, params):
+        with self.data.lock:
+            return self.data._add(self.data.phones, 'phone_id', {
+                'number': params.get('number', ''),
+                'extension': params.get('extension', ''),
+                'type': params.get('type', 'Unknown'),
+                'platform': params.get('platform', 'Unknown'),
+                'activated': False,
+                'sms_passcodes_sent': False,
+                'users': [],
+            })
+
+    def add_user_phone(self, params, user_id):
+        with self.data.lock:
+            user = self.data.users.get(user_id)
+            phone = self.data.phones.get(one(params, 'phone_id'))
+            if user is None or phone is None:
+                raise ApiError(404, 40401, 'Resource not found')
+            user['phones'].append(phone['phone_id'])
+        return ''
+
+    def summary(self, params):
+        with self.data.lock:
+            return {'user_count': len(self.data.users),
+                    'admin_count': len(self.data.admins),
+                    'integration_count': len(self.data.integrations),
+                    'telephony_credits_remaining': 1000}
+
+    def attempts(self, params):
+        counts = {'ERROR': 0, 'FAILURE': 0, 'FRAUD': 0, 'SUCCESS': 0}
+        for event in self.data.logs['authentication']:
+            counts[event['result']] += 1
+        return counts
+
+
+class RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately; don't let Nagle's
+    # algorithm delay the body on keep-alive connections.
+    disable_nagle_algorithm = True
+
+    def _dispatch(self):
+        parsed = urlparse.urlparse(self.path)
+        if self.command in ('POST', 'PUT'):
+            length = int(self.headers.get('Content-Length', 0))
+            query = self.rfile.read(length)
+        else:
+            query = parsed.query
+        params = dict((k, v[0]) for (k, v) in
+                      urlparse.parse_qs(query, keep_blank_values=True).items())
+        (status, body, extra) = self.server.api.handle(
+            self.command,
+            self.headers.get('Host', ''),
+            parsed.path,
+            params,
+            self.headers,
+        )
+        body = json.dumps(body)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for (name, value) in extra.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_DELETE = do_PUT = _dispatch
+
+    def log_message(self, *args):
+        if self.server.verbose:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, *args)
+
+
+class MockServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, api, verbose=False):
+        BaseHTTPServer.HTTPServer.__init__(self, address, RequestHandler)
+        self.api = api
+        api.api_hostname = self.host
+        self.verbose = verbose
+
+    @property
+    def host(self):
+        """
+        The host argument for duo_client clients using this server.
+        """
+        return '%s:%d' % self.server_address
+
+    def start(self):
+        """
+        Serve requests on a background thread.
+        """
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+
+def add_arguments(parser):
+    parser.add_argument('--ikey', default=DEFAULT_IKEY)
+    parser.add_argument('--skey', default=DEFAULT_SKEY)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--integrations', type=int, default=10)
+    parser.add_argument('--log-events', type=int, default=10000)
+    parser.add_argument('--accounts', type=int, default=0,
+                        help='Number of child accounts')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='Mean added latency per request in seconds')
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help='Fraction of requests failing with 500')
+    parser.add_argument('--throttle-rate', type=float, default=0,
+                        help='Fraction of requests failing with 429')
+    parser.add_argument('--rate-limit', type=float, default=None,
+                        help='Requests/sec above which requests get 429')
+    parser.add_argument('--push-delay', type=float, default=1,
+                        help='Seconds until an async auth is approved')
+    parser.add_argument('--seed', type=int, default=1)
+
+
+def server_from_args(args, address):
+    dataset = Dataset(users=args.users,
+                      integrations=args.integrations,
+                      log_events=args.log_events,
+                      accounts=args.accounts,
+                      seed=args.seed)
+    api = MockDuo(dataset,
+                  ikey=args.ikey,
+                  skey=args.skey,
+                  latency=args.latency,
+                  error_rate=args.error_rate,
+                  throttle_rate=args.throttle_rate,
+                  rate_limit=args.rate_limit,
+                  push_delay=args.push_delay,
+                  seed=args.seed)
+    return MockServer(address, api, verbose=getattr(args, 'verbose', False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--bind', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--verbose', action='store_true')
+    add_arguments(parser)
+    args = parser.parse_args()
+    server = server_from_args(args, (args.bind, args.port))
+    sys.stderr.write('Serving mock Duo API on http://%s (ikey=%s skey=%s)\n'
+                     % (server.host, args.ikey, args.skey))
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -119,14 +119,36 @@ TOKEN_HOTP_6 = 'h6'
 TOKEN_HOTP_8 = 'h8'
 TOKEN_YUBIKEY = 'yk'
 
+# Objects requested per page by the iter_* methods. Accepted by every
+# paginated Admin API endpoint.
+DEFAULT_PAGE_LIMIT = 100
+
 
 class Admin(client.Client):
     account_id = None
 
-    def api_call(self, method, path, params):
+    def api_call(self, method, path, params, **kwargs):
         if self.account_id is not None:
             params['account_id'] = self.account_id
-        return super(Admin, self).api_call(method, path, params)
+        return super(Admin, self).api_call(method, path, params, **kwargs)
+
+    def _iter_log(self, eventtype, mintime):
+        """
+        Yield events of one log type, decoding them from the response as
+        they arrive.
+        """
+        # Sanity check mintime as unix timestamp, then transform to string
+        mintime = str(int(mintime))
+        params = {
+            'mintime': mintime,
+        }
+        for row in self.json_stream_api_call(
+                'GET',
+                '/admin/v1/logs/' + eventtype,
+                params):
+            row['eventtype'] = eventtype
+            row['host'] = self.host
+            yield row
 
     def get_administrator_log(self,
                               mintime=0):
@@ -174,6 +196,17 @@ class Admin(client.Client):
         return response
 
 
+    def iter_administrator_log(self, mintime=0):
+        """
+        Like get_administrator_log(), but returns a generator that yields
+        events as they are decoded from the response, without holding the
+        whole response in memory.
+
+        Raises RuntimeError on error.
+        """
+        return self._iter_log('administrator', mintime)
+
+
     def get_authentication_log(self,
                                mintime=0):
         """
@@ -212,6 +245,17 @@ class Admin(client.Client):
         return response
 
 
+    def iter_authentication_log(self, mintime=0):
+        """
+        Like get_authentication_log(), but returns a generator that yields
+        events as they are decoded from the response, without holding the
+        whole response in memory.
+
+        Raises RuntimeError on error.
+        """
+        return self._iter_log('authentication', mintime)
+
+
     def get_telephony_log(self,
                           mintime=0):
         """
@@ -249,6 +293,17 @@ class Admin(client.Client):
         return response
 
 
+    def iter_telephony_log(self, mintime=0):
+        """
+        Like get_telephony_log(), but returns a generator that yields
+        events as they are decoded from the response, without holding the
+        whole response in memory.
+
+        Raises RuntimeError on error.
+        """
+        return self._iter_log('telephony', mintime)
+
+
     def get_users(self):
         """
         Returns list of users.
@@ -262,6 +317,27 @@ class Admin(client.Client):
         return response
 
 
+    def iter_users(self, limit=DEFAULT_PAGE_LIMIT, prefetch=False):
+        """
+        Returns a generator of all users, fetched a page at a time.
+
+        limit - Number of users per page (optional)
+        prefetch - Fetch the next page in the background while the
+                   current one is consumed (optional)
+
+        Yields user objects.
+
+        Raises RuntimeError on error.
+        """
+        return self.json_paging_api_call(
+            'GET',
+            '/admin/v1/users',
+            {},
+            limit,
+            prefetch=prefetch,
+        )
+
+
     def get_user_by_id(self, user_id):
         """
         Returns user specified by user_id.
@@ -512,6 +588,27 @@ class Admin(client.Client):
         return response
 
 
+    def iter_phones(self, limit=DEFAULT_PAGE_LIMIT, prefetch=False):
+        """
+        Returns a generator of all phones, fetched a page at a time.
+
+        limit - Number of phones per page (optional)
+        prefetch - Fetch the next page in the background while the
+                   current one is consumed (optional)
+
+        Yields phone objects.
+
+        Raises RuntimeError on error.
+        """
+        return self.json_paging_api_call(
+            'GET',
+            '/admin/v1/phones',
+            {},
+            limit,
+            prefetch=prefetch,
+        )
+
+
     def get_phone_by_id(self, phone_id):
         """
         Returns a phone specified by phone_id.
@@ -661,6 +758,27 @@ class Admin(client.Client):
         return response
 
 
+    def iter_tokens(self, limit=DEFAULT_PAGE_LIMIT, prefetch=False):
+        """
+        Returns a generator of all tokens, fetched a page at a time.
+
+        limit - Number of tokens per page (optional)
+        prefetch - Fetch the next page in the background while the
+                   current one is consumed (optional)
+
+        Yields token objects.
+
+        Raises RuntimeError on error.
+        """
+        return self.json_paging_api_call(
+            'GET',
+            '/admin/v1/tokens',
+            {},
+            limit,
+            prefetch=prefetch,
+        )
+
+
     def get_token_by_id(self, token_id):
         """
         Returns a token.
@@ -990,6 +1108,27 @@ class Admin(client.Client):
         return response
 
 
+    def iter_integrations(self, limit=DEFAULT_PAGE_LIMIT, prefetch=False):
+        """
+        Returns a generator of all integrations, fetched a page at a time.
+
+        limit - Number of integrations per page (optional)
+        prefetch - Fetch the next page in the background while the
+                   current one is consumed (optional)
+
+        Yields integration objects.
+
+        Raises RuntimeError on error.
+        """
+        return self.json_paging_api_call(
+            'GET',
+            '/admin/v1/integrations',
+            {},
+            limit,
+            prefetch=prefetch,
+        )
+
+
     def get_integration(self, integration_key):
         """
         Returns the requested integration.
@@ -1191,6 +1330,27 @@ class Admin(client.Client):
         return response
 
 
+    def iter_admins(self, limit=DEFAULT_PAGE_LIMIT, prefetch=False):
+        """
+        Returns a generator of all administrators, fetched a page at a time.
+
+        limit - Number of administrators per page (optional)
+        prefetch - Fetch the next page in the background while the
+                   current one is consumed (optional)
+
+        Yields administrator objects.
+
+        Raises RuntimeError on error.
+        """
+        return self.json_paging_api_call(
+            'GET',
+            '/admin/v1/admins',
+            {},
+            limit,
+            prefetch=prefetch,
+        )
+
+
     def get_admin(self, admin_id):
         """
         Returns an administrator.
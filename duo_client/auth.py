@@ -3,9 +3,47 @@ Duo Security Auth API reference client implementation.
 
 <http://www.duosecurity.com/docs/authapi>
 """
+import copy
+import time
+
 import client
+from cache import Cache
+
+# Preauth results for which the user cannot log in now.
+PREAUTH_NEGATIVE_RESULTS = ('deny', 'enroll')
+
+
+class PreauthCache(Cache):
+    """
+    Cache of preauth responses keyed on (username, user_id, ipaddr), for
+    Auth.preauth_cache. Repeated preauths for a login attempt (client
+    retries, several RADIUS packets) are then answered locally, and
+    concurrent identical preauths make a single request.
+
+    ttl - Seconds to reuse an 'auth' or 'allow' response. Keep it short:
+          changes to the user's devices or policy are not seen until it
+          expires.
+    negative_ttl - Seconds to reuse a 'deny' or 'enroll' response.
+
+    hits and misses count preauth calls answered from the cache or not.
+    """
+
+    def __init__(self, maxsize=10000, ttl=10, negative_ttl=30,
+                 clock=time.time):
+        self.negative_ttl = negative_ttl
+        Cache.__init__(self, maxsize, ttl, ttl_for=self._ttl_for,
+                       clock=clock)
+
+    def _ttl_for(self, response):
+        if response.get('result') in PREAUTH_NEGATIVE_RESULTS:
+            return self.negative_ttl
+        return self.ttl
+
 
 class Auth(client.Client):
+    # Optional PreauthCache for preauth() responses.
+    preauth_cache = None
+
     def ping(self):
         """
         Determine if the Duo service is up and responding.
@@ -97,6 +135,9 @@ class Auth(client.Client):
     def preauth(self, username=None, user_id=None, ipaddr=None):
         """
         Determine if and with what factors a user may authenticate or enroll.
+
+        If preauth_cache is set, a cached response for the same
+        arguments may be returned.
         """
         params = {}
         if username is not None:
@@ -105,10 +146,13 @@ class Auth(client.Client):
             params['user_id'] = user_id
         if ipaddr is not None:
             params['ipaddr'] = ipaddr
-        response = self.json_api_call('POST',
-                                      '/auth/v2/preauth',
-                                      params)
-        return response
+        if self.preauth_cache is None:
+            return self.json_api_call('POST', '/auth/v2/preauth', params)
+        response = self.preauth_cache.get(
+            (username, user_id, ipaddr),
+            lambda: self.json_api_call('POST', '/auth/v2/preauth', params))
+        # Callers may modify the response; keep the cached one intact.
+        return copy.deepcopy(response)
 
     def auth(self,
              factor,
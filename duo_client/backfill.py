@@ -0,0 +1,191 @@
+"""
+Parallel, resumable backfill of historical log events.
+
+The logs API only takes a mintime, so reading months of history is a
+chain of requests, each starting at the last timestamp of the previous
+page. Backfill splits [mintime, maxtime) into time shards and follows
+one such chain per shard concurrently, while still yielding events in
+timestamp order:
+
+    admin = duo_client.Admin(ikey=..., skey=..., host=...)
+    checkpoints = Checkpoints(FileCheckpointStore('backfill.ckpt'))
+    backfill = Backfill(admin, mintime, maxtime, checkpoints=checkpoints)
+    for event in backfill.events():
+        ship(event)
+
+Each shard's position is saved after its events have been consumed, so
+a restarted backfill with the same range and shard count only fetches
+what was not delivered yet. The logs API is rate limited; give the
+Admin client a retry_policy (see ratelimit.RetryPolicy) so that
+throttled shards back off and retry.
+"""
+
+import Queue
+import sys
+import threading
+
+from executor import Executor
+from logtail import LOG_PAGE_SIZE
+from logtail import LogCursor
+from logtail import fetch_log
+
+DEFAULT_SHARDS = 8
+DEFAULT_WORKERS = 4
+
+# Batches fetched ahead per shard before its fetcher waits.
+DEFAULT_QUEUE_SIZE = 4
+
+_DONE = object()
+
+
+def split_range(mintime, maxtime, shards):
+    """
+    Return up to shards (start, end) pairs of whole seconds covering
+    [mintime, maxtime), in order.
+    """
+    span = maxtime - mintime
+    shards = max(1, min(shards, span))
+    bounds = [mintime + span * i // shards for i in range(shards + 1)]
+    return [(bounds[i], bounds[i + 1]) for i in range(shards)
+            if bounds[i] < bounds[i + 1]]
+
+
+class _Stopped(Exception):
+    pass
+
+
+class Backfill(object):
+    """
+    Fetches the events of one log with timestamps in [mintime, maxtime).
+
+    log_type - 'authentication', 'administrator' or 'telephony'.
+    shards - Number of time windows fetched independently.
+    workers - Number of shards fetched at once.
+    checkpoints - Optional checkpoint.Checkpoints to resume from and
+                  record shard positions in. It is committed after each
+                  consumed batch.
+    queue_size - Batches (one API page each) buffered per shard.
+    before_commit - Optional callable run before each commit, such as
+                  a sink's flush(), so that events are written out
+                  before the position after them is saved.
+    page_size - Most events returned by one request to the logs API; a
+                shorter page ends its shard.
+    """
+
+    def __init__(self, admin, mintime, maxtime, log_type='authentication',
+                 shards=DEFAULT_SHARDS, workers=DEFAULT_WORKERS,
+                 checkpoints=None, queue_size=DEFAULT_QUEUE_SIZE,
+                 before_commit=None, page_size=LOG_PAGE_SIZE):
+        self.admin = admin
+        self.mintime = mintime
+        self.maxtime = maxtime
+        self.log_type = log_type
+        self.shards = split_range(mintime, maxtime, shards)
+        self.workers = workers
+        self.checkpoints = checkpoints
+        self.queue_size = queue_size
+        self.before_commit = before_commit
+        self.page_size = page_size
+        self._stop = threading.Event()
+
+    def shard_key(self, shard):
+        """
+        Return the checkpoint key of a (start, end) shard. Child accounts
+        share API hosts, so the account ID is part of the key.
+        """
+        key = 'backfill/%s/%s' % (self.log_type, self.admin.host)
+        account_id = getattr(self.admin, 'account_id', None)
+        if account_id is not None:
+            key += '/' + account_id
+        return key + '/%d-%d' % shard
+
+    def _load(self, shard):
+        """
+        Return (cursor, done) for a shard from the checkpoints.
+        """
+        state = None
+        if self.checkpoints is not None:
+            state = self.checkpoints.get(self.shard_key(shard))
+        if state is None:
+            return (LogCursor(shard[0]), False)
+        return (LogCursor.from_dict(state), state.get('done', False))
+
+    def _put(self, queue, item):
+        while True:
+            if self._stop.is_set():
+                raise _Stopped()
+            try:
+                queue.put(item, timeout=0.1)
+                return
+            except Queue.Full:
+                pass
+
+    def _fetch_shard(self, shard, queue):
+        """
+        Put (events, state) batches for one shard on queue, then _DONE,
+        or (None, exc_info) if fetching fails.
+        """
+        end = shard[1]
+        (cursor, done) = self._load(shard)
+        try:
+            while not done:
+                if self._stop.is_set():
+                    return
+                page = list(fetch_log(self.admin, self.log_type,
+                                      cursor.timestamp))
+                events = []
+                for event in cursor.filter(page):
+                    if event['timestamp'] >= end:
+                        done = True
+                        break
+                    events.append(event)
+                if len(page) < self.page_size:
+                    # The log has nothing after this page.
+                    done = True
+                elif not events and not done:
+                    # A full page of events already delivered, all at
+                    # the cursor's timestamp.
+                    cursor.skip_timestamp()
+                    done = cursor.timestamp >= end
+                state = cursor.to_dict()
+                state['done'] = done
+                self._put(queue, (events, state))
+            self._put(queue, _DONE)
+        except _Stopped:
+            pass
+        except Exception:
+            try:
+                self._put(queue, (None, sys.exc_info()))
+            except _Stopped:
+                pass
+
+    def events(self):
+        """
+        Yield the events of every shard, in timestamp order.
+        """
+        self._stop.clear()
+        executor = Executor(self.workers)
+        queues = []
+        for shard in self.shards:
+            queue = Queue.Queue(self.queue_size)
+            executor.submit(self._fetch_shard, shard, queue)
+            queues.append((shard, queue))
+        try:
+            for (shard, queue) in queues:
+                while True:
+                    item = queue.get()
+                    if item is _DONE:
+                        break
+                    (events, state) = item
+                    if events is None:
+                        raise state[0], state[1], state[2]
+                    for event in events:
+                        yield event
+                    if self.checkpoints is not None:
+                        self.checkpoints.set(self.shard_key(shard), state)
+                        if self.before_commit is not None:
+                            self.before_commit()
+                        self.checkpoints.commit()
+        finally:
+            self._stop.set()
+            executor.shutdown()
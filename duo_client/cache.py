@@ -0,0 +1,146 @@
+"""
+Bounded in-process cache for API lookups.
+"""
+
+import collections
+import sys
+import threading
+import time
+
+from executor import Future
+
+DEFAULT_MAXSIZE = 10000
+DEFAULT_TTL = 300
+
+
+class Cache(object):
+    """
+    Least-recently-used cache whose entries expire after a time to live.
+
+    get(key, load) calls load() only on a miss, and concurrent misses
+    for the same key share a single load() call: the other threads wait
+    for its result instead of repeating the request. Failed loads are
+    not cached.
+
+    maxsize - Maximum number of entries; the least recently used entry
+              is dropped to make room.
+    ttl - Seconds an entry stays valid.
+    ttl_for - Optional function(value) returning the seconds to keep
+              value, overriding ttl (e.g. shorter for negative results).
+              0 or less means not to cache value.
+
+    hits, misses and loads count lookups since creation.
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, ttl=DEFAULT_TTL,
+                 ttl_for=None, clock=time.time):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.ttl_for = ttl_for
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> (value, expiry time), least recently used first.
+        self._entries = collections.OrderedDict()
+        # key -> Future of the load in progress.
+        self._loading = {}
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _lookup(self, key):
+        """
+        Return (True, value) for a fresh entry, or (False, None). Must
+        be called with the lock held.
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return (False, None)
+        (value, expires) = entry
+        if expires <= self._clock():
+            return (False, None)
+        # Reinsert as the most recently used.
+        self._entries[key] = entry
+        return (True, value)
+
+    def _store(self, key, value, ttl):
+        if ttl is None:
+            ttl = self.ttl
+            if self.ttl_for is not None:
+                ttl = self.ttl_for(value)
+        if ttl <= 0:
+            return
+        self._entries.pop(key, None)
+        self._entries[key] = (value, self._clock() + ttl)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def lookup(self, key, default=None):
+        """
+        Return the cached value for key, or default. Never loads.
+        """
+        with self._lock:
+            (found, value) = self._lookup(key)
+            if found:
+                self.hits += 1
+                return value
+            self.misses += 1
+            return default
+
+    def put(self, key, value, ttl=None):
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get(self, key, load):
+        """
+        Return the cached value for key, calling load() to get it on a
+        miss. Exceptions raised by load() propagate to every caller
+        waiting for it.
+        """
+        return self._get(key, load, True)
+
+    def fill(self, key, load):
+        """
+        Like get(), after lookup() missed key: the lookup is not counted
+        again.
+        """
+        return self._get(key, load, False)
+
+    def _get(self, key, load, count):
+        with self._lock:
+            (found, value) = self._lookup(key)
+            if found:
+                if count:
+                    self.hits += 1
+                return value
+            if count:
+                self.misses += 1
+            future = self._loading.get(key)
+            owner = future is None
+            if owner:
+                future = self._loading[key] = Future()
+                self.loads += 1
+        if not owner:
+            return future.result()
+        try:
+            value = load()
+        except Exception:
+            with self._lock:
+                del self._loading[key]
+            future.set_exception(sys.exc_info())
+            raise
+        with self._lock:
+            self._store(key, value, None)
+            del self._loading[key]
+        future.set_result(value)
+        return value
@@ -0,0 +1,127 @@
+"""
+Durable storage for log positions (cursors).
+
+A store maps string keys to JSON-serializable values and is replaced as
+a whole by each save(). Two backends are provided,
+FileCheckpointStore and SQLiteCheckpointStore; any object with the same
+load()/save() methods can be used. Checkpoints batches updates from
+many logs into one save().
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+
+
+class FileCheckpointStore(object):
+    """
+    Keeps a JSON dict of cursors in a single file.
+
+    save() writes a temporary file in the same directory, fsyncs it and
+    renames it over the old one, so a crash leaves either the old or the
+    new checkpoint on disk, never a partial one.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        """
+        Return the saved dict, or {} if nothing has been saved yet.
+        """
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except IOError:
+            return {}
+
+    def save(self, state):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        (fd, tmp_path) = tempfile.mkstemp(
+            dir=directory, prefix=os.path.basename(self.path) + '.')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(state, f, sort_keys=True)
+                f.flush()
+                os.fsync(f.fileno())
+            os.rename(tmp_path, self.path)
+        except:
+            os.unlink(tmp_path)
+            raise
+        # Make the rename itself durable.
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+class SQLiteCheckpointStore(object):
+    """
+    Keeps cursors in a SQLite database. Each save() is one transaction.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute('PRAGMA synchronous = FULL')
+        conn.execute('CREATE TABLE IF NOT EXISTS checkpoints ('
+                     'key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        return conn
+
+    def load(self):
+        conn = self._connect()
+        try:
+            rows = conn.execute('SELECT key, value FROM checkpoints')
+            return dict((key, json.loads(value)) for (key, value) in rows)
+        finally:
+            conn.close()
+
+    def save(self, state):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('DELETE FROM checkpoints')
+                conn.executemany(
+                    'INSERT INTO checkpoints (key, value) VALUES (?, ?)',
+                    [(key, json.dumps(value, sort_keys=True))
+                     for (key, value) in state.items()])
+        finally:
+            conn.close()
+
+
+class Checkpoints(object):
+    """
+    In-memory view of a checkpoint store. Threads update entries with
+    set(), and commit() writes every change in a single atomic save(),
+    e.g. once per collection sweep.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._state = store.load()
+        self._dirty = False
+
+    def get(self, key, default=None):
+        with self._lock:
+            return self._state.get(key, default)
+
+    def set(self, key, value):
+        with self._lock:
+            self._state[key] = value
+            self._dirty = True
+
+    def commit(self):
+        """
+        Save all entries if any changed since the last commit.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            self.store.save(dict(self._state))
+            self._dirty = False
@@ -7,12 +7,17 @@ import collections
 import copy
 import datetime
 import email.utils
+import errno
 import hashlib
 import hmac
 import httplib
 import json
 import os
+import select
+import socket
 import sys
+import threading
+import time
 import urllib
 
 try:
@@ -27,16 +32,96 @@ try:
 except ImportError as e:
     pytz_error = e
 
+from connection_pool import ConnectionPool
+from connection_pool import DEFAULT_POOL_IDLE_TIMEOUT
+from connection_pool import DEFAULT_POOL_SIZE
+from executor import Executor
 from https_wrapper import CertValidatingHTTPSConnection
+from https_wrapper import ResolvingHTTPConnection
+import jsonstream
 
 DEFAULT_CA_CERTS = os.path.join(os.path.dirname(__file__), 'ca_certs.pem')
 
+# Outcome of one call made by Client.map(). Exactly one of result and
+# error is meaningful: error is None if the call succeeded.
+MapResult = collections.namedtuple('MapResult', ['kwargs', 'result', 'error'])
+
+
+# Parameter names come from a small, fixed set, so their quoted forms
+# are memoized. The cache stops growing at _QUOTED_KEYS_MAX entries.
+_QUOTED_KEYS_MAX = 1024
+_quoted_keys = {}
+
+
+# Methods resent on a fresh connection when a reused keep-alive
+# connection turns out to have been closed by the server. Others might
+# already have been acted upon, as in ratelimit.RetryPolicy.
+REPLAYABLE_METHODS = ('GET', 'DELETE')
+
+
+def _connection_dropped(conn):
+    """
+    Return True if the server has closed (or sent unexpected data on)
+    an idle pooled connection, which makes its socket readable.
+    """
+    try:
+        (readable, _, _) = select.select([conn.sock], [], [], 0)
+    except (select.error, socket.error, TypeError, ValueError):
+        return True
+    return bool(readable)
+
+
+def _stale_connection_error(error):
+    """
+    Return True if error, raised while waiting for a response on a
+    reused connection, shows the server closed it without answering.
+    """
+    if isinstance(error, httplib.BadStatusLine):
+        return True
+    return (isinstance(error, socket.error)
+            and not isinstance(error, socket.timeout)
+            and error.errno in (errno.ECONNRESET, errno.EPIPE))
+
+
+# Marks with_timeout() arguments that were not given.
+_UNSET = object()
+
+# Smallest socket timeout used when a call's deadline is nearly up; 0
+# would make the socket non-blocking instead.
+_MIN_TIMEOUT = 0.001
+
+
+class DeadlineExceeded(socket.timeout):
+    """
+    Raised when a call runs out of time, counting every attempt, the
+    backoff between retries and rate limiting.
+    """
+
+
+def _min_timeout(timeout, remaining):
+    """
+    Return the shorter of timeout (None meaning no limit) and remaining.
+    """
+    remaining = max(remaining, _MIN_TIMEOUT)
+    if timeout is None or remaining < timeout:
+        return remaining
+    return timeout
+
+
+def _quote_key(key):
+    quoted = _quoted_keys.get(key)
+    if quoted is None:
+        quoted = urllib.quote(key, '~')
+        if len(_quoted_keys) < _QUOTED_KEYS_MAX:
+            _quoted_keys[key] = quoted
+    return quoted
+
 
 def canon_params(params):
     args = []
     for key in sorted(params.keys()):
         val = params[key]
-        arg = '%s=%s' % (urllib.quote(key, '~'), urllib.quote(val, '~'))
+        arg = '%s=%s' % (_quote_key(key), urllib.quote(val, '~'))
         args.append(arg)
     return '&'.join(args)
 
@@ -70,6 +155,33 @@ def sign(ikey, skey, method, host, uri, date, sig_version, params):
     return 'Basic %s' % base64.b64encode(auth)
 
 
+class Signer(object):
+    """
+    Signs requests for one integration key and secret key.
+
+    The HMAC key schedule for skey is computed once; each signature
+    starts from a copy of it instead of rehashing the key.
+    """
+
+    def __init__(self, ikey, skey):
+        self.ikey = ikey
+        self.skey = skey
+        if isinstance(skey, unicode):
+            skey = skey.encode('utf-8')
+        self._hmac = hmac.new(skey, digestmod=hashlib.sha1)
+
+    def sign(self, method, host, uri, date, sig_version, params):
+        """
+        Return basic authorization header line with a Duo Web API
+        signature. Equivalent to sign(ikey, skey, ...).
+        """
+        canonical = canonicalize(method, host, uri, params, date, sig_version)
+        sig = self._hmac.copy()
+        sig.update(canonical)
+        auth = '%s:%s' % (self.ikey, sig.hexdigest())
+        return 'Basic %s' % base64.b64encode(auth)
+
+
 def encode_params(params):
     """Returns copy of params with unicode strings utf-8 encoded"""
     new_params = {}
@@ -82,14 +194,78 @@ def encode_params(params):
     return new_params
 
 
+class PooledResponse(object):
+    """
+    Wraps an httplib response whose body has not been read yet. The
+    connection goes back to its pool once the body has been read to the
+    end, or is closed if close() is called first.
+    """
+
+    def __init__(self, response, conn, pool):
+        self._response = response
+        self._conn = conn
+        self._pool = pool
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    def read(self, amt=None):
+        data = self._response.read(amt)
+        if amt is None or not data or self._response.isclosed():
+            self._release()
+        return data
+
+    def _release(self):
+        if self._conn is None:
+            return
+        if self._response.will_close:
+            self._conn.close()
+        else:
+            self._pool.put(self._conn)
+        self._conn = None
+
+    def close(self):
+        if self._conn is not None:
+            # Unread data is still in the socket; it cannot be reused.
+            self._conn.close()
+            self._conn = None
+        self._response.close()
+
+
 class Client(object):
     sig_version = 2
 
     def __init__(self, ikey, skey, host,
                  ca_certs=DEFAULT_CA_CERTS,
-                 sig_timezone='UTC'):
+                 sig_timezone='UTC',
+                 pool_size=DEFAULT_POOL_SIZE,
+                 pool_idle_timeout=DEFAULT_POOL_IDLE_TIMEOUT,
+                 rate_limiter=None,
+                 retry_policy=None,
+                 connect_timeout=None,
+                 read_timeout=None,
+                 resolver=None,
+                 deadline=None):
         """
         ca - Path to CA pem file.
+        pool_size - Maximum number of idle keep-alive connections kept
+                    open to the API host.
+        pool_idle_timeout - Seconds before an idle connection is closed
+                            instead of reused.
+        rate_limiter - Optional ratelimit.TokenBucket every call waits on.
+        retry_policy - Optional ratelimit.RetryPolicy. If None, failed
+                       calls are not retried.
+        connect_timeout - Seconds to wait for a new connection to the
+                          API host (or proxy). None waits indefinitely.
+        read_timeout - Seconds to wait for each read from the server.
+                       None waits indefinitely.
+        resolver - Optional resolver.Resolver used to look up the API
+                   host; by default, a shared cache of lookups is used.
+        deadline - Seconds each call may take in total, across retries,
+                   or None. Raises DeadlineExceeded once it is up.
+
+        See with_timeout() and with_deadline() to override the timeouts
+        for some calls only.
         """
         self.ikey = ikey
         self.skey = skey
@@ -98,6 +274,26 @@ class Client(object):
         if ca_certs is None:
             ca_certs = DEFAULT_CA_CERTS
         self.ca_certs = ca_certs
+        self.pool_size = pool_size
+        self.pool_idle_timeout = pool_idle_timeout
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.resolver = resolver
+        self.deadline = deadline
+        # Absolute time by which calls must finish (see with_deadline()).
+        self.expires = None
+        # Optional warmer.ConnectionWarmer calls check before being sent.
+        self.health = None
+        # Connection pools and executors are shared with copies made by
+        # with_timeout() and with_deadline().
+        self._pools = {}
+        self._pools_lock = threading.Lock()
+        self._executors = {}
+        # Per-thread expiry of the call in progress, for _make_request().
+        self._call = threading.local()
+        self._signer = None
         self.set_proxy(host=None, proxy_type=None)
 
     def set_proxy(self, host, port=None, headers=None,
@@ -115,14 +311,117 @@ class Client(object):
         self.proxy_port = port
         self.proxy_type = proxy_type
 
-    def api_call(self, method, path, params):
+    def with_timeout(self, connect_timeout=_UNSET, read_timeout=_UNSET,
+                     deadline=_UNSET):
+        """
+        Return a copy of this client whose calls use the given timeouts
+        (see __init__()) instead of this client's, e.g.:
+
+            admin.with_timeout(deadline=5).get_users()
+
+        The copy shares this client's connections and workers, so it is
+        cheap to make one for a single call.
+        """
+        client = copy.copy(self)
+        if connect_timeout is not _UNSET:
+            client.connect_timeout = connect_timeout
+        if read_timeout is not _UNSET:
+            client.read_timeout = read_timeout
+        if deadline is not _UNSET:
+            client.deadline = deadline
+        return client
+
+    def with_deadline(self, seconds):
+        """
+        Return a copy of this client whose calls must all finish within
+        seconds from now, e.g. a series of auth_status() long-polls.
+        Calls past that time raise DeadlineExceeded. Shares connections
+        and workers like with_timeout().
+        """
+        client = copy.copy(self)
+        expires = time.time() + seconds
+        if self.expires is not None:
+            expires = min(expires, self.expires)
+        client.expires = expires
+        return client
+
+    def _call_expires(self):
+        """
+        Return the time by which a call starting now must finish, or
+        None.
+        """
+        expires = self.expires
+        if self.deadline is not None:
+            call_expires = time.time() + self.deadline
+            if expires is None or call_expires < expires:
+                expires = call_expires
+        return expires
+
+    def api_call(self, method, path, params, stream=False):
         """
         Call a Duo API method. Return a (status, reason, data) tuple.
+
+        If stream is True, the body is left unread: data is None and
+        response is a PooledResponse to read it from.
+
+        Raises DeadlineExceeded if the call's deadline is up before a
+        request can be sent. A retry that would not start before the
+        deadline is not made: the last response is returned, or the
+        last error raised.
         """
         # urllib cannot handle unicode strings properly. quote() excepts,
         # and urlencode() replaces them with '?'.
         params = encode_params(params)
 
+        expires = self._call_expires()
+        attempt = 0
+        while True:
+            if self.health is not None:
+                self.health.check()
+            if expires is not None and time.time() >= expires:
+                raise DeadlineExceeded('Deadline exceeded calling %s' %
+                                       (path,))
+            if self.rate_limiter is not None:
+                if expires is None:
+                    self.rate_limiter.acquire()
+                elif self.rate_limiter.acquire(expires) is None:
+                    raise DeadlineExceeded(
+                        'Rate limit would delay %s past its deadline' %
+                        (path,))
+            policy = self.retry_policy
+            self._call.expires = expires
+            try:
+                (response, data) = self._signed_request(method, path, params,
+                                                        stream=stream)
+            except (httplib.HTTPException, socket.error) as e:
+                if (policy is None
+                    or not policy.should_retry(attempt, method, error=e)):
+                    raise
+                delay = policy.backoff(attempt)
+                if expires is not None and time.time() + delay >= expires:
+                    raise
+            else:
+                if (policy is None
+                    or not policy.should_retry(attempt, method,
+                                               status=response.status)):
+                    return (response, data)
+                delay = policy.backoff(attempt, response)
+                if expires is not None and time.time() + delay >= expires:
+                    return (response, data)
+                if stream:
+                    response.read()
+                if response.status == 429 and self.rate_limiter is not None:
+                    # Slow down every caller sharing the limiter.
+                    self.rate_limiter.penalize(delay)
+            finally:
+                self._call.expires = None
+            time.sleep(delay)
+            attempt += 1
+
+    def _signed_request(self, method, path, params, stream=False):
+        """
+        Sign and send a single request. Return a (response, data) tuple.
+        """
         if self.sig_timezone == 'UTC':
             now = email.utils.formatdate()
         elif pytz is None:
@@ -131,14 +430,12 @@ class Client(object):
             d = datetime.datetime.now(pytz.timezone(self.sig_timezone))
             now = d.strftime("%a, %d %b %Y %H:%M:%S %z")
 
-        auth = sign(self.ikey,
-                    self.skey,
-                    method,
-                    self.host,
-                    path,
-                    now,
-                    self.sig_version,
-                    params)
+        auth = self._get_signer().sign(method,
+                                       self.host,
+                                       path,
+                                       now,
+                                       self.sig_version,
+                                       params)
         headers = {
             'Authorization': auth,
             'Date': now,
@@ -152,17 +449,57 @@ class Client(object):
             body = None
             uri = path + '?' + urllib.urlencode(params, doseq=True)
 
+        if self.proxy_type == 'CONNECT':
+            # Ensure the request has the correct Host.
+            uri = ''.join((self._api_proto(), '://', self.host, uri))
+
+        (response, data) = self._make_request(method, uri, body, headers,
+                                              stream=stream)
+        return (response, data)
+
+    def _get_signer(self):
+        """
+        Return a Signer for the current ikey and skey.
+        """
+        signer = self._signer
+        if (signer is None
+            or signer.ikey != self.ikey
+            or signer.skey != self.skey):
+            signer = Signer(self.ikey, self.skey)
+            self._signer = signer
+        return signer
+
+    def _api_proto(self):
+        if self.ca_certs == 'HTTP':
+            return 'http'
+        return 'https'
+
+    def _connection_key(self):
+        """
+        Return a key identifying where connections from this client go.
+        Connections are only reused between calls with the same key.
+        """
+        return (self.host, self.ca_certs,
+                self.proxy_type, self.proxy_host, self.proxy_port)
+
+    def _new_connection(self):
+        """
+        Return a new, unconnected connection to the API server.
+        """
         # Host and port for the HTTP(S) connection to the API server.
+        api_host = self.host
         if self.ca_certs == 'HTTP':
             api_port = 80
-            api_proto = 'http'
         else:
             api_port = 443
-            api_proto = 'https'
+        if api_host.count(':') == 1:
+            # Explicit port, e.g. a local test server.
+            (api_host, api_port) = api_host.split(':')
+            api_port = int(api_port)
 
         # Host and port for outer HTTP(S) connection if proxied.
         if self.proxy_type is None:
-            host = self.host
+            host = api_host
             port = api_port
         elif self.proxy_type == 'CONNECT':
             host = self.proxy_host
@@ -171,37 +508,193 @@ class Client(object):
             raise NotImplementedError('proxy_type=%s' % (self.proxy_type,))
 
         # Create outer HTTP(S) connection.
+        kwargs = {
+            'connect_timeout': self.connect_timeout,
+            'timeout': self.read_timeout,
+            'resolver': self.resolver,
+        }
         if self.ca_certs == 'HTTP':
-            conn = httplib.HTTPConnection(host, port)
+            conn = ResolvingHTTPConnection(host, port, **kwargs)
         elif self.ca_certs == 'DISABLE':
-            conn = httplib.HTTPSConnection(host, port)
+            conn = CertValidatingHTTPSConnection(host, port, ca_certs=None,
+                                                 **kwargs)
         else:
             conn = CertValidatingHTTPSConnection(host,
                                                  port,
-                                                 ca_certs=self.ca_certs)
+                                                 ca_certs=self.ca_certs,
+                                                 **kwargs)
 
         # Configure CONNECT proxy tunnel, if any.
         if self.proxy_type == 'CONNECT':
-            # Ensure the request has the correct Host.
-            uri = ''.join((api_proto, '://', self.host, uri))
             if hasattr(conn, 'set_tunnel'): # 2.7+
-                conn.set_tunnel(self.host,
+                conn.set_tunnel(api_host,
                                 api_port,
                                 self.proxy_headers)
             elif hasattr(conn, '_set_tunnel'): # 2.6.3+
                 # pylint: disable=E1103
-                conn._set_tunnel(self.host,
+                conn._set_tunnel(api_host,
                                  api_port,
                                  self.proxy_headers)
                 # pylint: enable=E1103
+        return conn
 
-        conn.request(method, uri, body, headers)
-        response = conn.getresponse()
-        data = response.read()
-        conn.close()
-
+    def _get_pool(self):
+        """
+        Return the connection pool for the current host and proxy settings.
+        """
+        key = self._connection_key()
+        with self._pools_lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = ConnectionPool(self._new_connection,
+                                      maxsize=self.pool_size,
+                                      idle_timeout=self.pool_idle_timeout)
+                self._pools[key] = pool
+        return pool
+
+    def _set_timeouts(self, conn):
+        """
+        Apply this client's timeouts to conn for the next request,
+        shortened to the time left before the call in progress expires.
+        """
+        connect_timeout = self.connect_timeout
+        read_timeout = self.read_timeout
+        expires = getattr(self._call, 'expires', None)
+        if expires is not None:
+            remaining = expires - time.time()
+            connect_timeout = _min_timeout(connect_timeout, remaining)
+            read_timeout = _min_timeout(read_timeout, remaining)
+        conn.connect_timeout = connect_timeout
+        conn.timeout = read_timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(read_timeout)
+
+    def _make_request(self, method, uri, body, headers, stream=False):
+        """
+        Send one request over a pooled connection. Return a
+        (response, data) tuple with the whole body read, or a
+        (PooledResponse, None) tuple if stream is True.
+        """
+        pool = self._get_pool()
+        (conn, reused) = pool.get()
+        if reused and _connection_dropped(conn):
+            conn.close()
+            (conn, reused) = (pool.factory(), False)
+        replayable = method.upper() in REPLAYABLE_METHODS
+        while True:
+            sent = False
+            try:
+                self._set_timeouts(conn)
+                conn.request(method, uri, body, headers)
+                sent = True
+                response = conn.getresponse()
+                break
+            except (httplib.HTTPException, socket.error) as e:
+                conn.close()
+                # The server may have closed an idle keep-alive
+                # connection just as it was reused. Resend once on a
+                # fresh connection, unless the request may have been
+                # processed: it timed out, or got past sending and
+                # failed otherwise than by the connection closing.
+                if (not reused or not replayable
+                    or isinstance(e, socket.timeout)
+                    or (sent and not _stale_connection_error(e))):
+                    raise
+                (conn, reused) = (pool.factory(), False)
+
+        response = PooledResponse(response, conn, pool)
+        if stream:
+            return (response, None)
+        try:
+            data = response.read()
+        except:
+            response.close()
+            raise
         return (response, data)
 
+    def warm_connections(self, count):
+        """
+        Open connections to the API host until count are idle in the
+        pool. Return the number opened.
+        """
+        return self._get_pool().warm(count)
+
+    def close(self):
+        """
+        Close all idle pooled connections and stop the workers used by
+        submit(). The client may still be used afterwards; connections
+        and workers are started again as needed.
+        """
+        with self._pools_lock:
+            pools = self._pools.values()
+            self._pools.clear()
+            executors = self._executors.values()
+            self._executors.clear()
+        for pool in pools:
+            pool.close()
+        for executor in executors:
+            executor.shutdown(wait=False)
+
+    def submit(self, method, *args, **kwargs):
+        """
+        Start a call to a method of this client without blocking and
+        return an executor.Future for its result.
+
+        method - Name of a method of this client (e.g. 'auth_status'),
+                 or any callable.
+
+        Calls run on a shared pool of pool_size worker threads, so any
+        number may be outstanding while at most pool_size are in flight.
+        Use Future.add_done_callback() to hand results back to an event
+        loop, or Future.result() to wait.
+        """
+        if callable(method):
+            func = method
+        else:
+            func = getattr(self, method)
+        with self._pools_lock:
+            executor = self._executors.get(self.pool_size)
+            if executor is None:
+                executor = Executor(self.pool_size)
+                self._executors[self.pool_size] = executor
+        return executor.submit(func, *args, **kwargs)
+
+    def map(self, method, kwargs_list, max_workers=None):
+        """
+        Call method once for each dict of keyword arguments in
+        kwargs_list, running up to max_workers calls concurrently over
+        this client's shared connection pool.
+
+        method - Name of a method of this client (e.g. 'add_user'), or
+                 any callable taking keyword arguments.
+        max_workers - Number of threads. Defaults to pool_size, so that
+                      every worker can keep its connection alive.
+
+        Returns a list of MapResult(kwargs, result, error) tuples in the
+        same order as kwargs_list. A failed call does not stop the
+        others; its exception is returned as error and result is None.
+        """
+        if callable(method):
+            func = method
+        else:
+            func = getattr(self, method)
+        if max_workers is None:
+            max_workers = self.pool_size
+
+        executor = Executor(max_workers)
+        results = []
+        try:
+            for (kwargs, future) in executor.imap(lambda kw: func(**kw),
+                                                  kwargs_list):
+                error = future.exception()
+                if error is None:
+                    results.append(MapResult(kwargs, future.result(), None))
+                else:
+                    results.append(MapResult(kwargs, None, error))
+        finally:
+            executor.shutdown(wait=False)
+        return results
+
     def json_api_call(self, method, path, params):
         """
         Call a Duo API method which is expected to return a JSON body
@@ -211,10 +704,92 @@ class Client(object):
         (response, data) = self.api_call(method, path, params)
         return self.parse_json_response(response, data)
 
+    def json_paging_api_call(self, method, path, params, limit,
+                             prefetch=False):
+        """
+        Call a paginated Duo API method, yielding each object of every
+        page as the page arrives. Pages of up to limit objects are
+        requested with limit/offset parameters until the response
+        metadata has no next_offset.
+
+        prefetch - If True, request the next page in the background
+                   while the current one is consumed. Pages are fetched
+                   on a thread of their own rather than by the submit()
+                   workers, so paging from a submitted call cannot wait
+                   on a worker that is waiting for it.
+
+        Raises RuntimeError like json_api_call().
+        """
+        def fetch(offset):
+            page_params = dict(params)
+            page_params['limit'] = str(int(limit))
+            page_params['offset'] = str(int(offset))
+            (response, data) = self.api_call(method, path, page_params)
+            return self.parse_json_response_and_metadata(response, data)
+
+        executor = None
+        if prefetch:
+            executor = Executor(1)
+        try:
+            (objects, metadata) = fetch(0)
+            while True:
+                next_offset = metadata.get('next_offset')
+                if next_offset is not None and executor is not None:
+                    next_page = executor.submit(fetch, next_offset)
+                else:
+                    next_page = None
+                for obj in objects:
+                    yield obj
+                if next_offset is None:
+                    return
+                if next_page is not None:
+                    (objects, metadata) = next_page.result()
+                else:
+                    (objects, metadata) = fetch(next_offset)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False)
+
+    def json_stream_api_call(self, method, path, params):
+        """
+        Call a Duo API method which is expected to return a JSON list
+        with a 200 status, yielding each element as it is decoded from
+        the socket instead of reading the whole body first.
+
+        Raises RuntimeError like json_api_call(). An error envelope is
+        detected as soon as it is read; a "stat" member that follows
+        the list is checked once the list has been consumed.
+        """
+        (response, _) = self.api_call(method, path, params, stream=True)
+        try:
+            if response.status != 200:
+                self.parse_json_response(response, response.read())
+            envelope = {}
+            try:
+                for obj in jsonstream.iter_response(response.read, envelope):
+                    if envelope.get('stat', 'OK') != 'OK':
+                        break
+                    yield obj
+            except ValueError as e:
+                raise RuntimeError('Received bad response: %s' % (e,))
+            if envelope.get('stat') != 'OK':
+                raise RuntimeError('Received error response: %s' % envelope)
+            # Consume any trailing data so the connection can be reused.
+            response.read()
+        finally:
+            response.close()
+
     def parse_json_response(self, response, data):
         """
         Return the parsed data structure or raise RuntimeError.
         """
+        return self.parse_json_response_and_metadata(response, data)[0]
+
+    def parse_json_response_and_metadata(self, response, data):
+        """
+        Return a (response, metadata) tuple of the parsed data structure
+        and the paging metadata ({} if absent), or raise RuntimeError.
+        """
         if response.status != 200:
             msg = 'Received %s %s' % (response.status, response.reason)
             try:
@@ -242,7 +817,7 @@ class Client(object):
             data = json.loads(data)
             if data['stat'] != 'OK':
                 raise RuntimeError('Received error response: %s' % data)
-            return data['response']
+            return (data['response'], data.get('metadata', {}))
         except (ValueError, KeyError, TypeError):
             raise RuntimeError('Received bad response: %s' % data)
 
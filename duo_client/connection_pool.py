@@ -0,0 +1,133 @@
+"""
+Bounded pool of reusable HTTP/1.1 keep-alive connections.
+"""
+
+import collections
+import threading
+import time
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_POOL_IDLE_TIMEOUT = 60
+
+
+class ConnectionPool(object):
+    """
+    Keeps up to maxsize idle connections to a single host for reuse.
+
+    factory - Callable returning a new, unconnected httplib connection.
+    maxsize - Maximum number of idle connections kept open. Connections
+              returned while the pool is full are closed instead.
+    idle_timeout - Seconds an idle connection may sit in the pool before
+                   it is closed rather than reused.
+
+    The pool never blocks: get() creates a new connection whenever no
+    idle one is available. It is safe to share between threads.
+    """
+
+    def __init__(self, factory,
+                 maxsize=DEFAULT_POOL_SIZE,
+                 idle_timeout=DEFAULT_POOL_IDLE_TIMEOUT):
+        self.factory = factory
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        # (connection, time returned) pairs, oldest on the left.
+        self._idle = collections.deque()
+        # Connections being opened by warm(), counted as idle by other
+        # warm() calls so that they do not open them again.
+        self._warming = 0
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        """
+        Remove and return idle connections older than idle_timeout.
+        Must be called with the lock held.
+        """
+        expired = []
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            expired.append(self._idle.popleft()[0])
+        return expired
+
+    def get(self):
+        """
+        Return a (connection, reused) tuple. reused is True if the
+        connection was taken from the pool and may have gone stale.
+        """
+        with self._lock:
+            expired = self._expire(time.time())
+            if self._idle:
+                conn = self._idle.pop()[0]
+            else:
+                conn = None
+        for stale in expired:
+            stale.close()
+        if conn is not None:
+            return (conn, True)
+        return (self.factory(), False)
+
+    def put(self, conn):
+        """
+        Return a connection to the pool after its response has been
+        fully read.
+        """
+        if getattr(conn, 'sock', None) is None:
+            # Closed by httplib (e.g. "Connection: close"); nothing to keep.
+            conn.close()
+            return
+        with self._lock:
+            expired = self._expire(time.time())
+            if len(self._idle) < self.maxsize:
+                self._idle.append((conn, time.time()))
+                conn = None
+        for stale in expired:
+            stale.close()
+        if conn is not None:
+            conn.close()
+
+    def warm(self, count):
+        """
+        Open new connections until at least count (at most maxsize) are
+        idle, so that later requests skip the TCP and TLS handshakes.
+        Return the number of connections opened.
+        """
+        count = min(count, self.maxsize)
+        with self._lock:
+            expired = self._expire(time.time())
+            missing = max(count - len(self._idle) - self._warming, 0)
+            self._warming += missing
+        for stale in expired:
+            stale.close()
+        pending = missing
+        try:
+            while pending:
+                conn = self.factory()
+                try:
+                    conn.connect()
+                except:
+                    conn.close()
+                    raise
+                self.put(conn)
+                with self._lock:
+                    self._warming -= 1
+                pending -= 1
+        finally:
+            if pending:
+                with self._lock:
+                    self._warming -= pending
+        return missing
+
+    def idle_count(self):
+        """
+        Return the number of idle connections currently pooled.
+        """
+        with self._lock:
+            return len(self._idle)
+
+    def close(self):
+        """
+        Close all idle connections.
+        """
+        with self._lock:
+            idle = [conn for (conn, _) in self._idle]
+            self._idle.clear()
+        for conn in idle:
+            conn.close()
@@ -0,0 +1,149 @@
+"""
+Enrichment of authentication log events with user and integration
+details.
+
+Log events only name the user and the integration. Enricher adds
+fields from the user and integration objects, looking them up through
+caches so that a large export makes one request per unknown user (or
+none after warm()) instead of one per event:
+
+    enricher = Enricher(admin)
+    enricher.warm()
+    for event in enricher.iter_enrich(admin.iter_authentication_log()):
+        ship(event)
+"""
+
+from cache import Cache
+from cache import DEFAULT_MAXSIZE
+from cache import DEFAULT_TTL
+
+# Unknown usernames are looked up again after this many seconds.
+DEFAULT_NEGATIVE_TTL = 60
+
+ENRICHED_EVENTTYPES = ('authentication',)
+
+
+def user_fields(user):
+    """
+    Return the fields added to an event for its user object.
+    """
+    return {
+        'user_email': user.get('email'),
+        'user_realname': user.get('realname'),
+        'user_status': user.get('status'),
+        'user_groups': ', '.join(
+            group.get('name', '') for group in user.get('groups', [])),
+        'user_phone_platforms': ', '.join(sorted(set(
+            phone['platform'] for phone in user.get('phones', [])
+            if phone.get('platform')))),
+    }
+
+
+def integration_fields(integration):
+    """
+    Return the fields added to an event for its integration object.
+    """
+    return {
+        'integration_type': integration.get('type'),
+        'integration_key': integration.get('integration_key'),
+    }
+
+
+# Every field added by the default user_fields and integration_fields.
+ENRICHED_FIELDS = (
+    'user_email', 'user_realname', 'user_status', 'user_groups',
+    'user_phone_platforms', 'integration_type', 'integration_key',
+)
+
+
+class Enricher(object):
+    """
+    Adds user and integration details to authentication events.
+
+    Users are cached by username for ttl seconds, in an LRU cache of
+    cache_size entries; usernames the API does not know are cached for
+    negative_ttl seconds. Integrations are few and cannot be looked up
+    by name, so the whole list is cached and fetched again every ttl
+    seconds.
+
+    user_fields, integration_fields - Functions returning the fields to
+              add for a user or integration object (see the module
+              functions of the same names).
+    """
+
+    def __init__(self, admin, cache_size=DEFAULT_MAXSIZE, ttl=DEFAULT_TTL,
+                 negative_ttl=DEFAULT_NEGATIVE_TTL,
+                 user_fields=user_fields,
+                 integration_fields=integration_fields):
+        self.admin = admin
+        self.ttl = ttl
+        self.user_fields = user_fields
+        self.integration_fields = integration_fields
+        self.users = Cache(
+            cache_size, ttl,
+            ttl_for=lambda user: ttl if user is not None else negative_ttl)
+        self.integrations = Cache(1, ttl)
+        self._warmed = Cache(1, ttl)
+
+    def warm(self):
+        """
+        Load all users and integrations with a few paged requests.
+        Users beyond the cache size are not kept.
+        """
+        for user in self.admin.iter_users(limit=300):
+            self.users.put(user['username'], user)
+        self.integrations.put(None, self._load_integrations())
+
+    def ensure_warm(self):
+        """
+        Call warm() unless it was called in the last ttl seconds. Other
+        threads calling ensure_warm() meanwhile wait for it to finish.
+        """
+        self._warmed.get(None, self.warm)
+
+    def _load_integrations(self):
+        return dict((integration['name'], integration)
+                    for integration in self.admin.iter_integrations(
+                        limit=300))
+
+    def _load_user(self, username):
+        users = self.admin.get_users_by_name(username)
+        if users:
+            return users[0]
+        return None
+
+    def user(self, username):
+        """
+        Return the user object for username, or None if there is none.
+        """
+        return self.users.get(username, lambda: self._load_user(username))
+
+    def integration(self, name):
+        """
+        Return the integration object named name, or None.
+        """
+        return self.integrations.get(None, self._load_integrations).get(name)
+
+    def enrich(self, event):
+        """
+        Return a copy of event with fields of its user and integration
+        added. Other event types are returned unchanged.
+        """
+        if event.get('eventtype') not in ENRICHED_EVENTTYPES:
+            return event
+        event = dict(event)
+        username = event.get('username')
+        if username:
+            user = self.user(username)
+            if user is not None:
+                event.update(self.user_fields(user))
+        name = event.get('integration')
+        if name:
+            integration = self.integration(name)
+            if integration is not None:
+                event.update(self.integration_fields(integration))
+        return event
+
+    def iter_enrich(self, events):
+        for event in events:
+            yield self.enrich(event)
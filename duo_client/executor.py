@@ -0,0 +1,173 @@
+"""
+Minimal thread pool and futures for running API calls concurrently.
+"""
+
+import collections
+import logging
+import Queue
+import sys
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class Future(object):
+    """
+    The eventual outcome of a call submitted to an Executor.
+    """
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self._result = None
+        self._exc_info = None
+
+    def done(self):
+        """
+        Return True if the call has finished.
+        """
+        return self._done.is_set()
+
+    def _wait(self, timeout):
+        if not self._done.wait(timeout):
+            raise RuntimeError('Timed out waiting for result')
+
+    def result(self, timeout=None):
+        """
+        Return the call's result, re-raising its exception if it failed.
+        Raises RuntimeError if timeout seconds pass first.
+        """
+        self._wait(timeout)
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+    def exception(self, timeout=None):
+        """
+        Return the exception raised by the call, or None.
+        """
+        self._wait(timeout)
+        if self._exc_info is not None:
+            return self._exc_info[1]
+        return None
+
+    def add_done_callback(self, fn):
+        """
+        Call fn(future) when the call finishes, or now if it already has.
+        """
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(fn)
+                return
+        self._call(fn)
+
+    def _call(self, fn):
+        """
+        Call a done callback. Its errors are logged rather than raised,
+        so that a failing callback cannot kill the worker thread
+        finishing the future.
+        """
+        try:
+            fn(self)
+        except Exception:
+            logger.exception('Exception in future done callback %r', fn)
+
+    def set_result(self, result):
+        self._finish(result, None)
+
+    def set_exception(self, exc_info):
+        """
+        exc_info - A (type, value, traceback) tuple from sys.exc_info().
+        """
+        self._finish(None, exc_info)
+
+    def _finish(self, result, exc_info):
+        with self._lock:
+            self._result = result
+            self._exc_info = exc_info
+            self._done.set()
+            callbacks = self._callbacks
+            self._callbacks = []
+        for fn in callbacks:
+            self._call(fn)
+
+
+class Executor(object):
+    """
+    Runs submitted calls on up to max_workers daemon threads.
+    """
+
+    def __init__(self, max_workers):
+        if max_workers < 1:
+            raise ValueError('max_workers must be at least 1')
+        self.max_workers = max_workers
+        self._queue = Queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._shutdown = False
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            (future, fn, args, kwargs) = item
+            try:
+                result = fn(*args, **kwargs)
+            except Exception:
+                future.set_exception(sys.exc_info())
+            else:
+                future.set_result(result)
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Schedule fn(*args, **kwargs) and return a Future for it.
+        """
+        future = Future()
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError('Executor has been shut down')
+            self._queue.put((future, fn, args, kwargs))
+            if len(self._threads) < self.max_workers:
+                thread = threading.Thread(target=self._worker)
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+        return future
+
+    def imap(self, fn, iterable, window=None):
+        """
+        Yield an (item, future) pair for fn(item) for each item of
+        iterable, in input order. At most window calls (default: twice
+        max_workers) are outstanding at once, so iterable may be large
+        or lazy.
+        """
+        if window is None:
+            window = 2 * self.max_workers
+        pending = collections.deque()
+        for item in iterable:
+            pending.append((item, self.submit(fn, item)))
+            if len(pending) >= window:
+                (item, future) = pending.popleft()
+                future.exception()
+                yield (item, future)
+        while pending:
+            (item, future) = pending.popleft()
+            future.exception()
+            yield (item, future)
+
+    def shutdown(self, wait=True):
+        """
+        Stop the workers after queued calls finish.
+        """
+        with self._lock:
+            if self._shutdown:
+                return
+            self._shutdown = True
+            threads = list(self._threads)
+        for _ in threads:
+            self._queue.put(None)
+        if wait:
+            for thread in threads:
+                thread.join()
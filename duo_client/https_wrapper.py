@@ -22,9 +22,54 @@
 import httplib
 import re
 import socket
+import threading
 import urllib2
 import ssl
 
+import resolver as resolver_module
+
+
+# SSLContext (Python 2.7.9+) lets the CA bundle be parsed once and
+# shared by every connection; older versions fall back to wrap_socket.
+_HAS_SSL_CONTEXT = hasattr(ssl, 'SSLContext')
+
+_ssl_contexts = {}
+_ssl_contexts_lock = threading.Lock()
+
+
+def _GetSSLContext(ca_certs, key_file=None, cert_file=None):
+  """Returns a shared SSLContext for the given certificate files.
+
+  The context is built on first use and cached for the life of the
+  process, so the CA bundle is only loaded once.
+
+  Args:
+    ca_certs: A file containing a set of concatenated certificate authority
+        certs, or None to disable certificate validation.
+    key_file: A file containing the client's private key
+    cert_file: A file containing the client's certificates
+  Returns:
+    ssl.SSLContext: The shared context.
+  """
+  key = (ca_certs, key_file, cert_file)
+  with _ssl_contexts_lock:
+    context = _ssl_contexts.get(key)
+    if context is None:
+      context = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
+      context.options |= ssl.OP_NO_SSLv2
+      context.options |= ssl.OP_NO_SSLv3
+      if ca_certs:
+        context.verify_mode = ssl.CERT_REQUIRED
+        context.check_hostname = True
+        context.load_verify_locations(cafile=ca_certs)
+      else:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+      if cert_file:
+        context.load_cert_chain(cert_file, key_file)
+      _ssl_contexts[key] = context
+  return context
+
 
 class InvalidCertificateException(httplib.HTTPException):
   """Raised when a certificate is provided with an invalid hostname."""
@@ -48,7 +93,45 @@ class InvalidCertificateException(httplib.HTTPException):
             (self.host, self.reason, self.cert))
 
 
-class CertValidatingHTTPSConnection(httplib.HTTPConnection):
+class ResolvingHTTPConnection(httplib.HTTPConnection):
+  """An HTTPConnection that resolves its host through a caching resolver
+  and races the host's addresses when connecting."""
+
+  def __init__(self, host, port=None, strict=None, connect_timeout=None,
+               resolver=None, **kwargs):
+    """Constructor.
+
+    Args:
+      host: The hostname. Can be in 'host:port' form.
+      port: The port.
+      strict: See httplib.HTTPConnection.
+      connect_timeout: Seconds to wait for the TCP connection, or None.
+      resolver: A resolver.Resolver, or None for the shared default.
+      timeout: Seconds to wait for each read once connected, or None.
+    """
+    httplib.HTTPConnection.__init__(self, host, port, strict, **kwargs)
+    self.connect_timeout = connect_timeout
+    self.resolver = resolver
+
+  def _read_timeout(self):
+    if self.timeout is socket._GLOBAL_DEFAULT_TIMEOUT:
+      return socket.getdefaulttimeout()
+    return self.timeout
+
+  def _create_socket(self):
+    """Returns a socket connected to the host (or the proxy)."""
+    return resolver_module.create_connection(
+        self.host, self.port, connect_timeout=self.connect_timeout,
+        read_timeout=self._read_timeout(), resolver=self.resolver)
+
+  def connect(self):
+    "Connect to the host on the given port."
+    self.sock = self._create_socket()
+    if self._tunnel_host:
+      self._tunnel()
+
+
+class CertValidatingHTTPSConnection(ResolvingHTTPConnection):
   """An HTTPConnection that connects over SSL and validates certificates."""
 
   default_port = httplib.HTTPS_PORT
@@ -66,8 +149,9 @@ class CertValidatingHTTPSConnection(httplib.HTTPConnection):
           certs for validating the server against.
       strict: When true, causes BadStatusLine to be raised if the status line
           can't be parsed as a valid HTTP/1.0 or 1.1 status line.
+      Other keyword arguments are passed to ResolvingHTTPConnection.
     """
-    httplib.HTTPConnection.__init__(self, host, port, strict, **kwargs)
+    ResolvingHTTPConnection.__init__(self, host, port, strict, **kwargs)
     self.key_file = key_file
     self.cert_file = cert_file
     self.ca_certs = ca_certs
@@ -108,18 +192,26 @@ class CertValidatingHTTPSConnection(httplib.HTTPConnection):
 
   def connect(self):
     "Connect to a host on a given (SSL) port."
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock.connect((self.host, self.port))
-    self.sock = sock
+    self.sock = self._create_socket()
     if self._tunnel_host:
       self._tunnel()
+    # When tunneling through a proxy, the certificate must match the
+    # API host rather than the proxy.
+    hostname = self._tunnel_host or self.host
+    if _HAS_SSL_CONTEXT:
+      context = _GetSSLContext(self.ca_certs, self.key_file, self.cert_file)
+      try:
+        self.sock = context.wrap_socket(self.sock, server_hostname=hostname)
+      except ssl.CertificateError, e:
+        self.sock.close()
+        raise InvalidCertificateException(hostname, '', str(e))
+      return
     self.sock = ssl.wrap_socket(self.sock, keyfile=self.key_file,
                                 certfile=self.cert_file,
                                 cert_reqs=self.cert_reqs,
                                 ca_certs=self.ca_certs)
     if self.cert_reqs & ssl.CERT_REQUIRED:
       cert = self.sock.getpeercert()
-      hostname = self.host.split(':', 0)[0]
       if not self._ValidateCertificateHostname(cert, hostname):
         raise InvalidCertificateException(hostname, cert, 'hostname mismatch')
 
@@ -0,0 +1,115 @@
+"""
+Incremental decoding of Duo API JSON responses.
+
+A Duo response body is an envelope object such as
+{"stat": "OK", "response": [...], "metadata": {...}}. iter_response()
+reads the body a chunk at a time and yields the elements of the
+"response" array as they are decoded, so only one element and one
+chunk need to be held in memory at a time.
+"""
+
+import json
+import re
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_decoder = json.JSONDecoder()
+
+
+class _Reader(object):
+    """
+    Buffered JSON token reader over a read(size) callable.
+    """
+
+    def __init__(self, read, chunk_size):
+        self.read = read
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """
+        Append more input to the buffer, dropping what has been consumed.
+        """
+        if self.eof:
+            raise ValueError('Unexpected end of JSON input')
+        # Read at least as much as is buffered so a value spanning many
+        # chunks is re-scanned O(log n) times rather than O(n) times.
+        size = max(self.chunk_size, len(self.buf) - self.pos)
+        chunk = self.read(size)
+        if not chunk:
+            self.eof = True
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+
+    def peek(self):
+        """
+        Return the next non-whitespace character without consuming it.
+        """
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            self.fill()
+
+    def expect(self, chars):
+        """
+        Consume and return the next character, which must be in chars.
+        """
+        char = self.peek()
+        if char not in chars:
+            raise ValueError('Expected %r at %r' % (chars, char))
+        self.pos += 1
+        return char
+
+    def value(self):
+        """
+        Consume and return the next complete JSON value.
+        """
+        self.peek()
+        while True:
+            try:
+                (obj, end) = _decoder.raw_decode(self.buf, self.pos)
+            except ValueError:
+                end = None
+            # A number at the very end of the buffer may continue in
+            # the next chunk, so only accept values with a terminator.
+            if end is not None and (end < len(self.buf) or self.eof):
+                self.pos = end
+                return obj
+            self.fill()
+
+
+def iter_response(read, envelope, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield the elements of the "response" array of the JSON envelope read
+    with read(size). Every other top-level member (stat, message,
+    metadata, ...) is stored in the envelope dict as it is decoded.
+
+    Raises ValueError if the body is not a JSON object or "response" is
+    present but not an array.
+    """
+    reader = _Reader(read, chunk_size)
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+    while True:
+        key = reader.value()
+        if not isinstance(key, basestring):
+            raise ValueError('Expected object key, got %r' % (key,))
+        reader.expect(':')
+        if key == 'response':
+            reader.expect('[')
+            if reader.peek() == ']':
+                reader.pos += 1
+            else:
+                while True:
+                    yield reader.value()
+                    if reader.expect(',]') == ']':
+                        break
+        else:
+            envelope[key] = reader.value()
+        if reader.expect(',}') == '}':
+            return
@@ -0,0 +1,185 @@
+"""
+Local, indexed store of Admin API log events.
+
+Investigations that go over the same history again and again can query
+a local SQLite database instead of fetching the logs from the API each
+time:
+
+    store = EventStore('duo_events.sqlite')
+    store.add(admin.iter_authentication_log(mintime))
+    failures = store.query(eventtype='authentication', username='alice',
+                           ip='198.51.100.7', result='FAILURE',
+                           mintime=time.time() - 7 * 86400)
+
+Events are stored whole and deduplicated by content (the same hash as
+logtail.event_hash()), so overlapping fetches can be added without
+creating duplicates. EventStore also has the write_many()/flush()/close()
+methods of the output sinks.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+
+from logtail import event_json
+
+# Event keys stored in their own indexed columns, and usable as query
+# filters.
+INDEXED_FIELDS = ('eventtype', 'username', 'ip', 'integration', 'result',
+                  'factor', 'host')
+
+_SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS events ('
+    'id INTEGER PRIMARY KEY, hash BLOB NOT NULL UNIQUE, '
+    'timestamp INTEGER NOT NULL, '
+    + ', '.join('%s TEXT' % field for field in INDEXED_FIELDS) +
+    ', data TEXT NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS events_timestamp ON events (timestamp)',
+] + [
+    'CREATE INDEX IF NOT EXISTS events_%s ON events (%s, timestamp)'
+    % (field, field)
+    for field in ('eventtype', 'username', 'ip', 'integration', 'result')
+]
+
+# Refresh the query planner's statistics once this many events (and at
+# least a tenth of the store) have been added since the last refresh.
+ANALYZE_MIN_ROWS = 1000
+
+
+class EventStore(object):
+    """
+    Log events in a SQLite database at path (':memory:' for a temporary
+    one). Safe to share between threads.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # The store can always be refilled from the API, so trade
+        # durability of the last transactions for fewer fsyncs.
+        self._conn.execute('PRAGMA journal_mode = WAL')
+        self._conn.execute('PRAGMA synchronous = NORMAL')
+        # Sample indexes in ANALYZE (ignored by SQLite before 3.32).
+        self._conn.execute('PRAGMA analysis_limit = 1000')
+        with self._conn:
+            for statement in _SCHEMA:
+                self._conn.execute(statement)
+        self._analyzed_rows = self._conn.execute(
+            'SELECT COUNT(*) FROM events').fetchone()[0]
+        self._added_rows = 0
+
+    def add(self, events):
+        """
+        Store events, in a single transaction. Return the number of
+        events that were not stored already.
+        """
+        rows = []
+        for event in events:
+            data = event_json(event)
+            rows.append(
+                (buffer(hashlib.sha1(data).digest()), event['timestamp'])
+                + tuple(event.get(field) for field in INDEXED_FIELDS)
+                + (data,))
+        placeholders = ', '.join('?' * (len(INDEXED_FIELDS) + 3))
+        with self._lock:
+            before = self._conn.total_changes
+            with self._conn:
+                self._conn.executemany(
+                    'INSERT OR IGNORE INTO events (hash, timestamp, %s, data) '
+                    'VALUES (%s)' % (', '.join(INDEXED_FIELDS), placeholders),
+                    rows)
+            added = self._conn.total_changes - before
+            self._added_rows += added
+            if self._added_rows >= max(ANALYZE_MIN_ROWS,
+                                       self._analyzed_rows // 10):
+                # Without statistics SQLite may pick a poorly selective
+                # index, e.g. result instead of ip.
+                self._conn.execute('ANALYZE')
+                self._analyzed_rows += self._added_rows
+                self._added_rows = 0
+            return added
+
+    def _where(self, mintime, maxtime, filters):
+        clauses = []
+        args = []
+        for (field, value) in sorted(filters.items()):
+            if field not in INDEXED_FIELDS:
+                raise TypeError('Cannot filter on %r' % (field,))
+            if value is None:
+                continue
+            if isinstance(value, (list, tuple, set, frozenset)):
+                value = list(value)
+                clauses.append('%s IN (%s)'
+                               % (field, ', '.join('?' * len(value))))
+                args.extend(value)
+            else:
+                clauses.append('%s = ?' % (field,))
+                args.append(value)
+        if mintime is not None:
+            clauses.append('timestamp >= ?')
+            args.append(mintime)
+        if maxtime is not None:
+            clauses.append('timestamp < ?')
+            args.append(maxtime)
+        if not clauses:
+            return ('', args)
+        return (' WHERE ' + ' AND '.join(clauses), args)
+
+    def query(self, mintime=None, maxtime=None, limit=None, newest_first=False,
+              **filters):
+        """
+        Return the stored events matching every filter, in timestamp
+        order.
+
+        mintime, maxtime - Only events with mintime <= timestamp <
+                           maxtime.
+        limit - Return at most this many events.
+        newest_first - Order by descending timestamp.
+        filters - Field name (see INDEXED_FIELDS) to a value, or to a
+                  list of values any of which may match.
+        """
+        (where, args) = self._where(mintime, maxtime, filters)
+        sql = 'SELECT data FROM events' + where + ' ORDER BY timestamp'
+        if newest_first:
+            sql += ' DESC'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            args.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def count(self, mintime=None, maxtime=None, **filters):
+        """
+        Return the number of stored events matching the filters (see
+        query()).
+        """
+        (where, args) = self._where(mintime, maxtime, filters)
+        with self._lock:
+            return self._conn.execute(
+                'SELECT COUNT(*) FROM events' + where, args).fetchone()[0]
+
+    def latest_timestamp(self, eventtype=None):
+        """
+        Return the newest stored timestamp (of one eventtype), or None.
+        """
+        (where, args) = self._where(None, None, {'eventtype': eventtype})
+        with self._lock:
+            return self._conn.execute(
+                'SELECT MAX(timestamp) FROM events' + where,
+                args).fetchone()[0]
+
+    def write_many(self, events):
+        self.add(events)
+
+    def write(self, event):
+        self.add((event,))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,210 @@
+"""
+Continuous, deduplicated tailing of the Admin API logs.
+
+    admin = duo_client.Admin(ikey=..., skey=..., host=...)
+    tailer = LogTailer(admin, checkpoint=FileCheckpointStore('duo.ckpt'))
+    for event in tailer.events():
+        ship(event)
+"""
+
+import hashlib
+import json
+import logging
+import time
+
+LOG_TYPES = ('administrator', 'authentication', 'telephony')
+
+# The log endpoints allow about one request per minute per log type.
+DEFAULT_MIN_INTERVAL = 60
+DEFAULT_MAX_INTERVAL = 300
+
+# Most events the logs API returns for one request.
+LOG_PAGE_SIZE = 1000
+
+logger = logging.getLogger(__name__)
+
+
+def event_json(event):
+    """
+    Return event as compact JSON with sorted keys, the form hashed by
+    event_hash().
+    """
+    return json.dumps(event, sort_keys=True, separators=(',', ':'))
+
+
+def event_hash(event):
+    """
+    Return a stable hex digest of an event's contents.
+    """
+    return hashlib.sha1(event_json(event)).hexdigest()
+
+
+class LogCursor(object):
+    """
+    Position in one log: the newest timestamp delivered, and hashes of
+    the events already delivered with exactly that timestamp.
+
+    The logs API returns events with timestamp >= mintime, so fetching
+    from the cursor's timestamp again returns those events a second
+    time; filter() drops them instead of skipping the whole second (as
+    mintime + 1 would), which could lose events that arrive later with
+    the same timestamp.
+    """
+
+    def __init__(self, timestamp=0, seen=()):
+        self.timestamp = timestamp
+        self.seen = set(seen)
+
+    def filter(self, events):
+        """
+        Yield events not delivered before, advancing the cursor past
+        each. events must be in timestamp order.
+        """
+        for event in events:
+            timestamp = event['timestamp']
+            if timestamp < self.timestamp:
+                continue
+            digest = event_hash(event)
+            if timestamp == self.timestamp:
+                if digest in self.seen:
+                    continue
+            else:
+                self.timestamp = timestamp
+                self.seen = set()
+            self.seen.add(digest)
+            yield event
+
+    def skip_timestamp(self):
+        """
+        Move past the cursor's timestamp, e.g. when a full page of
+        events with that timestamp were all delivered before: fetching
+        from it again would return the same page forever. Events with
+        that timestamp beyond the first page are lost.
+        """
+        logger.warning('More than a page of log events at %d; skipping '
+                       'the rest of that second', self.timestamp)
+        self.timestamp += 1
+        self.seen = set()
+
+    def advance(self, page, page_size=LOG_PAGE_SIZE):
+        """
+        Return the events of page, one API response fetched from this
+        cursor's timestamp, not delivered before, advancing the cursor.
+        A full page without new events makes the cursor skip_timestamp().
+        """
+        page = list(page)
+        new_events = list(self.filter(page))
+        if not new_events and len(page) >= page_size:
+            self.skip_timestamp()
+        return new_events
+
+    def to_dict(self):
+        return {'timestamp': self.timestamp, 'seen': sorted(self.seen)}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d.get('timestamp', 0), d.get('seen', ()))
+
+
+def fetch_log(admin, log_type, mintime):
+    """
+    Return an iterator over events of log_type with timestamp >= mintime,
+    decoded as they arrive.
+    """
+    return getattr(admin, 'iter_%s_log' % log_type)(mintime=mintime)
+
+
+class LogTailer(object):
+    """
+    Polls the administrator, authentication and telephony logs of one
+    Admin API client and yields new events as a single stream.
+
+    log_types - Logs to follow (default: all three).
+    checkpoint - Optional store with load()/save(dict), such as
+                 checkpoint.FileCheckpointStore. Cursors are saved after
+                 each batch has been consumed, so a restarted tailer
+                 continues where the last one stopped. A crash while a
+                 batch is being consumed redelivers that batch.
+    min_interval, max_interval - Bounds in seconds for the adaptive poll
+                 interval. A log that returns events is polled again
+                 after min_interval; each empty poll doubles the
+                 interval up to max_interval.
+    page_size - Most events returned by one request to the logs API.
+    """
+
+    def __init__(self, admin, log_types=LOG_TYPES, checkpoint=None,
+                 min_interval=DEFAULT_MIN_INTERVAL,
+                 max_interval=DEFAULT_MAX_INTERVAL,
+                 clock=time.time, sleep=time.sleep,
+                 page_size=LOG_PAGE_SIZE):
+        self.admin = admin
+        self.page_size = page_size
+        self.log_types = tuple(log_types)
+        self.checkpoint = checkpoint
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self._clock = clock
+        self._sleep = sleep
+        self._stopped = False
+
+        state = {}
+        if checkpoint is not None:
+            state = checkpoint.load()
+        self.cursors = {}
+        for log_type in self.log_types:
+            self.cursors[log_type] = LogCursor.from_dict(
+                state.get(log_type, {}))
+        now = clock()
+        self._interval = dict((t, min_interval) for t in self.log_types)
+        self._next_poll = dict((t, now) for t in self.log_types)
+
+    def poll(self, log_type):
+        """
+        Fetch one batch of log_type and return the new events in it.
+        """
+        cursor = self.cursors[log_type]
+        timestamp = cursor.timestamp
+        events = fetch_log(self.admin, log_type, timestamp)
+        new_events = cursor.advance(events, self.page_size)
+        if not new_events and cursor.timestamp != timestamp:
+            # Skipped a timestamp; nothing is pending delivery.
+            self.save()
+        if new_events or cursor.timestamp != timestamp:
+            self._interval[log_type] = self.min_interval
+        else:
+            self._interval[log_type] = min(self.max_interval,
+                                           self._interval[log_type] * 2)
+        self._next_poll[log_type] = self._clock() + self._interval[log_type]
+        return new_events
+
+    def save(self):
+        """
+        Write all cursors to the checkpoint store, if any.
+        """
+        if self.checkpoint is not None:
+            state = self.checkpoint.load()
+            for (log_type, cursor) in self.cursors.items():
+                state[log_type] = cursor.to_dict()
+            self.checkpoint.save(state)
+
+    def stop(self):
+        """
+        Make events() return after the current batch.
+        """
+        self._stopped = True
+
+    def events(self):
+        """
+        Yield new events from all followed logs until stop() is called.
+        """
+        while not self._stopped:
+            log_type = min(self.log_types, key=self._next_poll.get)
+            wait = self._next_poll[log_type] - self._clock()
+            if wait > 0:
+                self._sleep(wait)
+                continue
+            new_events = self.poll(log_type)
+            for event in new_events:
+                yield event
+            if new_events:
+                self.save()
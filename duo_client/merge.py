@@ -0,0 +1,166 @@
+"""
+Merging log event streams into one time-ordered, deduplicated stream.
+
+merge_events() merges finite streams, such as the iter_*_log()
+generators of several logs and hosts, holding one event per stream:
+
+    streams = [admin.iter_authentication_log(mintime)
+               for admin in admins]
+    for event in merge_events(streams):
+        ship(event)
+
+WatermarkMerger merges sources polled for new batches, such as
+LogTailer polls, and only emits an event once no source can still
+deliver an older one.
+"""
+
+import collections
+import heapq
+import itertools
+
+from logtail import event_hash
+
+# Number of recent event keys remembered to drop duplicates.
+DEFAULT_DEDUP_WINDOW = 100000
+
+# Events buffered by a WatermarkMerger before it emits the oldest ones
+# without waiting for lagging sources.
+DEFAULT_MAX_BUFFERED = 100000
+
+
+def event_key(event):
+    """
+    Return the key identifying duplicates of event.
+    """
+    return (event.get('host'), event.get('eventtype'), event['timestamp'],
+            event_hash(event))
+
+
+class RecentKeys(object):
+    """
+    Set of the last size keys added.
+    """
+
+    def __init__(self, size=DEFAULT_DEDUP_WINDOW):
+        self.size = size
+        self._keys = collections.OrderedDict()
+
+    def add(self, key):
+        """
+        Add key; return False if it was already present.
+        """
+        if key in self._keys:
+            return False
+        self._keys[key] = None
+        if len(self._keys) > self.size:
+            self._keys.popitem(last=False)
+        return True
+
+
+def merge_events(streams, dedup_window=DEFAULT_DEDUP_WINDOW):
+    """
+    Yield the events of streams, each an iterable in timestamp order,
+    in timestamp order and without duplicates (see event_key()).
+    Events with equal timestamps come in the order of their streams.
+    """
+    heap = []
+    for (index, stream) in enumerate(streams):
+        iterator = iter(stream)
+        for event in iterator:
+            heap.append((event['timestamp'], index, event, iterator))
+            break
+    heapq.heapify(heap)
+    seen = RecentKeys(dedup_window)
+    while heap:
+        (timestamp, index, event, iterator) = heap[0]
+        if seen.add(event_key(event)):
+            yield event
+        for event in iterator:
+            heapq.heapreplace(heap,
+                              (event['timestamp'], index, event, iterator))
+            break
+        else:
+            heapq.heappop(heap)
+
+
+class WatermarkMerger(object):
+    """
+    Merges batches of events from polled sources in timestamp order.
+
+    Each source has a watermark: all its events older than the
+    watermark have been added. Events older than the lowest watermark
+    of all sources are ready to emit. When more than max_buffered events
+    wait for a lagging source, the oldest are emitted anyway; events
+    that later arrive older than those are still emitted, out of order,
+    and counted in late.
+    """
+
+    def __init__(self, sources, max_buffered=DEFAULT_MAX_BUFFERED,
+                 dedup_window=DEFAULT_DEDUP_WINDOW):
+        self.watermarks = dict((source, None) for source in sources)
+        self.max_buffered = max_buffered
+        self.late = 0
+        self._heap = []
+        self._counter = itertools.count()
+        self._seen = RecentKeys(dedup_window)
+        self._emitted = None
+
+    def add(self, source, events, watermark=None):
+        """
+        Buffer a batch of events from source, in timestamp order.
+
+        watermark - Timestamp before which source has no more events
+                    to add; the default is the newest timestamp in
+                    events (more events may follow with that timestamp).
+        """
+        for event in events:
+            heapq.heappush(self._heap, (event['timestamp'],
+                                        next(self._counter), event))
+            if watermark is None or event['timestamp'] > watermark:
+                watermark = event['timestamp']
+        if watermark is not None:
+            current = self.watermarks[source]
+            if current is None or watermark > current:
+                self.watermarks[source] = watermark
+
+    def remove(self, source):
+        """
+        Stop waiting for source, e.g. once it is exhausted.
+        """
+        del self.watermarks[source]
+
+    def _pop(self):
+        (timestamp, _, event) = heapq.heappop(self._heap)
+        if self._emitted is not None and timestamp < self._emitted:
+            self.late += 1
+        else:
+            self._emitted = timestamp
+        if self._seen.add(event_key(event)):
+            return event
+        return None
+
+    def ready(self):
+        """
+        Yield the events that are ready to emit, in timestamp order.
+        """
+        watermarks = self.watermarks.values()
+        low = None
+        if watermarks and None not in watermarks:
+            low = min(watermarks)
+        while self._heap:
+            if not (low is not None and self._heap[0][0] < low
+                    or len(self._heap) > self.max_buffered
+                    or not watermarks):
+                break
+            event = self._pop()
+            if event is not None:
+                yield event
+
+    def flush(self):
+        """
+        Yield all buffered events, in timestamp order.
+        """
+        while self._heap:
+            event = self._pop()
+            if event is not None:
+                yield event
@@ -0,0 +1,162 @@
+"""
+Client-side rate limiting and retry policy for Duo API calls.
+"""
+
+import httplib
+import random
+import socket
+import ssl
+import threading
+import time
+
+
+class TokenBucket(object):
+    """
+    Token bucket limiting calls to rate per second on average, with
+    bursts of up to burst calls.
+
+    Callers reserve their slot under a lock and then sleep until it
+    comes up, so concurrent callers are spaced evenly instead of all
+    waking at once. One bucket may be shared by several clients.
+    """
+
+    def __init__(self, rate, burst=1, clock=time.time, sleep=time.sleep):
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        self.rate = float(rate)
+        self.burst = max(1, burst)
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = float(self.burst)
+        self._updated = clock()
+        # No tokens are handed out before this time (see penalize()).
+        self._blocked_until = 0
+
+    def _reserve(self, expires=None):
+        """
+        Take one token, going into debt if none is available. Return
+        the number of seconds the caller must wait before proceeding,
+        or None without taking a token if that is past expires.
+        """
+        with self._lock:
+            now = self._refill()
+            self._tokens -= 1
+            # Callers in debt are spaced 1 / rate apart after the end of
+            # any penalty, rather than all released when it ends.
+            wait = max(0, self._blocked_until - now)
+            if self._tokens < 0:
+                wait += -self._tokens / self.rate
+            if expires is not None and now + wait > expires:
+                self._tokens += 1
+                return None
+            return wait
+
+    def _refill(self):
+        """
+        Add the tokens earned since the last update; none are earned
+        while a penalty lasts. Return the current time. Must be called
+        with the lock held.
+        """
+        now = self._clock()
+        elapsed = max(0, now - max(self._updated, self._blocked_until))
+        self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+        self._updated = now
+        return now
+
+    def try_acquire(self):
+        """
+        Take a token if one is available now, without waiting. Return
+        True if a token was taken.
+        """
+        with self._lock:
+            now = self._refill()
+            if self._tokens < 1 or now < self._blocked_until:
+                return False
+            self._tokens -= 1
+            return True
+
+    def acquire(self, expires=None):
+        """
+        Block until a call may be made. Return the seconds waited.
+
+        expires - Optional time, by the bucket's clock, by which the
+                  call must start. If it cannot, return None at once.
+        """
+        wait = self._reserve(expires)
+        if wait is None:
+            return None
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+    def penalize(self, seconds):
+        """
+        Hold every caller of this bucket back for the next seconds, e.g.
+        after the server answered 429 Too Many Requests.
+        """
+        with self._lock:
+            self._refill()
+            self._blocked_until = max(self._blocked_until,
+                                      self._clock() + seconds)
+            # One token for the first caller once the penalty ends.
+            self._tokens = min(self._tokens, 1)
+
+
+class RetryPolicy(object):
+    """
+    Decides whether and when a failed API call is retried.
+
+    max_retries - Retries after the first attempt.
+    backoff_factor - Base delay in seconds; attempt n waits a random
+                     time up to backoff_factor * 2 ** n ("full jitter").
+    max_backoff - Upper bound for a single delay.
+    retry_statuses - HTTP statuses retried for retry_methods.
+    retry_methods - Methods safe to repeat after a 5xx status or a
+                    connection error, when the server may already have
+                    acted on the request.
+
+    429 Too Many Requests is retried for every method, since the server
+    did not process the request. A Retry-After header is honored.
+    """
+
+    def __init__(self,
+                 max_retries=3,
+                 backoff_factor=0.5,
+                 max_backoff=30,
+                 retry_statuses=(500, 502, 503, 504),
+                 retry_methods=('GET', 'DELETE')):
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.retry_statuses = retry_statuses
+        self.retry_methods = retry_methods
+
+    def should_retry(self, attempt, method, status=None, error=None):
+        """
+        Return True if a call that failed on attempt (counting from 0)
+        with the given HTTP status or exception should be tried again.
+        """
+        if attempt >= self.max_retries:
+            return False
+        if status == 429:
+            return True
+        if method.upper() not in self.retry_methods:
+            return False
+        if error is not None:
+            return (isinstance(error, (socket.error,
+                                       httplib.BadStatusLine,
+                                       httplib.IncompleteRead))
+                    and not isinstance(error, ssl.SSLError))
+        return status in self.retry_statuses
+
+    def backoff(self, attempt, response=None):
+        """
+        Return the seconds to wait before retrying after attempt.
+        """
+        if response is not None:
+            retry_after = response.getheader('Retry-After')
+            if retry_after is not None and retry_after.isdigit():
+                return min(self.max_backoff, int(retry_after))
+        limit = min(self.max_backoff, self.backoff_factor * (2 ** attempt))
+        return random.uniform(0, limit)
@@ -0,0 +1,232 @@
+"""
+Cached name resolution and dual-stack ("Happy Eyeballs") connects.
+
+socket.create_connection() resolves the host on every connect and tries
+its addresses one after another, so a slow resolver or an address that
+silently drops packets (e.g. a broken IPv6 route) delays every new
+connection. Instead, Resolver caches getaddrinfo() results, and
+connect() races the addresses as described in RFC 8305: the next one is
+tried whenever the previous one has not connected within a short delay,
+alternating address families, and the first to connect wins.
+
+getaddrinfo() itself cannot be interrupted, so a lookup given a timeout
+runs on a thread of its own; if it is abandoned, it still completes in
+the background and caches its result for the next connect.
+"""
+
+import errno
+import os
+import select
+import socket
+import threading
+import time
+
+from cache import Cache
+
+# Seconds resolved addresses are reused. getaddrinfo() does not expose
+# the DNS record TTLs, so this is an upper bound on how long a changed
+# record is ignored.
+DEFAULT_TTL = 60
+
+# Seconds to wait for a connection attempt before racing the next
+# address (RFC 8305 recommends 250 ms).
+DEFAULT_ATTEMPT_DELAY = 0.25
+
+# Hosts kept in the cache of a Resolver.
+DEFAULT_MAXSIZE = 256
+
+_CONNECT_IN_PROGRESS = (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN)
+
+
+def interleave(addresses):
+    """
+    Reorder getaddrinfo() results so that address families alternate,
+    starting with the family of the first address.
+    """
+    families = []
+    by_family = {}
+    for address in addresses:
+        family = address[0]
+        if family not in by_family:
+            families.append(family)
+            by_family[family] = []
+        by_family[family].append(address)
+    result = []
+    while len(result) < len(addresses):
+        for family in families:
+            if by_family[family]:
+                result.append(by_family[family].pop(0))
+    return result
+
+
+class Resolver(object):
+    """
+    Resolves host names to stream socket addresses, caching the results
+    for ttl seconds. Failed lookups are not cached. Concurrent lookups
+    of the same host share one getaddrinfo() call.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, maxsize=DEFAULT_MAXSIZE,
+                 getaddrinfo=socket.getaddrinfo, clock=time.time):
+        self._getaddrinfo = getaddrinfo
+        self.cache = Cache(maxsize, ttl, clock=clock)
+
+    def _lookup(self, host, port):
+        addresses = self._getaddrinfo(host, port, socket.AF_UNSPEC,
+                                      socket.SOCK_STREAM)
+        if not addresses:
+            raise socket.gaierror('getaddrinfo returned no addresses')
+        return interleave(addresses)
+
+    def resolve(self, host, port, timeout=None):
+        """
+        Return getaddrinfo()-style (family, socktype, proto, canonname,
+        sockaddr) tuples for host and port, in connection order.
+
+        Raises socket.timeout if the addresses are not cached and the
+        lookup takes longer than timeout seconds.
+        """
+        key = (host, port)
+        load = lambda: self._lookup(host, port)
+        if timeout is None:
+            return self.cache.get(key, load)
+        addresses = self.cache.lookup(key)
+        if addresses is not None:
+            return addresses
+        outcome = []
+        done = threading.Event()
+
+        def lookup():
+            try:
+                outcome.append((self.cache.fill(key, load), None))
+            except Exception as e:
+                outcome.append((None, e))
+            done.set()
+
+        thread = threading.Thread(target=lookup, name='duo-resolver')
+        thread.daemon = True
+        thread.start()
+        if not done.wait(timeout):
+            raise socket.timeout('timed out resolving %s' % host)
+        (addresses, error) = outcome[0]
+        if error is not None:
+            raise error
+        return addresses
+
+    def invalidate(self, host, port):
+        self.cache.invalidate((host, port))
+
+
+# Shared by connections not given a resolver of their own.
+default_resolver = Resolver()
+
+
+def _start(address):
+    """
+    Start a non-blocking connect to address. Return the socket, and
+    whether it is already connected.
+    """
+    (family, socktype, proto, _, sockaddr) = address
+    sock = socket.socket(family, socktype, proto)
+    try:
+        sock.setblocking(0)
+        err = sock.connect_ex(sockaddr)
+        if err and err not in _CONNECT_IN_PROGRESS:
+            raise socket.error(err, os.strerror(err))
+    except:
+        sock.close()
+        raise
+    return (sock, err == 0)
+
+
+def connect(addresses, timeout=None, delay=DEFAULT_ATTEMPT_DELAY,
+            clock=time.time):
+    """
+    Return a blocking socket connected to the first of addresses (as
+    returned by Resolver.resolve()) to accept, starting a new attempt
+    every delay seconds or as soon as the previous attempt fails.
+
+    Raises socket.timeout if nothing connects within timeout seconds,
+    or the error of the last attempt if all fail.
+    """
+    pending = list(addresses)
+    if not pending:
+        raise socket.error('No addresses to connect to')
+    deadline = None
+    if timeout is not None:
+        deadline = clock() + timeout
+    # socket -> address of the attempts in progress.
+    attempts = {}
+    error = None
+    winner = None
+    next_start = clock()
+    try:
+        while winner is None and (pending or attempts):
+            now = clock()
+            if pending and (not attempts or now >= next_start):
+                address = pending.pop(0)
+                try:
+                    (sock, connected) = _start(address)
+                except socket.error as e:
+                    error = e
+                    continue
+                if connected:
+                    winner = sock
+                    break
+                attempts[sock] = address
+                next_start = now + delay
+                continue
+            wait = None
+            if pending:
+                wait = max(0, next_start - now)
+            if deadline is not None:
+                remaining = deadline - now
+                if remaining <= 0:
+                    raise socket.timeout('timed out')
+                if wait is None or remaining < wait:
+                    wait = remaining
+            (_, writable, failed) = select.select([], list(attempts),
+                                                  list(attempts), wait)
+            for sock in set(writable) | set(failed):
+                del attempts[sock]
+                err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if err == 0 and winner is None:
+                    winner = sock
+                    continue
+                sock.close()
+                if err:
+                    error = socket.error(err, os.strerror(err))
+                    # Do not wait out the delay after a failure.
+                    next_start = now
+    finally:
+        for sock in attempts:
+            sock.close()
+    if winner is None:
+        raise error
+    winner.setblocking(1)
+    return winner
+
+
+def create_connection(host, port, connect_timeout=None, read_timeout=None,
+                      resolver=None, delay=DEFAULT_ATTEMPT_DELAY):
+    """
+    Like socket.create_connection(), resolving host with resolver (by
+    default, default_resolver) and racing its addresses. connect_timeout
+    bounds the lookup and the connect together; read_timeout is set on
+    the returned socket.
+    """
+    if resolver is None:
+        resolver = default_resolver
+    if connect_timeout is not None:
+        deadline = time.time() + connect_timeout
+    addresses = resolver.resolve(host, port, connect_timeout)
+    if connect_timeout is not None:
+        connect_timeout = max(0, deadline - time.time())
+    try:
+        sock = connect(addresses, connect_timeout, delay)
+    except socket.error:
+        # The host may have moved; look it up again next time.
+        resolver.invalidate(host, port)
+        raise
+    sock.settimeout(read_timeout)
+    return sock
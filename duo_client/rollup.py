@@ -0,0 +1,248 @@
+"""
+Incremental, bounded-memory rollups of authentication log events.
+
+Feed events from any source (LogTailer, Backfill, an EventStore) and
+read counts without further API calls:
+
+    rollups = AuthRollups()
+    for event in tailer.events():
+        rollups.add(event)
+    rollups.counts('hour', 'result')          # {'SUCCESS': ..., ...}
+    rollups.series('minute', 'result', 'FAILURE')
+    rollups.distinct_users('day')
+
+Each window (minute, hour, day) keeps a fixed ring of buckets. Events
+older than the oldest bucket are counted in `dropped` and otherwise
+ignored. Each bucket keeps at most max_keys values per dimension; the
+counts of rare values are folded into OTHER when it fills up. Distinct
+users are estimated with a HyperLogLog sketch per bucket.
+"""
+
+import hashlib
+import math
+import struct
+import threading
+
+DIMENSIONS = ('result', 'factor', 'integration', 'username')
+
+# (name, bucket width in seconds, number of buckets)
+DEFAULT_WINDOWS = (
+    ('minute', 60, 180),
+    ('hour', 3600, 72),
+    ('day', 86400, 31),
+)
+
+DEFAULT_MAX_KEYS = 1000
+
+# Key that absorbs the counts of values evicted from a full bucket.
+OTHER = '(other)'
+
+
+class HyperLogLog(object):
+    """
+    Approximate distinct count in 2 ** precision bytes, with a standard
+    error of about 1.04 / sqrt(2 ** precision) (1.6% by default).
+    """
+
+    def __init__(self, precision=12):
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    @staticmethod
+    def hash(value):
+        """
+        Return the 64-bit hash of value used by add_hash().
+        """
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        return struct.unpack('>Q', hashlib.sha1(value).digest()[:8])[0]
+
+    def add(self, value):
+        self.add_hash(self.hash(value))
+
+    def add_hash(self, x):
+        bits = 64 - self.precision
+        index = x >> bits
+        # Position of the first 1 bit after the index bits.
+        rank = bits - (x & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        """
+        Add the values counted by another sketch of the same precision.
+        """
+        registers = self.registers
+        for (i, rank) in enumerate(other.registers):
+            if rank > registers[i]:
+                registers[i] = rank
+
+    def count(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count('\x00')
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities.
+            estimate = m * math.log(float(m) / zeros)
+        return int(round(estimate))
+
+
+class _Bucket(object):
+    def __init__(self, start, precision):
+        self.start = start
+        self.total = 0
+        self.counts = dict((dimension, {}) for dimension in DIMENSIONS)
+        self.users = HyperLogLog(precision)
+
+
+class Rollup(object):
+    """
+    Counts of events in a ring of slots buckets of width seconds each.
+    """
+
+    def __init__(self, width, slots, max_keys=DEFAULT_MAX_KEYS,
+                 precision=12):
+        self.width = width
+        self.slots = slots
+        self.max_keys = max_keys
+        self.precision = precision
+        self.buckets = [None] * slots
+        self.latest = None
+        self.dropped = 0
+
+    def _bucket(self, timestamp):
+        start = timestamp - timestamp % self.width
+        if self.latest is not None and \
+                start <= self.latest - self.slots * self.width:
+            return None
+        if self.latest is None or start > self.latest:
+            self.latest = start
+        slot = (start // self.width) % self.slots
+        bucket = self.buckets[slot]
+        if bucket is None or bucket.start != start:
+            bucket = self.buckets[slot] = _Bucket(start, self.precision)
+        return bucket
+
+    def _count(self, counts, value):
+        if value in counts:
+            counts[value] += 1
+            return
+        if len(counts) >= self.max_keys:
+            # Keep the most frequent half; fold the rest into OTHER.
+            ranked = sorted(counts.items(), key=lambda item: -item[1])
+            other = counts.get(OTHER, 0)
+            for (key, count) in ranked[self.max_keys // 2:]:
+                if key != OTHER:
+                    other += count
+                    del counts[key]
+            counts[OTHER] = other
+            if value in counts:
+                counts[value] += 1
+                return
+        counts[value] = 1
+
+    def add(self, event, user_hash=None):
+        """
+        user_hash - HyperLogLog.hash() of the event's username, if
+                    already computed.
+        """
+        bucket = self._bucket(event['timestamp'])
+        if bucket is None:
+            self.dropped += 1
+            return
+        bucket.total += 1
+        for dimension in DIMENSIONS:
+            value = event.get(dimension)
+            if value is not None:
+                self._count(bucket.counts[dimension], value)
+        username = event.get('username')
+        if username is not None:
+            if user_hash is None:
+                user_hash = HyperLogLog.hash(username)
+            bucket.users.add_hash(user_hash)
+
+    def _buckets(self, mintime=None, maxtime=None):
+        buckets = [b for b in self.buckets if b is not None
+                   and (mintime is None or b.start + self.width > mintime)
+                   and (maxtime is None or b.start < maxtime)]
+        buckets.sort(key=lambda b: b.start)
+        return buckets
+
+    def total(self, mintime=None, maxtime=None):
+        return sum(b.total for b in self._buckets(mintime, maxtime))
+
+    def counts(self, dimension, mintime=None, maxtime=None):
+        totals = {}
+        for bucket in self._buckets(mintime, maxtime):
+            for (value, count) in bucket.counts[dimension].items():
+                totals[value] = totals.get(value, 0) + count
+        return totals
+
+    def series(self, dimension, value, mintime=None, maxtime=None):
+        return [(bucket.start, bucket.counts[dimension].get(value, 0))
+                for bucket in self._buckets(mintime, maxtime)]
+
+    def distinct_users(self, mintime=None, maxtime=None):
+        users = HyperLogLog(self.precision)
+        for bucket in self._buckets(mintime, maxtime):
+            users.merge(bucket.users)
+        return users.count()
+
+
+class AuthRollups(object):
+    """
+    Rollups of authentication events over several windows (see
+    DEFAULT_WINDOWS). Safe to share between threads.
+
+    The read methods take a window name and a dimension from DIMENSIONS
+    and cover every retained bucket overlapping [mintime, maxtime).
+    Times are event timestamps, so backfilled history rolls up the same
+    way as live events.
+    """
+
+    def __init__(self, windows=DEFAULT_WINDOWS, max_keys=DEFAULT_MAX_KEYS,
+                 precision=12):
+        self._lock = threading.Lock()
+        self.windows = dict(
+            (name, Rollup(width, slots, max_keys, precision))
+            for (name, width, slots) in windows)
+
+    def add(self, event):
+        username = event.get('username')
+        user_hash = None
+        if username is not None:
+            user_hash = HyperLogLog.hash(username)
+        with self._lock:
+            for rollup in self.windows.values():
+                rollup.add(event, user_hash)
+
+    def add_many(self, events):
+        for event in events:
+            self.add(event)
+
+    def total(self, window, mintime=None, maxtime=None):
+        with self._lock:
+            return self.windows[window].total(mintime, maxtime)
+
+    def counts(self, window, dimension, mintime=None, maxtime=None):
+        """
+        Return a dict of value -> number of events.
+        """
+        with self._lock:
+            return self.windows[window].counts(dimension, mintime, maxtime)
+
+    def series(self, window, dimension, value, mintime=None, maxtime=None):
+        """
+        Return (bucket start, count of value) pairs, oldest first.
+        """
+        with self._lock:
+            return self.windows[window].series(dimension, value,
+                                               mintime, maxtime)
+
+    def distinct_users(self, window, mintime=None, maxtime=None):
+        """
+        Return the approximate number of distinct usernames.
+        """
+        with self._lock:
+            return self.windows[window].distinct_users(mintime, maxtime)
@@ -0,0 +1,318 @@
+"""
+Buffered output writers for exported log events.
+
+Each sink formats events into an in-memory buffer and writes it out in
+large chunks, optionally through gzip or zstd streaming compression:
+
+    sink = NDJSONSink(open_output('auth.ndjson.gz', compression='gzip'))
+    sink.write_many(admin.iter_authentication_log(mintime))
+    sink.close()
+
+Sinks never modify the events passed to them and are safe to share
+between threads.
+"""
+
+import csv
+import gzip
+import json
+import sys
+import threading
+from cStringIO import StringIO
+
+try:
+    # Only needed for zstd compression.
+    import zstandard
+except ImportError as e:
+    zstandard = None
+    zstandard_error = e
+
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+_encoder = json.JSONEncoder(separators=(',', ':'), sort_keys=True)
+
+
+def _close_output(fileobj):
+    """
+    Close a file written to by a compressor, unless it is stdout, which
+    is only flushed.
+    """
+    if fileobj is sys.stdout:
+        fileobj.flush()
+    else:
+        fileobj.close()
+
+
+class _GzipOutput(gzip.GzipFile):
+    """
+    GzipFile closing the file it was given on close() (see
+    _close_output()); GzipFile only closes files it opened itself.
+    """
+
+    def close(self):
+        fileobj = self.fileobj
+        gzip.GzipFile.close(self)
+        if fileobj is not None:
+            _close_output(fileobj)
+
+
+class _ZstdOutput(object):
+    """
+    File-like wrapper finishing the zstd frame on close(), then closing
+    the wrapped file (see _close_output()).
+    """
+
+    def __init__(self, fileobj, level):
+        self._fileobj = fileobj
+        compressor = zstandard.ZstdCompressor(level=level)
+        self._writer = compressor.stream_writer(fileobj)
+
+    def write(self, data):
+        self._writer.write(data)
+
+    def flush(self):
+        self._writer.flush()
+
+    def close(self):
+        self._writer.flush(zstandard.FLUSH_FRAME)
+        _close_output(self._fileobj)
+
+
+def open_output(path, compression=None, level=None):
+    """
+    Return a binary file object writing to path ('-' for stdout),
+    compressed with compression: None, 'gzip' or 'zstd'.
+    """
+    if path == '-':
+        fileobj = sys.stdout
+    else:
+        fileobj = open(path, 'wb')
+    if compression is None:
+        return fileobj
+    if compression == 'gzip':
+        return _GzipOutput(fileobj=fileobj, mode='wb',
+                           compresslevel=level or 6)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise zstandard_error
+        return _ZstdOutput(fileobj, level or 3)
+    raise NotImplementedError('compression=%s' % (compression,))
+
+
+def _utf8(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
+
+class BufferedSink(object):
+    """
+    Base class: subclasses implement format(event) returning a str, or
+    override _add() to buffer something else.
+
+    output - Binary file object (see open_output()).
+    buffer_size - Bytes collected before they are written out.
+    """
+
+    def __init__(self, output, buffer_size=DEFAULT_BUFFER_SIZE):
+        self.output = output
+        self.buffer_size = buffer_size
+        self._lock = threading.Lock()
+        self._chunks = []
+        self._size = 0
+
+    def format(self, event):
+        raise NotImplementedError
+
+    def _add(self, event):
+        data = self.format(event)
+        self._chunks.append(data)
+        self._size += len(data)
+
+    def _write_buffer(self):
+        if self._chunks:
+            self.output.write(''.join(self._chunks))
+            self._chunks = []
+            self._size = 0
+
+    def write(self, event):
+        self.write_many((event,))
+
+    def write_many(self, events):
+        with self._lock:
+            for event in events:
+                self._add(event)
+                if self._size >= self.buffer_size:
+                    self._write_buffer()
+
+    def _write_formatted(self, data):
+        self.output.write(data)
+
+    def write_formatted(self, data):
+        """
+        Write data produced by another sink of the same kind, such as a
+        chunk formatted in a worker process, after any buffered events.
+        """
+        with self._lock:
+            self._write_buffer()
+            self._write_formatted(data)
+
+    def flush(self):
+        """
+        Write out buffered events.
+        """
+        with self._lock:
+            self._write_buffer()
+            self.output.flush()
+
+    def close(self):
+        """
+        Flush and close the output (stdout is left open).
+        """
+        self.flush()
+        if self.output is not sys.stdout:
+            self.output.close()
+
+
+class NDJSONSink(BufferedSink):
+    """
+    One JSON object per line.
+    """
+
+    def format(self, event):
+        return _encoder.encode(event) + '\n'
+
+
+class CSVSink(BufferedSink):
+    """
+    Comma-separated values with a header row.
+
+    fields - Event keys to write, in column order. Missing keys are
+             written as empty cells; other keys are ignored.
+    header - Whether to start with a header row.
+    """
+
+    def __init__(self, output, fields, buffer_size=DEFAULT_BUFFER_SIZE,
+                 header=True):
+        BufferedSink.__init__(self, output, buffer_size)
+        self.fields = list(fields)
+        self._buffer = StringIO()
+        self._writer = csv.writer(self._buffer, lineterminator='\n')
+        if header:
+            self._writer.writerow([_utf8(field) for field in self.fields])
+
+    def _add(self, event):
+        self._writer.writerow([_utf8(event.get(field, ''))
+                               for field in self.fields])
+        self._size = self._buffer.tell()
+
+    def _write_buffer(self):
+        data = self._buffer.getvalue()
+        if data:
+            self.output.write(data)
+            self._buffer.seek(0)
+            self._buffer.truncate()
+            self._size = 0
+
+
+class SplunkHECSink(BufferedSink):
+    """
+    Splunk HTTP Event Collector batches: concatenated JSON objects of
+    the form {"time": ..., "host": ..., "sourcetype": ..., "event": ...}.
+
+    send - If given, called with each batch (a str) instead of writing
+           it to output, e.g. to POST it to /services/collector.
+    batch_size - Events per batch.
+    """
+
+    def __init__(self, output=None, send=None, batch_size=1000,
+                 sourcetype_prefix='duo:', buffer_size=DEFAULT_BUFFER_SIZE):
+        BufferedSink.__init__(self, output, buffer_size)
+        self.send = send
+        self.batch_size = batch_size
+        self.sourcetype_prefix = sourcetype_prefix
+        self._count = 0
+
+    def format(self, event):
+        return _encoder.encode({
+            'time': event.get('timestamp'),
+            'host': event.get('host'),
+            'sourcetype': self.sourcetype_prefix + event.get('eventtype', ''),
+            'event': event,
+        })
+
+    def _add(self, event):
+        BufferedSink._add(self, event)
+        self._count += 1
+        if self._count >= self.batch_size:
+            self._write_buffer()
+
+    def _write_buffer(self):
+        if not self._chunks:
+            return
+        batch = ''.join(self._chunks)
+        self._chunks = []
+        self._size = 0
+        self._count = 0
+        self._write_formatted(batch + '\n')
+
+    def _write_formatted(self, data):
+        if self.send is not None:
+            self.send(data)
+        else:
+            self.output.write(data)
+
+    def flush(self):
+        with self._lock:
+            self._write_buffer()
+            if self.output is not None:
+                self.output.flush()
+
+    def close(self):
+        self.flush()
+        if self.output is not None and self.output is not sys.stdout:
+            self.output.close()
+
+
+class ColumnarSink(BufferedSink):
+    """
+    Column-oriented blocks: each line is a JSON object
+    {"rows": n, "columns": {key: [value, ...], ...}} holding up to
+    block_size events. Values of one field are stored together, so the
+    output compresses far better than row formats; use it with gzip or
+    zstd compression.
+    """
+
+    def __init__(self, output, block_size=10000):
+        BufferedSink.__init__(self, output, buffer_size=block_size)
+        self.block_size = block_size
+        self._rows = []
+
+    def _add(self, event):
+        self._rows.append(event)
+        self._size += 1
+
+    def _write_buffer(self):
+        if not self._rows:
+            return
+        keys = set()
+        for row in self._rows:
+            keys.update(row)
+        columns = dict((key, [row.get(key) for row in self._rows])
+                       for key in keys)
+        self.output.write(_encoder.encode({'rows': len(self._rows),
+                                           'columns': columns}) + '\n')
+        self._rows = []
+        self._size = 0
+
+
+def read_columnar(fileobj):
+    """
+    Yield the events of a ColumnarSink output file, as dicts. Keys that
+    were absent from an event come back with a None value.
+    """
+    for line in fileobj:
+        block = json.loads(line)
+        columns = block['columns']
+        keys = sorted(columns)
+        for i in range(block['rows']):
+            yield dict((key, columns[key][i]) for key in keys)
@@ -0,0 +1,225 @@
+"""
+Waiting for many asynchronous authentications at once.
+
+Auth.auth(..., async=True) returns a transaction ID whose outcome is
+found by long-polling auth_status(). TransactionWatcher long-polls each
+pending transaction on a thread of its own, up to max_workers threads
+sharing the client's connection pool. Beyond that, transactions take
+turns: long-polls are cut into slices short enough that each waiting
+transaction is polled again within max_poll_interval seconds.
+
+    auth_api = duo_client.Auth(ikey=..., skey=..., host=..., pool_size=50)
+    watcher = TransactionWatcher(auth_api, max_workers=50)
+    future = watcher.auth(factor='push', username='alice', device='auto')
+    future.add_done_callback(on_done)
+    ...
+    status = future.result()  # {'waiting': False, 'success': ..., ...}
+
+AuthV1 clients are supported as well, through AuthV1.status().
+"""
+
+import socket
+import sys
+import threading
+import time
+
+from auth_v1 import AuthV1
+from executor import Executor
+from executor import Future
+
+# Most threads long-polling at once; they are started as transactions
+# come in.
+DEFAULT_WORKERS = 50
+
+# Seconds to wait for the user before giving up on a transaction.
+DEFAULT_TIMEOUT = 300
+
+# Longest single auth_status long-poll, in seconds. An abandoned
+# long-poll costs its connection (a timed out request is not reused),
+# so slices are only as short as max_poll_interval requires.
+DEFAULT_POLL_SLICE = 10
+
+# Seconds within which each waiting transaction is polled again. With
+# more waiting transactions than workers, slices are shortened to fit
+# them all in...
+DEFAULT_MAX_POLL_INTERVAL = 10
+
+# ...but not below this many, so that a poll can still get an answer.
+MIN_POLL_SLICE = 0.5
+
+
+class TransactionTimeout(RuntimeError):
+    """
+    Raised by a watched transaction's future when it is still waiting
+    after its timeout.
+    """
+
+    def __init__(self, txid):
+        RuntimeError.__init__(self, 'Timed out waiting for %s' % (txid,))
+        self.txid = txid
+
+
+class _Watch(object):
+    def __init__(self, txid, future, deadline):
+        self.txid = txid
+        self.future = future
+        self.deadline = deadline
+
+
+class TransactionWatcher(object):
+    """
+    Tracks the outcome of asynchronous authentications of an Auth or
+    AuthV1 client.
+
+    max_workers - Most long-polls in flight at once. Transactions
+                  beyond that wait their turn, so give the client a
+                  pool_size of at least max_workers.
+    timeout - Default seconds after which a watched transaction's future
+              fails with TransactionTimeout.
+    poll_slice - Seconds after which a long-poll is abandoned and the
+              transaction goes to the back of the queue.
+    max_poll_interval - Slices are cut to max_poll_interval seconds,
+              and with more waiting transactions than max_workers to
+              max_poll_interval * max_workers / transactions (at least
+              MIN_POLL_SLICE), so that an answer is noticed within about
+              max_poll_interval seconds, or twice that during a burst of
+              new transactions.
+    """
+
+    def __init__(self, client, max_workers=DEFAULT_WORKERS,
+                 timeout=DEFAULT_TIMEOUT, clock=time.time,
+                 poll_slice=DEFAULT_POLL_SLICE,
+                 max_poll_interval=DEFAULT_MAX_POLL_INTERVAL):
+        self.client = client
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.poll_slice = poll_slice
+        self.max_poll_interval = max_poll_interval
+        self._clock = clock
+        self._executor = Executor(max_workers)
+        self._lock = threading.Lock()
+        self._watches = set()
+        self._closed = False
+
+    def pending(self):
+        """
+        Return the number of transactions still being watched.
+        """
+        return len(self._watches)
+
+    def status(self, txid, client=None):
+        """
+        Long-poll once; return a dict like Auth.auth_status()'s.
+
+        client - Copy of the client to poll with, e.g. with_deadline().
+        """
+        if client is None:
+            client = self.client
+        if isinstance(client, AuthV1):
+            (complete, success, description) = client.status(txid)
+            return {
+                'waiting': not complete,
+                'success': success,
+                'status': description,
+                'status_msg': description,
+            }
+        return client.auth_status(txid)
+
+    def watch(self, txid, callback=None, timeout=None):
+        """
+        Return a Future of the final status of transaction txid.
+
+        callback - Optional function called with the future once done.
+        timeout - Seconds to wait, instead of the watcher's timeout.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        future = Future()
+        if callback is not None:
+            future.add_done_callback(callback)
+        watch = _Watch(txid, future, self._clock() + timeout)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('TransactionWatcher has been closed')
+            self._watches.add(watch)
+            self._executor.submit(self._poll, watch)
+        return future
+
+    def _finish(self, watch, result=None, exc_info=None):
+        with self._lock:
+            if watch not in self._watches:
+                # Already failed by close().
+                return
+            self._watches.remove(watch)
+        if exc_info is not None:
+            watch.future.set_exception(exc_info)
+        else:
+            watch.future.set_result(result)
+
+    def auth(self, *args, **kwargs):
+        """
+        Start an asynchronous authentication with the client's auth()
+        and return watch() of its transaction. callback and timeout
+        keyword arguments are passed to watch().
+        """
+        watch_kwargs = {}
+        for name in ('callback', 'timeout'):
+            if name in kwargs:
+                watch_kwargs[name] = kwargs.pop(name)
+        kwargs['async'] = True
+        txid = self.client.auth(*args, **kwargs)
+        if isinstance(txid, dict):
+            txid = txid['txid']
+        return self.watch(txid, **watch_kwargs)
+
+    def _slice(self):
+        """
+        Return the seconds the next long-poll may take.
+        """
+        waiting = max(len(self._watches), self.max_workers)
+        share = float(self.max_poll_interval) * self.max_workers / waiting
+        return min(self.poll_slice, max(share, MIN_POLL_SLICE))
+
+    def _poll(self, watch):
+        try:
+            remaining = watch.deadline - self._clock()
+            if remaining <= 0:
+                raise TransactionTimeout(watch.txid)
+            # Long-poll for a slice of time, at most until the
+            # transaction's timeout.
+            client = self.client.with_deadline(min(remaining,
+                                                   self._slice()))
+            try:
+                status = self.status(watch.txid, client)
+            except socket.timeout:
+                # Includes DeadlineExceeded: no answer within the slice.
+                status = {'waiting': True}
+            if status['waiting'] and self._clock() >= watch.deadline:
+                raise TransactionTimeout(watch.txid)
+        except Exception:
+            self._finish(watch, exc_info=sys.exc_info())
+            return
+        if not status['waiting']:
+            self._finish(watch, status)
+            return
+        with self._lock:
+            if watch in self._watches:
+                # Back of the queue, behind the other waiting
+                # transactions.
+                self._executor.submit(self._poll, watch)
+
+    def close(self):
+        """
+        Stop polling. Futures of unfinished transactions fail with
+        RuntimeError.
+        """
+        with self._lock:
+            self._closed = True
+            watches = list(self._watches)
+            self._watches.clear()
+        self._executor.shutdown(wait=False)
+        for watch in watches:
+            try:
+                raise RuntimeError('TransactionWatcher has been closed')
+            except RuntimeError:
+                watch.future.set_exception(sys.exc_info())
@@ -0,0 +1,149 @@
+"""
+Background connection pre-warming and health checks.
+
+After an idle period, the first call to the API host pays for DNS, TCP
+and TLS on top of its own latency. ConnectionWarmer keeps a few pooled
+connections open and pings the host over them, tracking the round-trip
+time and marking the host unhealthy after consecutive failures:
+
+    auth_api = duo_client.Auth(ikey=..., skey=..., host=...)
+    warmer = ConnectionWarmer(auth_api, min_connections=2)
+    warmer.start()
+    ...
+    auth_api.auth(...)  # Raises HostUnhealthy at once while it is down.
+    ...
+    warmer.stop()
+
+Works with any client having a ping() method, such as Auth and AuthV1.
+"""
+
+import threading
+import time
+
+DEFAULT_MIN_CONNECTIONS = 2
+
+# Seconds between pings. Keep below the pool's idle timeout so that
+# warmed connections are used before they expire.
+DEFAULT_INTERVAL = 30
+
+# Consecutive failed pings after which the host is unhealthy.
+DEFAULT_FAILURE_THRESHOLD = 3
+
+# Weight of each new sample in the smoothed round-trip time.
+SRTT_WEIGHT = 0.125
+
+
+class HostUnhealthy(RuntimeError):
+    """
+    Raised instead of calling an API host that failed its recent health
+    checks.
+    """
+
+
+class ConnectionWarmer(object):
+    """
+    Pings client's API host every interval seconds from a background
+    thread, first opening pooled connections until min_connections are
+    idle.
+
+    rtt - Seconds taken by the last successful ping, or None.
+    srtt - Smoothed rtt, like TCP's.
+    healthy - False after failure_threshold consecutive failed pings,
+              until a ping succeeds again.
+    last_error - The exception of the last failed ping, or None.
+
+    Once started, calls made through client while the host is unhealthy
+    raise HostUnhealthy instead of waiting on a dead host (unless
+    fail_fast is False). The warmer keeps pinging to notice recovery.
+    """
+
+    def __init__(self, client, min_connections=DEFAULT_MIN_CONNECTIONS,
+                 interval=DEFAULT_INTERVAL,
+                 failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+                 fail_fast=True, clock=time.time):
+        self.client = client
+        self.min_connections = min_connections
+        self.interval = interval
+        self.failure_threshold = failure_threshold
+        self.fail_fast = fail_fast
+        self._clock = clock
+        self.rtt = None
+        self.srtt = None
+        self.healthy = True
+        self.failures = 0
+        self.last_error = None
+        self._probing = threading.local()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def probe(self):
+        """
+        Warm connections and ping once, updating the health state.
+        Return True if the host responded.
+        """
+        self._probing.active = True
+        try:
+            self.client.warm_connections(self.min_connections)
+            start = self._clock()
+            if self.client.ping() is False:
+                # AuthV1.ping() reports a bad answer this way.
+                raise HostUnhealthy('Unexpected ping response')
+            rtt = self._clock() - start
+        except Exception as e:
+            self.last_error = e
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.healthy = False
+            return False
+        finally:
+            self._probing.active = False
+        self.rtt = rtt
+        if self.srtt is None:
+            self.srtt = rtt
+        else:
+            self.srtt += SRTT_WEIGHT * (rtt - self.srtt)
+        self.failures = 0
+        self.last_error = None
+        self.healthy = True
+        return True
+
+    def check(self):
+        """
+        Raise HostUnhealthy if calls to the host should fail fast.
+        Called by the client before each request.
+        """
+        if (self.healthy or not self.fail_fast
+            or getattr(self._probing, 'active', False)):
+            return
+        raise HostUnhealthy('%s failed %d health checks: %s' % (
+            self.client.host, self.failures, self.last_error))
+
+    def start(self):
+        """
+        Probe once, then keep probing from a daemon thread.
+        """
+        if self._thread is not None:
+            raise RuntimeError('ConnectionWarmer already started')
+        self._stop.clear()
+        self.client.health = self
+        self.probe()
+        self._thread = threading.Thread(target=self._run,
+                                        name='duo-connection-warmer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.probe()
+
+    def stop(self):
+        """
+        Stop probing, and stop failing calls fast.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            if self._thread is not threading.current_thread():
+                self._thread.join()
+            self._thread = None
+        if self.client.health is self:
+            self.client.health = None
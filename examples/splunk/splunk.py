@@ -1,221 +1,720 @@
 #!/usr/bin/python
+import collections
 import ConfigParser
+import multiprocessing
 import optparse
 import os
+import Queue
 import sys
-import time
+from cStringIO import StringIO
 
 import duo_client
+from duo_client.backfill import Backfill
+from duo_client.checkpoint import Checkpoints
+from duo_client.checkpoint import FileCheckpointStore
+from duo_client.checkpoint import SQLiteCheckpointStore
+from duo_client.enrich import ENRICHED_EVENTTYPES
+from duo_client.enrich import ENRICHED_FIELDS
+from duo_client.enrich import Enricher
+from duo_client.executor import Executor
+from duo_client.logtail import LogCursor
+from duo_client.merge import WatermarkMerger
+from duo_client.ratelimit import RetryPolicy
+from duo_client.sinks import BufferedSink
+from duo_client.sinks import ColumnarSink
+from duo_client.sinks import CSVSink
+from duo_client.sinks import NDJSONSink
+from duo_client.sinks import SplunkHECSink
+from duo_client.sinks import open_output
+
+# Number of logs fetched at once by default.
+DEFAULT_WORKERS = 10
+
+# Events per chunk handed to the formatting stage.
+DEFAULT_CHUNK_SIZE = 500
+
+# Number of time windows a backfill is split into by default.
+DEFAULT_BACKFILL_SHARDS = 16
+
+# Checkpoint backends: option value -> (store class, file name).
+CHECKPOINT_BACKENDS = {
+    'file': (FileCheckpointStore, 'duo_checkpoints.json'),
+    'sqlite': (SQLiteCheckpointStore, 'duo_checkpoints.sqlite'),
+}
 
 
 class BaseLog(object):
 
-    def __init__(self, admin_api, path, logname):
+    def __init__(self, admin_api, path, logname, checkpoints=None,
+                 sink=None):
         self.admin_api = admin_api
         self.path = path
         self.logname = logname
+        if checkpoints is None:
+            (store_class, filename) = CHECKPOINT_BACKENDS['file']
+            checkpoints = Checkpoints(
+                store_class(os.path.join(path, filename)))
+        self.checkpoints = checkpoints
+        # A sink passed in is flushed by its owner; our own is flushed
+        # after each run().
+        self.owns_sink = sink is None
+        if sink is None:
+            sink = SplunkKVSink(sys.stdout)
+        self.sink = sink
 
         self.mintime = 0
+        self.cursor = LogCursor()
         self.events = []
 
     def get_events(self):
         raise NotImplementedError
 
-    def print_events(self):
+    @staticmethod
+    def format_event(event):
         raise NotImplementedError
 
+    def print_events(self):
+        """
+        Write the fetched events to the sink. They are flushed out in
+        large chunks, not line by line.
+        """
+        self.sink.write_many(self.events)
+
     def get_last_timestamp_path(self):
         """
         Returns the path to the file containing the timestamp of the last
-        event fetched.
+        event fetched, as written by older versions of this script.
         """
         filename = self.logname + "_last_timestamp_" + self.admin_api.host
+        if self.admin_api.account_id is not None:
+            # Child accounts may share an API host.
+            filename += "_" + self.admin_api.account_id
         path = os.path.join(self.path, filename)
         return path
 
-    def get_mintime(self):
+    def get_checkpoint_key(self):
         """
-            Updates self.mintime which is the minimum timestamp of
-            log events we want to fetch.
-            self.mintime is > all event timestamps we have already fetched.
+        Returns the key of this log's cursor in the checkpoint store.
         """
-        try:
-            # Only fetch events that come after timestamp of last event
-            path = self.get_last_timestamp_path()
-            self.mintime = int(open(path).read().strip()) + 1
-        except IOError:
-            pass
+        key = self.logname + "/" + self.admin_api.host
+        if self.admin_api.account_id is not None:
+            key += "/" + self.admin_api.account_id
+        return key
 
-    def write_last_timestamp(self):
+    def get_mintime(self):
+        """
+            Loads self.cursor and updates self.mintime, which is the
+            minimum timestamp of log events we want to fetch.
+            Events at self.mintime that were already fetched are
+            recorded in the cursor and dropped from the next fetch.
+        """
+        state = self.checkpoints.get(self.get_checkpoint_key())
+        if state is not None:
+            self.cursor = LogCursor.from_dict(state)
+        else:
+            self.cursor = LogCursor()
+            try:
+                # Migrate from a timestamp file: it holds the timestamp
+                # of the last event fetched.
+                path = self.get_last_timestamp_path()
+                self.cursor.timestamp = int(open(path).read().strip()) + 1
+            except IOError:
+                pass
+        self.mintime = self.cursor.timestamp
+
+    def update_checkpoint(self):
         """
-            Store last_timestamp so that we don't fetch the same events again
+            Record the cursor so that we don't fetch the same events
+            again. It is written out by Checkpoints.commit().
         """
-        if not self.events:
-            # Do not update last_timestamp
+        if not self.events and self.cursor.timestamp == self.mintime:
             return
+        self.checkpoints.set(self.get_checkpoint_key(),
+                             self.cursor.to_dict())
 
-        last_timestamp = 0
-        for event in self.events:
-            last_timestamp = max(last_timestamp, event['timestamp'])
+    def fetch_events(self):
+        """
+        Fetch new log events into self.events and advance the cursor
+        past them, without recording it (see update_checkpoint()).
+        """
+        self.events = []
+        self.get_mintime()
+        self.get_events()
+        self.events = self.cursor.advance(self.events)
+        return self.events
 
-        path = self.get_last_timestamp_path()
-        f = open(path, "w")
-        f.write(str(last_timestamp))
-        f.close()
+    def fetch(self):
+        """
+        Fetch new log events into self.events and record the position
+        after them, to be saved by the next Checkpoints.commit().
+        """
+        self.fetch_events()
+        self.update_checkpoint()
+        return self.events
 
     def run(self):
         """
         Fetch new log events and print them.
         """
-        self.events = []
-        self.get_mintime()
-        self.get_events()
+        self.fetch()
         self.print_events()
-        self.write_last_timestamp()
+        if self.owns_sink:
+            self.sink.flush()
+
+
+ADMIN_ACTION_LABELS = {
+    'admin_login': "Admin Login",
+    'admin_create': "Create Admin",
+    'admin_update': "Update Admin",
+    'admin_delete': "Delete Admin",
+    'customer_update': "Update Customer",
+    'group_create': "Create Group",
+    'group_udpate': "Update Group",
+    'group_delete': "Delete Group",
+    'integration_create': "Create Integration",
+    'integration_update': "Update Integration",
+    'integration_delete': "Delete Integration",
+    'phone_create': "Create Phone",
+    'phone_update': "Update Phone",
+    'phone_delete': "Delete Phone",
+    'user_create': "Create User",
+    'user_update': "Update User",
+    'user_delete': "Delete User",
+}
 
 
 class AdministratorLog(BaseLog):
-    def __init__(self, admin_api, path):
-        BaseLog.__init__(self, admin_api, path, "administrator")
+    def __init__(self, admin_api, path, checkpoints=None, sink=None):
+        BaseLog.__init__(self, admin_api, path, "administrator",
+                         checkpoints, sink)
 
     def get_events(self):
         self.events = self.admin_api.get_administrator_log(
             mintime=self.mintime,
         )
 
-    def print_events(self):
+    @staticmethod
+    def format_event(event):
+        """
+        Return an event as a line suitable for Splunk.
         """
-        Print events in a format suitable for Splunk.
-        """
-        for event in self.events:
-            event['ctime'] = time.ctime(event['timestamp'])
-            event['actionlabel'] = {
-                'admin_login': "Admin Login",
-                'admin_create': "Create Admin",
-                'admin_update': "Update Admin",
-                'admin_delete': "Delete Admin",
-                'customer_update': "Update Customer",
-                'group_create': "Create Group",
-                'group_udpate': "Update Group",
-                'group_delete': "Delete Group",
-                'integration_create': "Create Integration",
-                'integration_update': "Update Integration",
-                'integration_delete': "Delete Integration",
-                'phone_create': "Create Phone",
-                'phone_update': "Update Phone",
-                'phone_delete': "Delete Phone",
-                'user_create': "Create User",
-                'user_update': "Update User",
-                'user_delete': "Delete User"}.get(
-                event['action'], event['action'])
-
-            fmtstr = '%(timestamp)s,' \
-                     'host="%(host)s", ' \
-                     'eventtype="%(eventtype)s", ' \
-                     'username="%(username)s", ' \
-                     'action="%(actionlabel)s"'
-            if event['object']:
-                fmtstr += ', object="%(object)s"'
-            if event['description']:
-                fmtstr += ', description="%(description)s"'
-
-            print fmtstr % event
+        line = '%s,host="%s", eventtype="%s", username="%s", ' \
+               'action="%s"' % (
+                   event['timestamp'],
+                   event['host'],
+                   event['eventtype'],
+                   event['username'],
+                   ADMIN_ACTION_LABELS.get(event['action'], event['action']),
+               )
+        if event['object']:
+            line += ', object="%s"' % (event['object'],)
+        if event['description']:
+            line += ', description="%s"' % (event['description'],)
+        return line
 
 
 class AuthenticationLog(BaseLog):
-    def __init__(self, admin_api, path):
-        BaseLog.__init__(self, admin_api, path, "authentication")
+    def __init__(self, admin_api, path, checkpoints=None, sink=None):
+        BaseLog.__init__(self, admin_api, path, "authentication",
+                         checkpoints, sink)
 
     def get_events(self):
         self.events = self.admin_api.get_authentication_log(
             mintime=self.mintime,
         )
 
-    def print_events(self):
+    @staticmethod
+    def format_event(event):
         """
-        Print events in a format suitable for Splunk.
+        Return an event as a line suitable for Splunk.
         """
-        for event in self.events:
-            event['ctime'] = time.ctime(event['timestamp'])
-
-            fmtstr = '%(timestamp)s,' \
-                     'host="%(host)s", ' \
-                     'eventtype="%(eventtype)s", ' \
-                     'username="%(username)s", ' \
-                     'factor="%(factor)s", ' \
-                     'result="%(result)s", ' \
-                     'ip="%(ip)s", ' \
-                     'integration="%(integration)s"'
-
-            print fmtstr % event
+        return '%(timestamp)s,' \
+               'host="%(host)s", ' \
+               'eventtype="%(eventtype)s", ' \
+               'username="%(username)s", ' \
+               'factor="%(factor)s", ' \
+               'result="%(result)s", ' \
+               'ip="%(ip)s", ' \
+               'integration="%(integration)s"' % event
 
 
 class TelephonyLog(BaseLog):
-    def __init__(self, admin_api, path):
-        BaseLog.__init__(self, admin_api, path, "telephony")
+    def __init__(self, admin_api, path, checkpoints=None, sink=None):
+        BaseLog.__init__(self, admin_api, path, "telephony",
+                         checkpoints, sink)
 
     def get_events(self):
         self.events = self.admin_api.get_telephony_log(
             mintime=self.mintime,
         )
 
-    def print_events(self):
+    @staticmethod
+    def format_event(event):
         """
-        Print events in a format suitable for Splunk.
+        Return an event as a line suitable for Splunk.
         """
-        for event in self.events:
-            event['ctime'] = time.ctime(event['timestamp'])
-            event['host'] = self.admin_api.host
+        return '%(timestamp)s,' \
+               'host="%(host)s", ' \
+               'eventtype="%(eventtype)s", ' \
+               'context="%(context)s", ' \
+               'type="%(type)s", ' \
+               'phone="%(phone)s", ' \
+               'credits="%(credits)s"' % event
 
-            fmtstr = '%(timestamp)s,' \
-                     'host="%(host)s", ' \
-                     'eventtype="%(eventtype)s", ' \
-                     'context="%(context)s", ' \
-                     'type="%(type)s", ' \
-                     'phone="%(phone)s", ' \
-                     'credits="%(credits)s"'
 
-            print fmtstr % event
+LOG_CLASSES = (AdministratorLog, AuthenticationLog, TelephonyLog)
 
 
-def admin_api_from_config(config_path):
+class SplunkKVSink(BufferedSink):
     """
-    Return a duo_client.Admin object created using the parameters
-    stored in a config file.
+    The key="value" lines this script has always printed.
+    """
+
+    formatters = {
+        'administrator': AdministratorLog.format_event,
+        'authentication': AuthenticationLog.format_event,
+        'telephony': TelephonyLog.format_event,
+    }
+
+    def format(self, event):
+        line = self.formatters[event['eventtype']](event)
+        if isinstance(line, unicode):
+            line = line.encode('utf-8')
+        return line + '\n'
+
+
+# Every field of every log type, for CSV output.
+CSV_FIELDS = (
+    'timestamp', 'host', 'eventtype', 'username', 'action', 'object',
+    'description', 'factor', 'result', 'ip', 'integration', 'context',
+    'type', 'phone', 'credits',
+) + ENRICHED_FIELDS
+
+# Output formats: option value -> (sink class, keyword arguments).
+OUTPUT_FORMATS = {
+    'splunk': (SplunkKVSink, {}),
+    'ndjson': (NDJSONSink, {}),
+    'csv': (CSVSink, {'fields': CSV_FIELDS}),
+    'hec': (SplunkHECSink, {}),
+    'columnar': (ColumnarSink, {}),
+}
+
+
+def make_sink(format_name, output, header=True):
+    """
+    Return a sink writing format_name to output. header=False leaves
+    out CSV header rows, for chunks appended to another sink.
+    """
+    (sink_class, kwargs) = OUTPUT_FORMATS[format_name]
+    kwargs = dict(kwargs)
+    if sink_class is CSVSink:
+        kwargs['header'] = header
+    return sink_class(output, **kwargs)
+
+
+def format_chunk(args):
+    """
+    Return a (format_name, events) chunk formatted as a str. Runs in
+    the formatting processes.
+    """
+    (format_name, events) = args
+    output = StringIO()
+    sink = make_sink(format_name, output, header=False)
+    sink.write_many(events)
+    sink.flush()
+    return output.getvalue()
+
+
+class InlineResult(object):
+    """
+    Stands in for multiprocessing's AsyncResult without a process pool.
+    """
+
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+def read_config(config_path):
+    """
+    Return the [duo] section of a config file as a dict.
     """
     config = ConfigParser.ConfigParser()
     config.read(config_path)
     config_d = dict(config.items('duo'))
-    ca_certs = config_d.get("ca_certs", None)
-    if ca_certs is None:
-        ca_certs = config_d.get("ca", None)
+    if config_d.get("ca_certs") is None:
+        config_d["ca_certs"] = config_d.get("ca", None)
+    return config_d
+
+
+# Optional [duo] config keys passed to the clients, in seconds.
+TIMEOUT_KEYS = ('connect_timeout', 'read_timeout', 'deadline')
+
+
+def timeouts_from_config(config_d):
+    """
+    Return the client timeout keyword arguments set in config_d, so that
+    a stalled API host cannot hold a worker forever.
+    """
+    return dict((key, float(config_d[key]))
+                for key in TIMEOUT_KEYS if config_d.get(key))
+
+
+def client_options_from_config(config_d):
+    """
+    Return the keyword arguments of the clients: the timeouts set in
+    config_d, and a retry policy. The logs API is rate limited, and
+    concurrent fetches (especially backfill shards) must back off and
+    retry when throttled rather than fail. The optional max_retries
+    key overrides the number of retries.
+    """
+    options = timeouts_from_config(config_d)
+    policy = RetryPolicy()
+    if config_d.get('max_retries'):
+        policy.max_retries = int(config_d['max_retries'])
+    options['retry_policy'] = policy
+    return options
+
+
+def admin_api_from_config(config_path):
+    """
+    Return a duo_client.Admin object created using the parameters
+    stored in a config file.
+    """
+    config_d = read_config(config_path)
     return duo_client.Admin(
         ikey=config_d['ikey'],
         skey=config_d['skey'],
         host=config_d['host'],
-        ca_certs=ca_certs,
+        ca_certs=config_d['ca_certs'],
+        **client_options_from_config(config_d)
+    )
+
+
+def child_admin_apis_from_config(config_path):
+    """
+    Return a duo_client.Admin object for each child account of the
+    parent account whose Accounts API credentials are stored in a
+    config file, and the number of child accounts skipped because their
+    client could not be created (each is reported on stderr).
+    """
+    config_d = read_config(config_path)
+    options = client_options_from_config(config_d)
+    accounts_api = duo_client.Accounts(
+        ikey=config_d['ikey'],
+        skey=config_d['skey'],
+        host=config_d['host'],
+        ca_certs=config_d['ca_certs'],
+        **options
     )
+    admin_apis = []
+    failures = 0
+    for account in accounts_api.get_child_accounts():
+        try:
+            admin_api = duo_client.Admin(
+                ikey=config_d['ikey'],
+                skey=config_d['skey'],
+                host=account['api_hostname'],
+                ca_certs=config_d['ca_certs'],
+                **options
+            )
+            admin_api.account_id = account['account_id']
+        except Exception as e:
+            report_setup_failure('child account %s of %s' % (
+                account.get('account_id'), config_path), e)
+            failures += 1
+            continue
+        admin_apis.append(admin_api)
+    return (admin_apis, failures)
+
+
+def fetch_logs(tenants, workers, checkpoints_for, queue_size,
+               enrich=False):
+    """
+    Start fetching every log type for every (admin_api, path) tenant,
+    up to workers logs at a time. Return the logs, with their mintime
+    loaded, and a queue receiving a (log, events, error) item for each;
+    fetchers wait while the queue is full.
+
+    With enrich, authentication events get user and integration details
+    from a cache per tenant, warmed with all its users first.
+    """
+    fetched = Queue.Queue(queue_size)
+    executor = Executor(workers)
+
+    def fetch(log, enricher):
+        try:
+            events = log.fetch_events()
+            if enricher is not None and events and \
+                    log.logname in ENRICHED_EVENTTYPES:
+                enricher.ensure_warm()
+                events = [enricher.enrich(event) for event in events]
+            # Only now are the events sure to be written out, so a
+            # failure above leaves the cursor where it was.
+            log.update_checkpoint()
+            fetched.put((log, events, None))
+        except Exception as e:
+            fetched.put((log, None, e))
+
+    logs = []
+    for (admin_api, path) in tenants:
+        enricher = Enricher(admin_api) if enrich else None
+        for logclass in LOG_CLASSES:
+            log = logclass(admin_api, path, checkpoints_for(path))
+            log.get_mintime()
+            executor.submit(fetch, log, enricher)
+            logs.append(log)
+    executor.shutdown(wait=False)
+    return (logs, fetched)
+
+
+def report_setup_failure(tenant, error):
+    sys.stderr.write('Failed to set up %s: %s\n' % (tenant, error))
+
+
+def describe_tenant(admin_api):
+    """
+    Return the API host of admin_api, with its child account if any.
+    """
+    if admin_api.account_id is not None:
+        return '%s (account %s)' % (admin_api.host, admin_api.account_id)
+    return admin_api.host
+
+
+def report_failure(log, error):
+    sys.stderr.write('Failed to fetch %s log from %s: %s\n' % (
+        log.logname, describe_tenant(log.admin_api), error))
+
+
+def merge_batches(logs, batches):
+    """
+    Yield the events of (log, events) batches, one per log, in
+    timestamp order without duplicates, as soon as no log still being
+    fetched can deliver older ones: a log has no events older than its
+    mintime. Events buffered for a slow log are bounded by the
+    WatermarkMerger's max_buffered.
+    """
+    merger = WatermarkMerger(logs)
+    for log in logs:
+        merger.add(log, [], watermark=log.mintime)
+    for (log, events) in batches:
+        merger.add(log, events)
+        merger.remove(log)
+        yield list(merger.ready())
+    yield list(merger.flush())
+
+
+def run_logs(tenants, workers, backend='file', sink=None,
+             format_name='splunk', format_processes=0,
+             chunk_size=DEFAULT_CHUNK_SIZE, enrich=False, merge=False):
+    """
+    Fetch and print every log type for every (admin_api, path) tenant
+    to sink (default: Splunk lines on stdout). Return the number of
+    failed logs.
+
+    The work is a pipeline of bounded stages, so a slow stage holds
+    back the ones before it:
+    - workers threads fetch and decode logs, drop events delivered
+      before and, with enrich, add user and integration details
+      (fetch_logs());
+    - chunks of chunk_size events are formatted as format_name, by
+      format_processes worker processes if non-zero;
+    - this thread writes formatted chunks to sink in fetch order, or
+      with merge, all logs of all tenants as one stream in timestamp
+      order without duplicates. Merged events are held back only until
+      every log that could still deliver older ones has been fetched
+      (see merge_batches()).
+
+    Cursors are kept in one checkpoint store per directory, written
+    once after the whole sweep has been written out.
+    """
+    (store_class, filename) = CHECKPOINT_BACKENDS[backend]
+    if sink is None:
+        sink = make_sink(format_name, sys.stdout)
+    checkpoints_by_path = {}
+
+    def checkpoints_for(path):
+        if path not in checkpoints_by_path:
+            checkpoints_by_path[path] = Checkpoints(
+                store_class(os.path.join(path, filename)))
+        return checkpoints_by_path[path]
+
+    pool = None
+    window = 2
+    if format_processes:
+        pool = multiprocessing.Pool(format_processes)
+        window = 2 * format_processes
+    (logs, fetched) = fetch_logs(tenants, workers, checkpoints_for,
+                                 queue_size=2 * workers, enrich=enrich)
+    failures = []
+
+    def fetched_batches():
+        for _ in range(len(logs)):
+            (log, events, error) = fetched.get()
+            if error is not None:
+                failures.append(log)
+                report_failure(log, error)
+                events = []
+            yield (log, events)
+
+    batches = fetched_batches()
+    if merge:
+        batches = merge_batches(logs, batches)
+    else:
+        batches = (events for (_, events) in batches)
+    pending = collections.deque()
+    try:
+        for events in batches:
+            for i in range(0, len(events), chunk_size):
+                chunk = (format_name, events[i:i + chunk_size])
+                if pool is not None:
+                    pending.append(pool.apply_async(format_chunk, (chunk,)))
+                else:
+                    pending.append(InlineResult(format_chunk(chunk)))
+                while len(pending) >= window:
+                    sink.write_formatted(pending.popleft().get())
+        while pending:
+            sink.write_formatted(pending.popleft().get())
+    finally:
+        if pool is not None:
+            pool.terminate()
+    # Events must be written out before their cursors are saved.
+    sink.flush()
+    for checkpoints in checkpoints_by_path.values():
+        checkpoints.commit()
+    return len(failures)
+
+
+def run_backfill(tenants, mintime, maxtime, shards, workers,
+                 backend='file', sink=None):
+    """
+    Fetch the authentication log events with timestamps in
+    [mintime, maxtime) for every (admin_api, path) tenant, splitting the
+    range into shards fetched concurrently. An interrupted backfill
+    resumes from its checkpoints when run again with the same range.
+
+    A tenant whose backfill fails is reported on stderr and the others
+    continue. Return the number of failed tenants.
+    """
+    (store_class, filename) = CHECKPOINT_BACKENDS[backend]
+    if sink is None:
+        sink = SplunkKVSink(sys.stdout)
+    failures = 0
+    for (admin_api, path) in tenants:
+        try:
+            checkpoints = Checkpoints(
+                store_class(os.path.join(path, filename)))
+            backfill = Backfill(admin_api, mintime, maxtime,
+                                shards=shards, workers=workers,
+                                checkpoints=checkpoints,
+                                before_commit=sink.flush)
+            for event in backfill.events():
+                sink.write(event)
+        except Exception as e:
+            sys.stderr.write(
+                'Failed to backfill authentication log from %s: %s\n' % (
+                    describe_tenant(admin_api), e))
+            failures += 1
+    return failures
 
 
 def main():
-    parser = optparse.OptionParser(usage="%prog [<config file path>]")
+    parser = optparse.OptionParser(
+        usage="%prog [options] [<config file path> ...]")
+    parser.add_option(
+        "--child-accounts", action="store_true", default=False,
+        help="Treat the config files as Accounts API credentials and "
+             "collect logs from every child account.")
+    parser.add_option(
+        "--workers", type="int", default=DEFAULT_WORKERS,
+        help="Number of logs to fetch concurrently (default: %default).")
+    parser.add_option(
+        "--checkpoint-backend", choices=sorted(CHECKPOINT_BACKENDS),
+        default="file",
+        help="Where to store log positions, next to the config file: "
+             "file or sqlite (default: %default).")
+    parser.add_option(
+        "--format", choices=sorted(OUTPUT_FORMATS), default="splunk",
+        help="Output format: splunk, ndjson, csv, hec (Splunk HTTP Event "
+             "Collector batches) or columnar (default: %default).")
+    parser.add_option(
+        "--output", default="-",
+        help="File to write events to (default: stdout).")
+    parser.add_option(
+        "--compress", choices=["gzip", "zstd"], default=None,
+        help="Compress the output with gzip or zstd (requires the "
+             "zstandard package).")
+    parser.add_option(
+        "--format-processes", type="int", default=0,
+        help="Number of processes formatting events; 0 formats them in "
+             "the writing thread (default: %default).")
+    parser.add_option(
+        "--enrich", action="store_true", default=False,
+        help="Add user and integration details to authentication "
+             "events (not shown in the splunk format).")
+    parser.add_option(
+        "--merge", action="store_true", default=False,
+        help="Write the events of all logs and accounts as a single "
+             "stream in timestamp order.")
+    parser.add_option(
+        "--backfill", metavar="MINTIME:MAXTIME", default=None,
+        help="Instead of new events, fetch the authentication log "
+             "events with Unix timestamps in [MINTIME, MAXTIME).")
+    parser.add_option(
+        "--shards", type="int", default=DEFAULT_BACKFILL_SHARDS,
+        help="Number of time windows a backfill is split into "
+             "(default: %default).")
     (options, args) = parser.parse_args(sys.argv[1:])
+    if options.backfill is not None:
+        try:
+            (mintime, maxtime) = [int(t) for t in options.backfill.split(':')]
+        except ValueError:
+            parser.error("--backfill must be MINTIME:MAXTIME")
 
-    if len(sys.argv) == 1:
+    if not args:
         config_path = os.path.abspath(__file__)
         config_path = os.path.dirname(config_path)
         config_path = os.path.join(config_path, "duo.conf")
+        args = [config_path]
+
+    # A tenant that cannot be set up is reported and skipped, like a
+    # log that cannot be fetched, so that it does not hold up the rest.
+    tenants = []
+    failures = 0
+    for config_path in args:
+        config_path = os.path.abspath(config_path)
+        # Use the directory of the config file to store the checkpoints
+        path = os.path.dirname(config_path)
+        try:
+            if options.child_accounts:
+                (admin_apis, skipped) = child_admin_apis_from_config(
+                    config_path)
+                failures += skipped
+            else:
+                admin_apis = [admin_api_from_config(config_path)]
+        except Exception as e:
+            report_setup_failure(config_path, e)
+            failures += 1
+            continue
+        for admin_api in admin_apis:
+            tenants.append((admin_api, path))
+
+    output = open_output(options.output, options.compress)
+    sink = make_sink(options.format, output)
+    if options.backfill is not None:
+        failures += run_backfill(tenants, mintime, maxtime,
+                                 options.shards, options.workers,
+                                 options.checkpoint_backend, sink)
     else:
-        config_path = os.path.abspath(sys.argv[1])
-
-    admin_api = admin_api_from_config(config_path)
-
-    # Use the directory of the config file to store the last event tstamps
-    path = os.path.dirname(config_path)
-
-    for logclass in (AdministratorLog, AuthenticationLog, TelephonyLog):
-        log = logclass(admin_api, path)
-        log.run()
+        failures += run_logs(tenants, options.workers,
+                             options.checkpoint_backend, sink,
+                             options.format, options.format_processes,
+                             enrich=options.enrich, merge=options.merge)
+    sink.close()
+    if failures:
+        sys.exit(1)
 
 
 if __name__ == '__main__':
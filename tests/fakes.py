@@ -0,0 +1,59 @@
+"""
+Fakes shared by the client tests, answering API calls in-process.
+"""
+
+import json
+import StringIO
+
+
+class FakeResponse(object):
+    """
+    Stands in for the httplib.HTTPResponse of an API call.
+    """
+    reason = 'OK'
+
+    def __init__(self, status=200, headers=None, body=''):
+        self.status = status
+        self.headers = headers or {}
+        self.read = StringIO.StringIO(body).read
+        self.closed = False
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name, default)
+
+    def close(self):
+        self.closed = True
+
+
+def json_response(response, status=200, **members):
+    """
+    Return a (response, data) tuple for an OK JSON body holding
+    response, and any other top-level members (e.g. metadata).
+    """
+    body = {'stat': 'OK', 'response': response}
+    body.update(members)
+    return (FakeResponse(status), json.dumps(body))
+
+
+class FakeTransport(object):
+    """
+    Mixin for a client class, e.g. (FakeTransport, duo_client.auth.Auth),
+    answering requests with respond(method, path, params) instead of
+    sending them. Subclasses implement respond() to return a
+    (response, data) tuple or raise.
+
+    requests - (method, path, params) of every request, shared with
+               copies made by with_timeout() and with_deadline().
+    """
+
+    def __init__(self, **kwargs):
+        super(FakeTransport, self).__init__('ikey', 'skey', 'example.com',
+                                            **kwargs)
+        self.requests = []
+
+    def respond(self, method, path, params):
+        raise NotImplementedError
+
+    def _signed_request(self, method, path, params, stream=False):
+        self.requests.append((method, path, params))
+        return self.respond(method, path, params)
@@ -0,0 +1,132 @@
+import threading
+import unittest
+
+from duo_client import backfill
+from duo_client.checkpoint import Checkpoints
+
+
+class MemoryStore(object):
+    def __init__(self):
+        self.state = {}
+
+    def load(self):
+        return dict(self.state)
+
+    def save(self, state):
+        self.state = dict(state)
+
+
+class PagingAdmin(object):
+    """
+    Serves up to page_size authentication events with timestamp >=
+    mintime, like the logs API.
+    """
+    host = 'api-test.example.com'
+    account_id = None
+
+    def __init__(self, events, page_size=10, fail_at=None):
+        self.events = events
+        self.page_size = page_size
+        self.fail_at = fail_at
+        self.lock = threading.Lock()
+        self.requests = []
+
+    def iter_authentication_log(self, mintime=0):
+        with self.lock:
+            self.requests.append(mintime)
+        if self.fail_at is not None and mintime >= self.fail_at:
+            raise RuntimeError('fetch failed')
+        page = [e for e in self.events if e['timestamp'] >= mintime]
+        return iter(page[:self.page_size])
+
+
+def make_backfill(admin, *args, **kwargs):
+    return backfill.Backfill(admin, *args, page_size=admin.page_size,
+                             **kwargs)
+
+
+def make_events(count):
+    # Two events per second, to exercise shard and page boundaries.
+    return [{'timestamp': 1000 + i // 2, 'username': 'user%d' % i,
+             'eventtype': 'authentication'} for i in range(count)]
+
+
+class TestSplitRange(unittest.TestCase):
+    def test_split(self):
+        self.assertEqual(backfill.split_range(0, 10, 3),
+                         [(0, 3), (3, 6), (6, 10)])
+        self.assertEqual(backfill.split_range(0, 2, 8), [(0, 1), (1, 2)])
+
+
+class TestBackfill(unittest.TestCase):
+    def test_events_in_order(self):
+        events = make_events(200)
+        admin = PagingAdmin(events)
+        job = make_backfill(admin, 1000, 1100, shards=7, workers=3,
+                                queue_size=1)
+        self.assertEqual(list(job.events()), events)
+        # Every shard started at its own window.
+        for (start, end) in job.shards:
+            self.assertTrue(start in admin.requests)
+
+    def test_maxtime_exclusive(self):
+        events = make_events(200)
+        admin = PagingAdmin(events)
+        job = make_backfill(admin, 1010, 1050, shards=4)
+        self.assertEqual(list(job.events()), events[20:100])
+
+    def test_resume(self):
+        events = make_events(200)
+        checkpoints = Checkpoints(MemoryStore())
+        job = make_backfill(PagingAdmin(events), 1000, 1100, shards=4,
+                                checkpoints=checkpoints)
+        delivered = []
+        for event in job.events():
+            delivered.append(event)
+            if len(delivered) == 75:
+                break
+        # A new run skips batches whose consumption was recorded and
+        # redelivers at most the batch in progress.
+        admin = PagingAdmin(events)
+        job = make_backfill(admin, 1000, 1100, shards=4,
+                                checkpoints=checkpoints)
+        rest = list(job.events())
+        self.assertEqual(rest[-125:], events[75:])
+        self.assertTrue(len(rest) <= 125 + admin.page_size)
+        self.assertTrue(1000 not in admin.requests)
+        # Finished shards are not fetched again.
+        admin = PagingAdmin(events)
+        job = make_backfill(admin, 1000, 1100, shards=4,
+                                checkpoints=checkpoints)
+        self.assertEqual(list(job.events()), [])
+        self.assertEqual(admin.requests, [])
+
+    def test_full_page_of_one_timestamp(self):
+        # A full page of events already delivered, all at one timestamp,
+        # does not end the shard early.
+        events = ([{'timestamp': 1000, 'username': 'user%d' % i}
+                   for i in range(15)]
+                  + [{'timestamp': 1001 + i, 'username': 'late%d' % i}
+                     for i in range(5)])
+        job = make_backfill(PagingAdmin(events), 1000, 1100, shards=1)
+        self.assertEqual(list(job.events()), events[:10] + events[15:])
+
+    def test_child_accounts_have_own_checkpoints(self):
+        events = make_events(40)
+        checkpoints = Checkpoints(MemoryStore())
+        for account_id in ('DA1', 'DA2'):
+            admin = PagingAdmin(events)
+            admin.account_id = account_id
+            job = make_backfill(admin, 1000, 1100, shards=2,
+                                checkpoints=checkpoints)
+            self.assertEqual(list(job.events()), events)
+
+    def test_error(self):
+        admin = PagingAdmin(make_events(200), fail_at=1060)
+        job = make_backfill(admin, 1000, 1100, shards=2)
+        events = job.events()
+        self.assertRaises(RuntimeError, list, events)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import threading
+import unittest
+
+from duo_client.cache import Cache
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCache(unittest.TestCase):
+    def test_lru(self):
+        cache = Cache(maxsize=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.lookup('a'), 1)
+        cache.put('c', 3)
+        # b was the least recently used.
+        self.assertEqual(cache.lookup('b'), None)
+        self.assertEqual(cache.lookup('a'), 1)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+    def test_ttl(self):
+        clock = FakeClock()
+        cache = Cache(ttl=10, ttl_for=lambda v: 10 if v else 2, clock=clock)
+        self.assertEqual(cache.get('yes', lambda: True), True)
+        self.assertEqual(cache.get('no', lambda: False), False)
+        clock.now = 5
+        self.assertEqual(cache.get('yes', lambda: 'reloaded'), True)
+        self.assertEqual(cache.get('no', lambda: 'reloaded'), 'reloaded')
+        clock.now = 11
+        self.assertEqual(cache.get('yes', lambda: 'reloaded'), 'reloaded')
+        self.assertEqual(cache.loads, 4)
+
+    def test_single_flight(self):
+        cache = Cache()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def load():
+            calls.append(1)
+            started.set()
+            release.wait()
+            return 'value'
+
+        results = []
+        threads = [threading.Thread(
+            target=lambda: results.append(cache.get('k', load)))
+            for _ in range(5)]
+        threads[0].start()
+        started.wait()
+        for thread in threads[1:]:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['value'] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.loads, 1)
+
+    def test_errors_not_cached(self):
+        cache = Cache()
+
+        def fail():
+            raise ValueError('down')
+
+        self.assertRaises(ValueError, cache.get, 'k', fail)
+        self.assertEqual(cache.get('k', lambda: 1), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
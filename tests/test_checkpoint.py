@@ -0,0 +1,66 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from duo_client import checkpoint
+
+
+class CountingStore(object):
+    def __init__(self):
+        self.state = {}
+        self.saves = 0
+
+    def load(self):
+        return dict(self.state)
+
+    def save(self, state):
+        self.state = dict(state)
+        self.saves += 1
+
+
+class TestStores(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def check_round_trip(self, store):
+        self.assertEqual(store.load(), {})
+        state = {'authentication/host': {'timestamp': 5, 'seen': ['ab']},
+                 'telephony/host': {'timestamp': 7, 'seen': []}}
+        store.save(state)
+        self.assertEqual(store.load(), state)
+        del state['telephony/host']
+        store.save(state)
+        self.assertEqual(store.load(), state)
+
+    def test_file(self):
+        path = os.path.join(self.tmpdir, 'ckpt.json')
+        self.check_round_trip(checkpoint.FileCheckpointStore(path))
+        self.assertEqual(os.listdir(self.tmpdir), ['ckpt.json'])
+
+    def test_sqlite(self):
+        path = os.path.join(self.tmpdir, 'ckpt.sqlite')
+        self.check_round_trip(checkpoint.SQLiteCheckpointStore(path))
+
+
+class TestCheckpoints(unittest.TestCase):
+    def test_batched_commit(self):
+        store = CountingStore()
+        store.state = {'a': 1}
+        checkpoints = checkpoint.Checkpoints(store)
+        self.assertEqual(checkpoints.get('a'), 1)
+        checkpoints.commit()
+        self.assertEqual(store.saves, 0)
+        checkpoints.set('a', 2)
+        checkpoints.set('b', 3)
+        self.assertEqual(store.state, {'a': 1})
+        checkpoints.commit()
+        self.assertEqual(store.saves, 1)
+        self.assertEqual(store.state, {'a': 2, 'b': 3})
+
+
+if __name__ == '__main__':
+    unittest.main()
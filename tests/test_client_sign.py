@@ -121,6 +121,19 @@ class TestSign(unittest.TestCase):
         self.assertEqual(actual,
                          expected)
 
+    def test_signer(self):
+        params = duo_client.client.encode_params(
+            {u'realname': u'F\xefrst L\xe4st', 'username': 'root'})
+        skey = u'gtdfxv9YgVBYcF6dl2Eq17KUQJN2PLM2ODVTkvoT'
+        signer = duo_client.client.Signer('test_ikey', skey)
+        for sig_version in (1, 2):
+            args = ('POST', 'foO.BAr52.cOm', '/Foo/BaR2/qux',
+                    'Fri, 07 Dec 2012 17:18:00 -0000', sig_version, params)
+            expected = duo_client.client.sign('test_ikey', skey, *args)
+            # Signing twice must not reuse state from the first call.
+            self.assertEqual(signer.sign(*args), expected)
+            self.assertEqual(signer.sign(*args), expected)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,260 @@
+import BaseHTTPServer
+import httplib
+import json
+import socket
+import threading
+import time
+import unittest
+
+import duo_client.client
+from duo_client.connection_pool import ConnectionPool
+
+
+class FakeConnection(object):
+    def __init__(self):
+        self.sock = object()
+        self.closed = False
+        self.connected = False
+
+    def connect(self):
+        self.connected = True
+
+    def close(self):
+        self.sock = None
+        self.closed = True
+
+
+class TestConnectionPool(unittest.TestCase):
+    def test_reuse(self):
+        pool = ConnectionPool(FakeConnection)
+        (conn, reused) = pool.get()
+        self.assertFalse(reused)
+        pool.put(conn)
+        self.assertEqual(pool.get(), (conn, True))
+
+    def test_bounded(self):
+        pool = ConnectionPool(FakeConnection, maxsize=1)
+        conns = [pool.get()[0] for _ in range(3)]
+        for conn in conns:
+            pool.put(conn)
+        self.assertEqual(pool.idle_count(), 1)
+        self.assertEqual([c.closed for c in conns], [False, True, True])
+
+    def test_idle_timeout(self):
+        pool = ConnectionPool(FakeConnection, idle_timeout=0)
+        (conn, _) = pool.get()
+        pool.put(conn)
+        time.sleep(0.01)
+        (new_conn, reused) = pool.get()
+        self.assertFalse(reused)
+        self.assertTrue(conn.closed)
+        self.assertFalse(new_conn is conn)
+
+    def test_warm(self):
+        pool = ConnectionPool(FakeConnection, maxsize=3)
+        self.assertEqual(pool.warm(2), 2)
+        self.assertEqual(pool.warm(2), 0)
+        self.assertEqual(pool.warm(5), 1)
+        self.assertEqual(pool.idle_count(), 3)
+        (conn, reused) = pool.get()
+        self.assertTrue(reused)
+        self.assertTrue(conn.connected)
+
+    def test_concurrent_warm(self):
+        started = threading.Event()
+        release = threading.Event()
+        created = []
+
+        def factory():
+            conn = FakeConnection()
+            conn.connect = lambda: (started.set(), release.wait(5))
+            created.append(conn)
+            return conn
+
+        pool = ConnectionPool(factory, maxsize=5)
+        thread = threading.Thread(target=pool.warm, args=(3,))
+        thread.start()
+        started.wait(5)
+        # The connections being opened by the first call count.
+        self.assertEqual(pool.warm(3), 0)
+        self.assertEqual(pool.warm(4), 1)
+        release.set()
+        thread.join(5)
+        self.assertEqual(len(created), 4)
+        self.assertEqual(pool.idle_count(), 4)
+
+    def test_failed_warm(self):
+        def refuse():
+            raise socket.error('Connection refused')
+
+        def factory():
+            conn = FakeConnection()
+            if refusing:
+                conn.connect = refuse
+            return conn
+
+        refusing = True
+        pool = ConnectionPool(factory, maxsize=3)
+        self.assertRaises(socket.error, pool.warm, 2)
+        # The failed call no longer counts as warming.
+        refusing = False
+        self.assertEqual(pool.warm(2), 2)
+        self.assertEqual(pool.idle_count(), 2)
+
+    def test_closed_connection_not_pooled(self):
+        pool = ConnectionPool(FakeConnection)
+        (conn, _) = pool.get()
+        conn.close()
+        pool.put(conn)
+        self.assertEqual(pool.idle_count(), 0)
+
+
+class FakeHTTPResponse(object):
+    status = 200
+    reason = 'OK'
+    will_close = False
+
+    def read(self, amt=None):
+        return '{"stat": "OK", "response": "pong"}'
+
+    def isclosed(self):
+        return True
+
+    def close(self):
+        pass
+
+
+class ScriptedConnection(object):
+    """
+    A connection over an idle socket whose getresponse() raises error,
+    or answers if error is None.
+    """
+
+    def __init__(self, error=None):
+        (self.sock, self.peer) = socket.socketpair()
+        self.error = error
+        self.requests = []
+
+    def request(self, method, uri, body=None, headers=None):
+        self.requests.append(method)
+
+    def getresponse(self):
+        if self.error is not None:
+            raise self.error
+        return FakeHTTPResponse()
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.peer.close()
+        self.sock = None
+
+
+class TestStaleConnectionReplay(unittest.TestCase):
+    def setUp(self):
+        self.fresh = []
+        self.client = duo_client.client.Client('ikey', 'skey',
+                                               'example.com')
+        self.client._new_connection = self.new_connection
+
+    def new_connection(self):
+        conn = ScriptedConnection()
+        self.fresh.append(conn)
+        return conn
+
+    def request(self, method, error):
+        stale = ScriptedConnection(error)
+        self.client._get_pool().put(stale)
+        try:
+            self.client._make_request(method, '/auth/v2/check', None, {})
+        finally:
+            self.sent = stale.requests + [
+                m for conn in self.fresh for m in conn.requests]
+
+    def test_get_replayed_when_closed(self):
+        self.request('GET', httplib.BadStatusLine("''"))
+        self.assertEqual(self.sent, ['GET', 'GET'])
+
+    def test_post_not_replayed(self):
+        self.assertRaises(httplib.BadStatusLine, self.request,
+                          'POST', httplib.BadStatusLine("''"))
+        self.assertEqual(self.sent, ['POST'])
+
+    def test_timeout_not_replayed(self):
+        self.assertRaises(socket.timeout, self.request,
+                          'GET', socket.timeout('timed out'))
+        self.assertEqual(self.sent, ['GET'])
+
+    def test_dropped_connection_not_used(self):
+        stale = ScriptedConnection()
+        stale.peer.close()
+        self.client._get_pool().put(stale)
+        self.client._make_request('POST', '/auth/v2/auth', '', {})
+        self.assertEqual(stale.requests, [])
+        self.assertEqual(self.fresh[0].requests, ['POST'])
+
+
+class KeepAliveHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.connections.add(self.client_address)
+        body = json.dumps({'stat': 'OK', 'response': 'pong'})
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        if self.server.close_after_response:
+            self.close_connection = 1
+
+    def log_message(self, *args):
+        pass
+
+
+class TestClientKeepAlive(unittest.TestCase):
+    def setUp(self):
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0),
+                                                KeepAliveHandler)
+        self.server.connections = set()
+        self.server.close_after_response = False
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.client = duo_client.client.Client(
+            'test_ikey', 'test_skey',
+            '127.0.0.1:%d' % self.server.server_port,
+            ca_certs='HTTP',
+        )
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connection_reused(self):
+        for _ in range(3):
+            self.assertEqual(
+                self.client.json_api_call('GET', '/auth/v2/ping', {}),
+                'pong')
+        self.assertEqual(len(self.server.connections), 1)
+
+    def test_warm_connections(self):
+        # The test server handles one connection at a time.
+        self.assertEqual(self.client.warm_connections(1), 1)
+        self.assertEqual(
+            self.client.json_api_call('GET', '/auth/v2/ping', {}), 'pong')
+        self.assertEqual(self.client.warm_connections(1), 0)
+        self.assertEqual(len(self.server.connections), 1)
+
+    def test_reconnect_when_server_closes(self):
+        self.server.close_after_response = True
+        for _ in range(3):
+            self.assertEqual(
+                self.client.json_api_call('GET', '/auth/v2/ping', {}),
+                'pong')
+        self.assertEqual(len(self.server.connections), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
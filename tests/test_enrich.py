@@ -0,0 +1,73 @@
+import unittest
+
+from duo_client.enrich import Enricher
+
+
+class FakeAdmin(object):
+    def __init__(self):
+        self.calls = []
+        self.users = [
+            {'username': 'user%d' % i, 'email': 'user%d@example.com' % i,
+             'realname': 'User %d' % i, 'status': 'active',
+             'groups': [{'name': 'Staff'}],
+             'phones': [{'platform': 'Apple iOS'},
+                        {'platform': 'Google Android'}]}
+            for i in range(10)
+        ]
+        self.integrations = [{'name': 'VPN', 'type': 'radius',
+                              'integration_key': 'DIVPN'}]
+
+    def iter_users(self, limit):
+        self.calls.append('iter_users')
+        return iter(self.users)
+
+    def iter_integrations(self, limit):
+        self.calls.append('iter_integrations')
+        return iter(self.integrations)
+
+    def get_users_by_name(self, username):
+        self.calls.append('get_users_by_name')
+        return [u for u in self.users if u['username'] == username]
+
+
+def auth(username, integration='VPN'):
+    return {'timestamp': 1, 'eventtype': 'authentication',
+            'username': username, 'integration': integration}
+
+
+class TestEnricher(unittest.TestCase):
+    def test_enrich(self):
+        admin = FakeAdmin()
+        enricher = Enricher(admin)
+        events = [auth('user%d' % (i % 10)) for i in range(1000)]
+        events.append(auth('nobody'))
+        events.append(auth('nobody', integration='Unknown'))
+        enriched = list(enricher.iter_enrich(events))
+        self.assertEqual(enriched[0]['user_email'], 'user0@example.com')
+        self.assertEqual(enriched[0]['user_groups'], 'Staff')
+        self.assertEqual(enriched[0]['user_phone_platforms'],
+                         'Apple iOS, Google Android')
+        self.assertEqual(enriched[0]['integration_type'], 'radius')
+        self.assertFalse('user_email' in enriched[-1])
+        self.assertFalse('integration_type' in enriched[-1])
+        # Events are copied, not modified.
+        self.assertFalse('user_email' in events[0])
+        # One lookup per distinct user, one integration list.
+        self.assertEqual(admin.calls.count('get_users_by_name'), 11)
+        self.assertEqual(admin.calls.count('iter_integrations'), 1)
+
+    def test_warm(self):
+        admin = FakeAdmin()
+        enricher = Enricher(admin)
+        enricher.warm()
+        list(enricher.iter_enrich(auth('user%d' % i) for i in range(10)))
+        self.assertEqual(admin.calls, ['iter_users', 'iter_integrations'])
+
+    def test_other_eventtypes(self):
+        enricher = Enricher(FakeAdmin())
+        event = {'eventtype': 'administrator', 'username': 'user1'}
+        self.assertTrue(enricher.enrich(event) is event)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import threading
+import time
+import unittest
+
+import duo_client.client
+from duo_client.executor import Executor
+
+
+class TestExecutor(unittest.TestCase):
+    def test_submit(self):
+        executor = Executor(2)
+        future = executor.submit(lambda x, y: x + y, 1, y=2)
+        self.assertEqual(future.result(timeout=5), 3)
+        self.assertEqual(future.exception(), None)
+        executor.shutdown()
+
+    def test_exception(self):
+        executor = Executor(1)
+        future = executor.submit(lambda: 1 / 0)
+        self.assertRaises(ZeroDivisionError, future.result, 5)
+        self.assertTrue(isinstance(future.exception(), ZeroDivisionError))
+        executor.shutdown()
+
+    def test_failing_callback(self):
+        # A raising callback must not kill the only worker.
+        executor = Executor(1)
+        called = []
+        future = executor.submit(time.sleep, 0.05)
+        future.add_done_callback(lambda f: 1 / 0)
+        future.add_done_callback(lambda f: called.append(True))
+        future.result(timeout=5)
+        self.assertEqual(executor.submit(lambda: 'x').result(timeout=5), 'x')
+        self.assertEqual(called, [True])
+        executor.shutdown()
+
+    def test_done_callback(self):
+        executor = Executor(1)
+        called = []
+        future = executor.submit(lambda: 'x')
+        future.result(timeout=5)
+        future.add_done_callback(lambda f: called.append(f.result()))
+        self.assertEqual(called, ['x'])
+        executor.shutdown()
+
+    def test_imap_order_and_concurrency(self):
+        executor = Executor(4)
+        active = [0, 0]
+        lock = threading.Lock()
+
+        def work(i):
+            with lock:
+                active[0] += 1
+                active[1] = max(active)
+            time.sleep(0.01 * (5 - i % 5))
+            with lock:
+                active[0] -= 1
+            return i * 2
+
+        results = [f.result() for (_, f) in executor.imap(work, range(20))]
+        executor.shutdown()
+        self.assertEqual(results, [i * 2 for i in range(20)])
+        self.assertTrue(1 < active[1] <= 4)
+
+
+class FakeClient(duo_client.client.Client):
+    def add_user(self, username):
+        if username == 'bad':
+            raise RuntimeError('Received 400 Invalid request parameters')
+        return {'username': username}
+
+
+class TestClientMap(unittest.TestCase):
+    def test_map(self):
+        client = FakeClient('ikey', 'skey', 'example.com')
+        kwargs_list = [{'username': name} for name in ('a', 'bad', 'c')]
+        results = client.map('add_user', kwargs_list, max_workers=2)
+        self.assertEqual([r.kwargs for r in results], kwargs_list)
+        self.assertEqual(results[0].result, {'username': 'a'})
+        self.assertEqual(results[0].error, None)
+        self.assertEqual(results[1].result, None)
+        self.assertTrue(isinstance(results[1].error, RuntimeError))
+        self.assertEqual(results[2].result, {'username': 'c'})
+
+    def test_submit(self):
+        client = FakeClient('ikey', 'skey', 'example.com')
+        futures = [client.submit('add_user', username=name)
+                   for name in ('a', 'bad')]
+        self.assertEqual(futures[0].result(timeout=5), {'username': 'a'})
+        self.assertRaises(RuntimeError, futures[1].result, 5)
+        client.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
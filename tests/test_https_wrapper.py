@@ -0,0 +1,118 @@
+import os
+import socket
+import ssl
+import threading
+import unittest
+
+from duo_client import https_wrapper
+
+# Self-signed certificate and key for DNS name localhost.
+LOCALHOST_PEM = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'localhost.pem')
+
+
+def requires_ssl_context(test):
+    return unittest.skipUnless(https_wrapper._HAS_SSL_CONTEXT,
+                               'ssl.SSLContext is not available')(test)
+
+
+class TestSSLContextCache(unittest.TestCase):
+    def setUp(self):
+        https_wrapper._ssl_contexts.clear()
+        self.addCleanup(https_wrapper._ssl_contexts.clear)
+
+    @requires_ssl_context
+    def test_shared(self):
+        context = https_wrapper._GetSSLContext(LOCALHOST_PEM)
+        self.assertIs(https_wrapper._GetSSLContext(LOCALHOST_PEM), context)
+        self.assertEqual(context.verify_mode, ssl.CERT_REQUIRED)
+
+    @requires_ssl_context
+    def test_keyed_by_files(self):
+        verified = https_wrapper._GetSSLContext(LOCALHOST_PEM)
+        unverified = https_wrapper._GetSSLContext(None)
+        with_cert = https_wrapper._GetSSLContext(
+            LOCALHOST_PEM, LOCALHOST_PEM, LOCALHOST_PEM)
+        self.assertIsNot(verified, unverified)
+        self.assertIsNot(verified, with_cert)
+        self.assertEqual(unverified.verify_mode, ssl.CERT_NONE)
+        self.assertIs(https_wrapper._GetSSLContext(
+            LOCALHOST_PEM, LOCALHOST_PEM, LOCALHOST_PEM), with_cert)
+
+
+class TLSServer(object):
+    """
+    Accepts TLS connections on 127.0.0.1 with the localhost certificate
+    until closed.
+    """
+
+    def __init__(self):
+        self.listener = socket.socket()
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(5)
+        self.port = self.listener.getsockname()[1]
+        self.thread = threading.Thread(target=self._serve)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _serve(self):
+        while True:
+            try:
+                (sock, _) = self.listener.accept()
+            except socket.error:
+                return
+            sock.settimeout(5)
+            try:
+                tls = ssl.wrap_socket(sock, server_side=True,
+                                      certfile=LOCALHOST_PEM)
+                tls.close()
+            except (socket.error, ssl.SSLError):
+                sock.close()
+
+    def close(self):
+        self.listener.shutdown(socket.SHUT_RDWR)
+        self.listener.close()
+        self.thread.join(5)
+
+
+class TestCertificateHostname(unittest.TestCase):
+    def setUp(self):
+        self.server = TLSServer()
+        self.addCleanup(self.server.close)
+
+    def connection(self, host):
+        conn = https_wrapper.CertValidatingHTTPSConnection(
+            host, self.server.port, ca_certs=LOCALHOST_PEM, timeout=5)
+        self.addCleanup(conn.close)
+        return conn
+
+    def test_matching_host(self):
+        conn = self.connection('localhost')
+        conn.connect()
+        self.assertTrue(conn.sock.getpeercert())
+
+    def test_mismatch(self):
+        conn = self.connection('127.0.0.1')
+        try:
+            conn.connect()
+        except https_wrapper.InvalidCertificateException as e:
+            self.assertEqual(e.host, '127.0.0.1')
+        else:
+            self.fail('InvalidCertificateException not raised')
+
+    def test_mismatch_through_tunnel(self):
+        # The certificate is checked against the tunnelled API host, not
+        # the proxy (here, the server itself, as if it had tunnelled).
+        conn = self.connection('localhost')
+        conn.set_tunnel('api-test.example.com')
+        conn._tunnel = lambda: None
+        try:
+            conn.connect()
+        except https_wrapper.InvalidCertificateException as e:
+            self.assertEqual(e.host, 'api-test.example.com')
+        else:
+            self.fail('InvalidCertificateException not raised')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import json
+import StringIO
+import unittest
+
+import duo_client.client
+from duo_client import jsonstream
+from fakes import FakeResponse
+from fakes import FakeTransport
+
+
+def stream(body, chunk_size=1):
+    envelope = {}
+    items = list(jsonstream.iter_response(StringIO.StringIO(body).read,
+                                          envelope,
+                                          chunk_size=chunk_size))
+    return (items, envelope)
+
+
+class TestIterResponse(unittest.TestCase):
+    def test_matches_json_loads(self):
+        data = {
+            'stat': 'OK',
+            'response': [
+                {'username': u'j\xf6rg ☃', 'timestamp': 1234567890},
+                [1, 2.5, None, True, False],
+                12345,
+                'a "quoted" string',
+                {},
+            ],
+            'metadata': {'next_offset': 100},
+        }
+        body = json.dumps(data, indent=1)
+        for chunk_size in (1, 3, 7, 4096):
+            (items, envelope) = stream(body, chunk_size)
+            self.assertEqual(items, json.loads(body)['response'])
+            self.assertEqual(envelope, {'stat': 'OK',
+                                        'metadata': {'next_offset': 100}})
+
+    def test_utf8_split_across_chunks(self):
+        body = '{"response": ["\xe2\x98\x83"], "stat": "OK"}'
+        self.assertEqual(stream(body, 1)[0], [u'☃'])
+
+    def test_empty(self):
+        self.assertEqual(stream('{"stat": "OK", "response": []}'),
+                         ([], {'stat': 'OK'}))
+        self.assertEqual(stream('{}'), ([], {}))
+
+    def test_errors(self):
+        for body in ('', '[]', '{"response": {}}', '{"response": [1, 2',
+                     '{"stat": "OK"'):
+            self.assertRaises(ValueError, stream, body)
+
+
+class StreamClient(FakeTransport, duo_client.client.Client):
+    def __init__(self, body):
+        super(StreamClient, self).__init__()
+        self.response = FakeResponse(body=body)
+
+    def respond(self, method, path, params):
+        return (self.response, None)
+
+
+class TestJsonStreamApiCall(unittest.TestCase):
+    def test_ok(self):
+        client = StreamClient('{"response": [1, 2, 3], "stat": "OK"}')
+        self.assertEqual(
+            list(client.json_stream_api_call('GET', '/x', {})), [1, 2, 3])
+        self.assertTrue(client.response.closed)
+
+    def test_fail_envelope(self):
+        client = StreamClient('{"stat": "FAIL", "message": "nope"}')
+        self.assertRaises(RuntimeError, list,
+                          client.json_stream_api_call('GET', '/x', {}))
+
+    def test_bad_body(self):
+        client = StreamClient('<html>')
+        self.assertRaises(RuntimeError, list,
+                          client.json_stream_api_call('GET', '/x', {}))
+
+
+if __name__ == '__main__':
+    unittest.main()
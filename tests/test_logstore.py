@@ -0,0 +1,59 @@
+import unittest
+
+from duo_client.logstore import EventStore
+
+
+def auth(timestamp, username, ip, result, integration='VPN'):
+    return {'timestamp': timestamp, 'eventtype': 'authentication',
+            'host': 'api-test.example.com', 'username': username, 'ip': ip,
+            'result': result, 'factor': 'Duo Push',
+            'integration': integration}
+
+
+EVENTS = [
+    auth(100, 'alice', '198.51.100.7', 'FAILURE'),
+    auth(110, 'alice', '198.51.100.7', 'SUCCESS'),
+    auth(120, 'alice', '203.0.113.9', 'FAILURE'),
+    auth(130, 'bob', '198.51.100.7', 'FAILURE', integration='Web'),
+    {'timestamp': 125, 'eventtype': 'telephony', 'host': 'api-test',
+     'context': 'authentication', 'type': 'sms', 'phone': '+15555550100',
+     'credits': 1},
+]
+
+
+class TestEventStore(unittest.TestCase):
+    def setUp(self):
+        self.store = EventStore(':memory:')
+        self.assertEqual(self.store.add(EVENTS), len(EVENTS))
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_dedup(self):
+        self.assertEqual(self.store.add(EVENTS[2:]), 0)
+        self.assertEqual(self.store.count(), len(EVENTS))
+
+    def test_query(self):
+        self.assertEqual(
+            self.store.query(username='alice', ip='198.51.100.7',
+                             result='FAILURE'),
+            [EVENTS[0]])
+        self.assertEqual(self.store.query(result='FAILURE', mintime=110,
+                                          maxtime=130),
+                         [EVENTS[2]])
+        self.assertEqual(self.store.query(integration=['VPN', 'Web'],
+                                          newest_first=True, limit=2),
+                         [EVENTS[3], EVENTS[2]])
+        self.assertEqual(self.store.query(eventtype='telephony'),
+                         [EVENTS[4]])
+        self.assertEqual(self.store.count(username='alice'), 3)
+        self.assertRaises(TypeError, self.store.query, phone='+1')
+
+    def test_latest_timestamp(self):
+        self.assertEqual(self.store.latest_timestamp(), 130)
+        self.assertEqual(self.store.latest_timestamp('telephony'), 125)
+        self.assertEqual(self.store.latest_timestamp('administrator'), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
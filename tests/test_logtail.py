@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from duo_client import logtail
+from duo_client.checkpoint import FileCheckpointStore
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakeAdmin(object):
+    """
+    Serves authentication log events with timestamp >= mintime.
+    """
+    host = 'api-test.example.com'
+
+    def __init__(self, page_size=1000):
+        self.events = []
+        self.requests = []
+        self.page_size = page_size
+
+    def iter_authentication_log(self, mintime=0):
+        self.requests.append(mintime)
+        page = [e for e in self.events if e['timestamp'] >= mintime]
+        return iter(page[:self.page_size])
+
+
+def event(timestamp, username):
+    return {'timestamp': timestamp, 'username': username,
+            'eventtype': 'authentication'}
+
+
+class TestEventHash(unittest.TestCase):
+    def test_stable_form(self):
+        # Stored cursors and event stores depend on this exact form.
+        event = {u'username': u'us\xe9r', 'timestamp': 10, 'ratio': 0.1,
+                 'access_device': {'os': 'Mac', 'ip': None},
+                 'factors': ['push', 2, True]}
+        self.assertEqual(
+            logtail.event_json(event),
+            json.dumps(event, sort_keys=True, separators=(',', ':')))
+        self.assertEqual(logtail.event_hash(event),
+                         hashlib.sha1(logtail.event_json(event)).hexdigest())
+
+
+class TestLogCursor(unittest.TestCase):
+    def test_boundary_dedup(self):
+        cursor = logtail.LogCursor()
+        first = [event(10, 'a'), event(11, 'b')]
+        self.assertEqual(list(cursor.filter(first)), first)
+        # A later fetch from mintime=11 returns b again plus a new event
+        # sharing its timestamp.
+        second = [event(11, 'b'), event(11, 'c'), event(12, 'd')]
+        self.assertEqual(list(cursor.filter(second)), second[1:])
+        self.assertEqual(cursor.timestamp, 12)
+
+    def test_round_trip(self):
+        cursor = logtail.LogCursor()
+        list(cursor.filter([event(5, 'a'), event(5, 'b')]))
+        copy = logtail.LogCursor.from_dict(cursor.to_dict())
+        self.assertEqual(list(copy.filter([event(5, 'a'), event(5, 'c')])),
+                         [event(5, 'c')])
+
+
+class TestLogTailer(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.store = FileCheckpointStore(os.path.join(self.tmpdir, 'ckpt'))
+        self.admin = FakeAdmin()
+        self.clock = FakeClock()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def make_tailer(self):
+        return logtail.LogTailer(self.admin, log_types=['authentication'],
+                                 checkpoint=self.store,
+                                 min_interval=60, max_interval=240,
+                                 clock=self.clock, sleep=self.clock.sleep,
+                                 page_size=self.admin.page_size)
+
+    def test_stream_and_resume(self):
+        self.admin.events = [event(10, 'a'), event(10, 'b')]
+        tailer = self.make_tailer()
+        stream = tailer.events()
+        self.assertEqual([next(stream), next(stream)], self.admin.events)
+
+        self.admin.events.append(event(10, 'c'))
+        self.assertEqual(next(stream), event(10, 'c'))
+        self.assertEqual(self.admin.requests, [0, 10])
+        self.assertEqual(self.clock.now, 60)
+
+        # A new tailer resumes from the checkpoint. The batch holding c
+        # was not finished, so c is delivered again; a and b are not.
+        self.admin.events.append(event(20, 'd'))
+        tailer = self.make_tailer()
+        stream = tailer.events()
+        self.assertEqual([next(stream), next(stream)],
+                         [event(10, 'c'), event(20, 'd')])
+        self.assertEqual(self.admin.requests[-1], 10)
+
+    def test_backoff_when_idle(self):
+        tailer = self.make_tailer()
+        for _ in range(4):
+            tailer.poll('authentication')
+        self.assertEqual(tailer._interval['authentication'], 240)
+        self.admin.events = [event(1, 'a')]
+        tailer.poll('authentication')
+        self.assertEqual(tailer._interval['authentication'], 60)
+
+    def test_full_page_of_one_timestamp(self):
+        # More events share timestamp 10 than fit in a page; the tailer
+        # must not keep fetching the same page.
+        self.admin = FakeAdmin(page_size=3)
+        self.admin.events = ([event(10, 'user%d' % i) for i in range(5)]
+                             + [event(11, 'z')])
+        tailer = self.make_tailer()
+        self.assertEqual(tailer.poll('authentication'),
+                         self.admin.events[:3])
+        self.assertEqual(tailer.poll('authentication'), [])
+        self.assertEqual(tailer.cursors['authentication'].timestamp, 11)
+        self.assertEqual(tailer.poll('authentication'), [event(11, 'z')])
+        self.assertEqual(self.admin.requests, [0, 10, 11])
+        # The skip was saved.
+        self.assertEqual(self.store.load()['authentication']['timestamp'],
+                         11)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+
+from duo_client import merge
+
+
+def event(timestamp, eventtype, name, host='api-a'):
+    return {'timestamp': timestamp, 'eventtype': eventtype, 'host': host,
+            'name': name}
+
+
+class TestMergeEvents(unittest.TestCase):
+    def test_order_and_dedup(self):
+        auth = [event(1, 'authentication', 'a1'),
+                event(3, 'authentication', 'a3'),
+                event(3, 'authentication', 'a3b')]
+        admin = [event(2, 'administrator', 'd2'),
+                 event(3, 'administrator', 'd3')]
+        other_host = [event(1, 'authentication', 'a1', host='api-b'),
+                      event(4, 'telephony', 't4', host='api-b')]
+        merged = list(merge.merge_events(
+            [iter(auth), iter(admin), iter([]), iter(other_host),
+             # A fetch overlapping the first one.
+             iter(auth[1:])]))
+        self.assertEqual(
+            [(e['timestamp'], e['name'], e['host']) for e in merged],
+            [(1, 'a1', 'api-a'), (1, 'a1', 'api-b'), (2, 'd2', 'api-a'),
+             (3, 'a3', 'api-a'), (3, 'a3b', 'api-a'), (3, 'd3', 'api-a'),
+             (4, 't4', 'api-b')])
+
+    def test_lazy(self):
+        def stream():
+            yield event(1, 'authentication', 'x')
+            raise AssertionError('read too far')
+
+        merged = merge.merge_events([stream()])
+        self.assertEqual(next(merged)['name'], 'x')
+
+
+class TestWatermarkMerger(unittest.TestCase):
+    def names(self, events):
+        return [e['name'] for e in events]
+
+    def test_waits_for_watermarks(self):
+        merger = merge.WatermarkMerger(['auth', 'admin'])
+        merger.add('auth', [event(1, 'authentication', 'a1'),
+                            event(5, 'authentication', 'a5')])
+        # admin has not been polled yet.
+        self.assertEqual(list(merger.ready()), [])
+        merger.add('admin', [event(3, 'administrator', 'd3')])
+        self.assertEqual(self.names(merger.ready()), ['a1'])
+        # A poll with no new events still advances the watermark.
+        merger.add('admin', [], watermark=10)
+        self.assertEqual(self.names(merger.ready()), ['d3'])
+        merger.add('auth', [event(5, 'authentication', 'a5')],
+                   watermark=6)
+        self.assertEqual(self.names(merger.ready()), ['a5'])
+        merger.remove('auth')
+        merger.add('admin', [event(12, 'administrator', 'd12')])
+        self.assertEqual(self.names(merger.flush()), ['d12'])
+
+    def test_bounded(self):
+        merger = merge.WatermarkMerger(['fast', 'slow'], max_buffered=2)
+        merger.add('fast', [event(t, 'authentication', 'f%d' % t)
+                            for t in (1, 2, 3, 4)])
+        self.assertEqual(self.names(merger.ready()), ['f1', 'f2'])
+        # Over the limit again: s0 is emitted late rather than kept.
+        merger.add('slow', [event(0, 'telephony', 's0')])
+        self.assertEqual(self.names(merger.ready()), ['s0'])
+        self.assertEqual(merger.late, 1)
+        self.assertEqual(self.names(merger.flush()), ['f3', 'f4'])
+
+
+if __name__ == '__main__':
+    unittest.main()
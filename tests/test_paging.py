@@ -0,0 +1,66 @@
+import unittest
+
+import duo_client.admin
+from fakes import FakeTransport
+from fakes import json_response
+
+
+class PagedAdmin(FakeTransport, duo_client.admin.Admin):
+    """
+    Serves /admin/v1/users from a fixed list, honoring limit/offset.
+    """
+    def __init__(self, users):
+        super(PagedAdmin, self).__init__()
+        self.users = users
+
+    def respond(self, method, path, params):
+        limit = int(params['limit'])
+        offset = int(params['offset'])
+        metadata = {'total_objects': len(self.users)}
+        if offset + limit < len(self.users):
+            metadata['next_offset'] = offset + limit
+        return json_response(self.users[offset:offset + limit],
+                             metadata=metadata)
+
+
+class TestPaging(unittest.TestCase):
+    def setUp(self):
+        self.users = [{'username': 'user%d' % i} for i in range(7)]
+
+    def test_iter_users(self):
+        admin = PagedAdmin(self.users)
+        self.assertEqual(list(admin.iter_users(limit=3)), self.users)
+        self.assertEqual([p['offset'] for (_, _, p) in admin.requests],
+                         ['0', '3', '6'])
+
+    def test_prefetch(self):
+        admin = PagedAdmin(self.users)
+        self.assertEqual(list(admin.iter_users(limit=2, prefetch=True)),
+                         self.users)
+        self.assertEqual(len(admin.requests), 4)
+        admin.close()
+
+    def test_prefetch_from_worker(self):
+        # With one submit() worker, prefetching must not need another.
+        admin = PagedAdmin(self.users)
+        admin.pool_size = 1
+        future = admin.submit(
+            lambda: list(admin.iter_users(limit=2, prefetch=True)))
+        self.assertEqual(future.result(timeout=5), self.users)
+        admin.close()
+
+    def test_lazy(self):
+        admin = PagedAdmin(self.users)
+        users = admin.iter_users(limit=3)
+        self.assertEqual(next(users), self.users[0])
+        self.assertEqual(len(admin.requests), 1)
+
+    def test_unpaged_response(self):
+        admin = PagedAdmin(self.users)
+        admin.respond = lambda method, path, params: json_response(
+            self.users)
+        self.assertEqual(list(admin.iter_users(limit=3)), self.users)
+
+
+if __name__ == '__main__':
+    unittest.main()
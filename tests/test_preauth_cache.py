@@ -0,0 +1,80 @@
+import threading
+import unittest
+
+import duo_client.auth
+from fakes import FakeTransport
+from fakes import json_response
+
+
+class FakeAuth(FakeTransport, duo_client.auth.Auth):
+    """
+    Answers preauth with 'deny' for usernames starting with 'locked',
+    and 'auth' otherwise.
+    """
+    def __init__(self):
+        super(FakeAuth, self).__init__()
+        self.release = threading.Event()
+        self.release.set()
+
+    def respond(self, method, path, params):
+        self.release.wait()
+        result = 'auth'
+        if params['username'].startswith('locked'):
+            result = 'deny'
+        return json_response({'result': result, 'devices': []})
+
+
+class TestPreauthCache(unittest.TestCase):
+    def setUp(self):
+        self.clock = [0.0]
+        self.auth = FakeAuth()
+        self.auth.preauth_cache = duo_client.auth.PreauthCache(
+            ttl=5, negative_ttl=30, clock=lambda: self.clock[0])
+
+    def test_ttl(self):
+        auth = self.auth
+        first = auth.preauth(username='alice', ipaddr='10.0.0.1')
+        first['devices'].append('modified')
+        self.assertEqual(auth.preauth(username='alice', ipaddr='10.0.0.1'),
+                         {'result': 'auth', 'devices': []})
+        auth.preauth(username='alice', ipaddr='10.0.0.2')
+        self.assertEqual(len(auth.requests), 2)
+        self.clock[0] = 6
+        auth.preauth(username='alice', ipaddr='10.0.0.1')
+        self.assertEqual(len(auth.requests), 3)
+        cache = auth.preauth_cache
+        self.assertEqual((cache.hits, cache.misses), (1, 3))
+
+    def test_negative_ttl(self):
+        auth = self.auth
+        auth.preauth(username='locked1')
+        self.clock[0] = 20
+        self.assertEqual(auth.preauth(username='locked1')['result'], 'deny')
+        self.assertEqual(len(auth.requests), 1)
+
+    def test_single_flight(self):
+        auth = self.auth
+        auth.release.clear()
+        results = []
+        threads = [threading.Thread(
+            target=lambda: results.append(auth.preauth(username='bob')))
+            for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        while auth.preauth_cache.misses < 5:
+            threading.Event().wait(0.001)
+        auth.release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(results), 5)
+        self.assertEqual(len(auth.requests), 1)
+
+    def test_disabled(self):
+        auth = FakeAuth()
+        auth.preauth(username='alice')
+        auth.preauth(username='alice')
+        self.assertEqual(len(auth.requests), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
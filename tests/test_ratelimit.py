@@ -0,0 +1,104 @@
+import socket
+import unittest
+
+import duo_client.client
+from duo_client.ratelimit import RetryPolicy
+from duo_client.ratelimit import TokenBucket
+from fakes import FakeResponse
+from fakes import FakeTransport
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_burst_then_steady_rate(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, burst=3, clock=clock, sleep=clock.sleep)
+        waits = [bucket.acquire() for _ in range(6)]
+        self.assertEqual(waits[:3], [0, 0, 0])
+        for wait in waits[3:]:
+            self.assertAlmostEqual(wait, 0.5)
+        self.assertAlmostEqual(clock.now, 1001.5)
+
+    def test_penalize(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=100, burst=10, clock=clock,
+                             sleep=clock.sleep)
+        bucket.penalize(5)
+        self.assertAlmostEqual(bucket.acquire(), 5)
+
+
+    def test_spaced_after_penalty(self):
+        # Callers queued during a penalty are not all released when it
+        # ends, which would trigger another 429.
+        clock = FakeClock()
+        bucket = TokenBucket(rate=10, burst=10, clock=clock,
+                             sleep=clock.sleep)
+        bucket.penalize(2)
+        waits = [bucket._reserve() for _ in range(25)]
+        for (i, wait) in enumerate(waits):
+            self.assertAlmostEqual(wait, 2 + i * 0.1)
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def test_should_retry(self):
+        policy = RetryPolicy(max_retries=2)
+        self.assertTrue(policy.should_retry(0, 'POST', status=429))
+        self.assertFalse(policy.should_retry(2, 'POST', status=429))
+        self.assertTrue(policy.should_retry(0, 'GET', status=503))
+        self.assertFalse(policy.should_retry(0, 'POST', status=503))
+        self.assertFalse(policy.should_retry(0, 'GET', status=400))
+        self.assertTrue(policy.should_retry(0, 'GET', error=socket.error()))
+        self.assertFalse(policy.should_retry(0, 'POST', error=socket.error()))
+
+    def test_backoff(self):
+        policy = RetryPolicy(backoff_factor=1, max_backoff=3)
+        for attempt in range(5):
+            self.assertTrue(0 <= policy.backoff(attempt) <= 3)
+        response = FakeResponse(429, {'Retry-After': '2'})
+        self.assertEqual(policy.backoff(0, response), 2)
+
+
+class ScriptedClient(FakeTransport, duo_client.client.Client):
+    def __init__(self, statuses, **kwargs):
+        super(ScriptedClient, self).__init__(**kwargs)
+        self.statuses = list(statuses)
+
+    def respond(self, method, path, params):
+        return (FakeResponse(self.statuses.pop(0)), '')
+
+
+class TestClientRetry(unittest.TestCase):
+    def test_no_policy(self):
+        client = ScriptedClient([429, 200])
+        (response, _) = client.api_call('GET', '/admin/v1/users', {})
+        self.assertEqual(response.status, 429)
+
+    def test_retries_until_success(self):
+        client = ScriptedClient(
+            [429, 503, 200],
+            retry_policy=RetryPolicy(backoff_factor=0))
+        (response, _) = client.api_call('GET', '/admin/v1/users', {})
+        self.assertEqual(response.status, 200)
+        self.assertEqual(len(client.requests), 3)
+
+    def test_gives_up(self):
+        client = ScriptedClient(
+            [429, 429],
+            retry_policy=RetryPolicy(max_retries=1, backoff_factor=0))
+        (response, _) = client.api_call('POST', '/admin/v1/users', {})
+        self.assertEqual(response.status, 429)
+        self.assertEqual(len(client.requests), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
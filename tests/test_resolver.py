@@ -0,0 +1,205 @@
+import errno
+import socket
+import threading
+import time
+import unittest
+
+from duo_client import resolver
+
+V4 = (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('192.0.2.1', 443))
+V4B = (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('192.0.2.2', 443))
+V6 = (socket.AF_INET6, socket.SOCK_STREAM, 6, '', ('2001:db8::1', 443, 0, 0))
+V6B = (socket.AF_INET6, socket.SOCK_STREAM, 6, '', ('2001:db8::2', 443, 0, 0))
+
+
+class FakeGetaddrinfo(object):
+    def __init__(self, addresses):
+        self.addresses = addresses
+        self.calls = 0
+
+    def __call__(self, host, port, family, socktype):
+        self.calls += 1
+        if getattr(self, 'block', None) is not None:
+            self.block.wait()
+        if isinstance(self.addresses, Exception):
+            raise self.addresses
+        return list(self.addresses)
+
+
+def local_address(port):
+    return (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('127.0.0.1', port))
+
+
+def hanging_socket():
+    """
+    Return a non-blocking socket that select() never reports writable,
+    like a connect to an address that drops packets, and its peer, which
+    must be kept open until the socket is done with.
+    """
+    (sock, peer) = socket.socketpair()
+    sock.setblocking(0)
+    try:
+        while True:
+            sock.send('x' * 65536)
+    except socket.error as e:
+        if e.args[0] not in (errno.EAGAIN, errno.EWOULDBLOCK):
+            raise
+    return (sock, peer)
+
+
+class TestResolver(unittest.TestCase):
+    def test_interleave(self):
+        self.assertEqual(resolver.interleave([V6, V6B, V4, V4B]),
+                         [V6, V4, V6B, V4B])
+        self.assertEqual(resolver.interleave([V4, V4B, V6]), [V4, V6, V4B])
+
+    def test_cached(self):
+        getaddrinfo = FakeGetaddrinfo([V4, V6])
+        res = resolver.Resolver(getaddrinfo=getaddrinfo)
+        for _ in range(3):
+            self.assertEqual(res.resolve('example.com', 443), [V4, V6])
+        self.assertEqual(getaddrinfo.calls, 1)
+        res.invalidate('example.com', 443)
+        res.resolve('example.com', 443)
+        self.assertEqual(getaddrinfo.calls, 2)
+
+    def test_expiry(self):
+        now = [0]
+        getaddrinfo = FakeGetaddrinfo([V4])
+        res = resolver.Resolver(ttl=10, getaddrinfo=getaddrinfo,
+                                clock=lambda: now[0])
+        res.resolve('example.com', 443)
+        now[0] = 11
+        res.resolve('example.com', 443)
+        self.assertEqual(getaddrinfo.calls, 2)
+
+    def test_lookup_timeout(self):
+        getaddrinfo = FakeGetaddrinfo([V4])
+        getaddrinfo.block = threading.Event()
+        res = resolver.Resolver(getaddrinfo=getaddrinfo)
+        start = time.time()
+        self.assertRaises(socket.timeout, res.resolve, 'example.com', 443,
+                          timeout=0.2)
+        self.assertTrue(time.time() - start < 2)
+        # The abandoned lookup still fills the cache.
+        getaddrinfo.block.set()
+        self.assertEqual(res.resolve('example.com', 443, timeout=5), [V4])
+        self.assertEqual(getaddrinfo.calls, 1)
+
+    def test_lookup_with_timeout_counted_once(self):
+        res = resolver.Resolver(getaddrinfo=FakeGetaddrinfo([V4]))
+        res.resolve('example.com', 443, timeout=5)
+        self.assertEqual((res.cache.hits, res.cache.misses,
+                          res.cache.loads), (0, 1, 1))
+        res.resolve('example.com', 443, timeout=5)
+        self.assertEqual((res.cache.hits, res.cache.misses,
+                          res.cache.loads), (1, 1, 1))
+
+    def test_failure_not_cached(self):
+        getaddrinfo = FakeGetaddrinfo(socket.gaierror('no such host'))
+        res = resolver.Resolver(getaddrinfo=getaddrinfo)
+        for _ in range(2):
+            self.assertRaises(socket.gaierror, res.resolve, 'nxdomain', 443)
+        self.assertEqual(getaddrinfo.calls, 2)
+
+
+class TestConnect(unittest.TestCase):
+    def setUp(self):
+        self.server = socket.socket()
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(5)
+        self.port = self.server.getsockname()[1]
+        # A port nothing listens on.
+        closed = socket.socket()
+        closed.bind(('127.0.0.1', 0))
+        self.closed_port = closed.getsockname()[1]
+        closed.close()
+
+    def tearDown(self):
+        self.server.close()
+
+    def patch_start(self, hanging):
+        """
+        Make connect attempts to the addresses in hanging never finish.
+        Return the list of (time, address, socket) of every attempt.
+        """
+        attempts = []
+        real_start = resolver._start
+
+        def start(address):
+            if address in hanging:
+                (sock, peer) = hanging_socket()
+                self.addCleanup(peer.close)
+                result = (sock, False)
+            else:
+                result = real_start(address)
+            attempts.append((time.time(), address, result[0]))
+            return result
+
+        resolver._start = start
+        self.addCleanup(setattr, resolver, '_start', real_start)
+        return attempts
+
+    def test_connect(self):
+        sock = resolver.connect([local_address(self.port)], timeout=5)
+        self.assertEqual(sock.getpeername(), ('127.0.0.1', self.port))
+        self.assertEqual(sock.gettimeout(), None)
+        sock.close()
+
+    def test_failed_address_skipped_at_once(self):
+        start = time.time()
+        sock = resolver.connect([local_address(self.closed_port),
+                                 local_address(self.port)],
+                                timeout=5, delay=10)
+        self.assertTrue(time.time() - start < 5)
+        self.assertEqual(sock.getpeername()[1], self.port)
+        sock.close()
+
+    def test_race_past_hanging_address(self):
+        attempts = self.patch_start([V4])
+        start = time.time()
+        sock = resolver.connect([V4, local_address(self.port)],
+                                timeout=5, delay=0.2)
+        self.assertTrue(time.time() - start < 2)
+        self.assertEqual(sock.getpeername(), ('127.0.0.1', self.port))
+        sock.close()
+        # The second attempt started after the delay, not before.
+        self.assertEqual([a[1] for a in attempts],
+                         [V4, local_address(self.port)])
+        self.assertTrue(attempts[1][0] - attempts[0][0] >= 0.15)
+        # The losing attempt was abandoned.
+        self.assertEqual(attempts[0][2].fileno(), -1)
+
+    def test_timeout_with_attempts_in_flight(self):
+        attempts = self.patch_start([V4, V4B])
+        start = time.time()
+        self.assertRaises(socket.timeout, resolver.connect, [V4, V4B],
+                          timeout=0.3, delay=0.1)
+        elapsed = time.time() - start
+        self.assertTrue(0.25 <= elapsed < 2)
+        self.assertEqual([a[1] for a in attempts], [V4, V4B])
+        for (_, _, sock) in attempts:
+            self.assertEqual(sock.fileno(), -1)
+
+    def test_all_fail(self):
+        self.assertRaises(socket.error, resolver.connect,
+                          [local_address(self.closed_port)], timeout=5)
+
+    def test_create_connection(self):
+        getaddrinfo = FakeGetaddrinfo([local_address(self.port)])
+        res = resolver.Resolver(getaddrinfo=getaddrinfo)
+        sock = resolver.create_connection('example.com', self.port,
+                                          connect_timeout=5,
+                                          read_timeout=2, resolver=res)
+        self.assertEqual(sock.gettimeout(), 2)
+        sock.close()
+        getaddrinfo.addresses = [local_address(self.closed_port)]
+        self.assertRaises(socket.error, resolver.create_connection,
+                          'example.com', self.closed_port, resolver=res)
+        # A failed connect drops the cached addresses.
+        self.assertEqual(
+            res.cache.lookup(('example.com', self.closed_port)), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+
+from duo_client import rollup
+
+
+def auth(timestamp, username, result='SUCCESS', factor='Duo Push',
+         integration='VPN'):
+    return {'timestamp': timestamp, 'eventtype': 'authentication',
+            'username': username, 'result': result, 'factor': factor,
+            'integration': integration}
+
+
+class TestHyperLogLog(unittest.TestCase):
+    def test_count(self):
+        for n in (0, 10, 1000, 50000):
+            hll = rollup.HyperLogLog()
+            for i in range(n):
+                hll.add('user%d' % i)
+                hll.add('user%d' % i)
+            self.assertTrue(abs(hll.count() - n) <= max(1, n * 0.05),
+                            (n, hll.count()))
+
+    def test_merge(self):
+        a = rollup.HyperLogLog()
+        b = rollup.HyperLogLog()
+        for i in range(3000):
+            a.add(str(i))
+            b.add(str(i + 1500))
+        a.merge(b)
+        self.assertTrue(abs(a.count() - 4500) < 225)
+
+
+class TestRollup(unittest.TestCase):
+    def test_windows(self):
+        rollups = rollup.AuthRollups()
+        rollups.add_many([
+            auth(0, 'alice'),
+            auth(30, 'bob', result='FAILURE'),
+            auth(60, 'alice', result='FAILURE'),
+            auth(3600, 'carol', integration='Web'),
+        ])
+        self.assertEqual(rollups.counts('hour', 'result'),
+                         {'SUCCESS': 2, 'FAILURE': 2})
+        self.assertEqual(rollups.counts('hour', 'integration', mintime=3600),
+                         {'Web': 1})
+        self.assertEqual(rollups.series('minute', 'result', 'FAILURE',
+                                        maxtime=3600),
+                         [(0, 1), (60, 1)])
+        self.assertEqual(rollups.total('day'), 4)
+        self.assertEqual(rollups.distinct_users('day'), 3)
+        self.assertEqual(rollups.distinct_users('hour', maxtime=3600), 2)
+
+    def test_ring_expiry(self):
+        ring = rollup.Rollup(width=60, slots=3)
+        for minute in range(5):
+            ring.add(auth(minute * 60, 'alice'))
+        self.assertEqual(ring.series('result', 'SUCCESS'),
+                         [(120, 1), (180, 1), (240, 1)])
+        ring.add(auth(60, 'late'))
+        self.assertEqual(ring.dropped, 1)
+        self.assertEqual(ring.total(), 3)
+
+    def test_bounded_keys(self):
+        ring = rollup.Rollup(width=60, slots=1, max_keys=10)
+        for i in range(100):
+            ring.add(auth(0, 'frequent'))
+            ring.add(auth(0, 'user%d' % i))
+        counts = ring.counts('username')
+        self.assertTrue(len(counts) <= 10)
+        self.assertEqual(counts['frequent'], 100)
+        self.assertEqual(sum(counts.values()), 200)
+        self.assertTrue(abs(ring.distinct_users() - 101) <= 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
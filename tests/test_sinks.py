@@ -0,0 +1,168 @@
+import copy
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from cStringIO import StringIO
+
+from duo_client import sinks
+
+EVENTS = [
+    {'timestamp': 1000 + i, 'eventtype': 'authentication',
+     'host': 'api-test.duosecurity.com', 'username': u'user\xe9%d' % i,
+     'factor': 'push', 'result': 'success'}
+    for i in range(25)
+]
+
+
+class CountingOutput(object):
+    def __init__(self):
+        self.writes = []
+
+    def write(self, data):
+        self.writes.append(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def getvalue(self):
+        return ''.join(self.writes)
+
+
+class TestSinks(unittest.TestCase):
+    def setUp(self):
+        self.events = copy.deepcopy(EVENTS)
+
+    def write(self, sink):
+        sink.write_many(self.events)
+        sink.flush()
+        # Sinks must not modify the events.
+        self.assertEqual(self.events, EVENTS)
+
+    def test_buffering(self):
+        output = CountingOutput()
+        sink = sinks.NDJSONSink(output, buffer_size=1000)
+        sink.write_many(self.events)
+        # ~140 byte lines: a few large writes, not one per event.
+        self.assertTrue(0 < len(output.writes) < 5)
+        sink.flush()
+        lines = output.getvalue().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], EVENTS)
+
+    def test_csv(self):
+        output = CountingOutput()
+        self.write(sinks.CSVSink(output, ['timestamp', 'username', 'ip']))
+        lines = output.getvalue().splitlines()
+        self.assertEqual(lines[0], 'timestamp,username,ip')
+        self.assertEqual(lines[1], '1000,user\xc3\xa90,')
+        self.assertEqual(len(lines), 26)
+
+    def test_write_formatted(self):
+        # Chunks formatted elsewhere are appended after buffered events.
+        chunk = CountingOutput()
+        fields = ['timestamp', 'username']
+        self.write(sinks.CSVSink(chunk, fields, header=False))
+        output = CountingOutput()
+        sink = sinks.CSVSink(output, fields)
+        sink.write(EVENTS[0])
+        sink.write_formatted(chunk.getvalue())
+        sink.flush()
+        lines = output.getvalue().splitlines()
+        self.assertEqual(lines[0], 'timestamp,username')
+        self.assertEqual(len(lines), 27)
+        self.assertEqual(lines[1], lines[2])
+
+    def test_hec_batches(self):
+        batches = []
+        sink = sinks.SplunkHECSink(send=batches.append, batch_size=10)
+        self.write(sink)
+        self.assertEqual(len(batches), 3)
+        decoder = json.JSONDecoder()
+        batch = batches[0]
+        (first, end) = decoder.raw_decode(batch)
+        self.assertEqual(first['time'], 1000)
+        self.assertEqual(first['sourcetype'], 'duo:authentication')
+        self.assertEqual(first['event'], EVENTS[0])
+        self.assertEqual(batch.count('"sourcetype"'), 10)
+
+    def test_columnar_round_trip(self):
+        output = CountingOutput()
+        self.write(sinks.ColumnarSink(output, block_size=10))
+        lines = output.getvalue().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(json.loads(lines[2])['rows'], 5)
+        events = list(sinks.read_columnar(StringIO(output.getvalue())))
+        self.assertEqual(events, EVENTS)
+
+
+class TestOpenOutput(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_gzip(self):
+        path = os.path.join(self.tmpdir, 'events.ndjson.gz')
+        sink = sinks.NDJSONSink(sinks.open_output(path, 'gzip'))
+        sink.write_many(EVENTS)
+        sink.close()
+        lines = gzip.open(path).read().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], EVENTS)
+
+    def test_gzip_file_closed(self):
+        path = os.path.join(self.tmpdir, 'events.gz')
+        output = sinks.open_output(path, 'gzip')
+        fileobj = output.fileobj
+        output.write('data')
+        output.close()
+        self.assertTrue(fileobj.closed)
+        self.assertEqual(gzip.open(path).read(), 'data')
+
+    def test_gzip_stdout_left_open(self):
+        stdout = StringIO()
+        self.addCleanup(setattr, sys, 'stdout', sys.stdout)
+        sys.stdout = stdout
+        output = sinks.open_output('-', 'gzip')
+        output.write('data')
+        output.close()
+        self.assertFalse(stdout.closed)
+        reader = gzip.GzipFile(fileobj=StringIO(stdout.getvalue()))
+        self.assertEqual(reader.read(), 'data')
+
+    def test_zstd(self):
+        if sinks.zstandard is None:
+            self.skipTest('zstandard is not installed')
+        path = os.path.join(self.tmpdir, 'events.ndjson.zst')
+        sink = sinks.NDJSONSink(sinks.open_output(path, 'zstd'))
+        sink.write_many(EVENTS)
+        sink.close()
+        with open(path, 'rb') as f:
+            reader = sinks.zstandard.ZstdDecompressor().stream_reader(f)
+            data = reader.read()
+        lines = data.splitlines()
+        self.assertEqual([json.loads(line) for line in lines], EVENTS)
+
+    def test_zstd_stdout_left_open(self):
+        if sinks.zstandard is None:
+            self.skipTest('zstandard is not installed')
+        stdout = StringIO()
+        self.addCleanup(setattr, sys, 'stdout', sys.stdout)
+        sys.stdout = stdout
+        output = sinks.open_output('-', 'zstd')
+        output.write('data')
+        output.close()
+        self.assertFalse(stdout.closed)
+        reader = sinks.zstandard.ZstdDecompressor().stream_reader(
+            StringIO(stdout.getvalue()))
+        self.assertEqual(reader.read(), 'data')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from cStringIO import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'examples', 'splunk'))
+import splunk
+from duo_client.checkpoint import FileCheckpointStore
+
+
+class FakeAdmin(object):
+    host = 'api-test.duosecurity.com'
+    account_id = None
+
+    def __init__(self):
+        self.users_fail = False
+        self.log_fails = False
+        self.events = [
+            {'timestamp': 1000 + i, 'eventtype': 'authentication',
+             'host': self.host, 'username': 'user%d' % i,
+             'integration': 'VPN'}
+            for i in range(5)
+        ]
+
+    def get_administrator_log(self, mintime):
+        return []
+
+    def get_telephony_log(self, mintime):
+        return []
+
+    def get_authentication_log(self, mintime):
+        return [e for e in self.events if e['timestamp'] >= mintime]
+
+    def iter_authentication_log(self, mintime):
+        if self.log_fails:
+            raise RuntimeError('Received 429 Too Many Requests')
+        return iter(self.get_authentication_log(mintime))
+
+    def iter_users(self, limit):
+        if self.users_fail:
+            raise RuntimeError('Received 500 Internal server error')
+        return iter([{'username': 'user0', 'email': 'user0@example.com'}])
+
+    def iter_integrations(self, limit):
+        return iter([{'name': 'VPN', 'type': 'radius'}])
+
+    def get_users_by_name(self, username):
+        return []
+
+
+class TestRunLogs(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.admin = FakeAdmin()
+        self.stderr = StringIO()
+        self.addCleanup(setattr, sys, 'stderr', sys.stderr)
+        sys.stderr = self.stderr
+
+    def run_logs(self):
+        output = StringIO()
+        failures = splunk.run_logs([(self.admin, self.tmpdir)], workers=2,
+                                   sink=splunk.make_sink('ndjson', output),
+                                   format_name='ndjson', enrich=True)
+        events = [json.loads(line) for line in output.getvalue().splitlines()]
+        return (failures, events)
+
+    def checkpoint(self):
+        (_, filename) = splunk.CHECKPOINT_BACKENDS['file']
+        state = FileCheckpointStore(os.path.join(self.tmpdir, filename)).load()
+        return state.get('authentication/' + self.admin.host)
+
+    def test_enrich_failure_keeps_cursor(self):
+        self.admin.users_fail = True
+        (failures, events) = self.run_logs()
+        self.assertEqual(failures, 1)
+        self.assertEqual(events, [])
+        self.assertEqual(self.checkpoint(), None)
+        # The next run delivers the events instead of skipping them.
+        self.admin.users_fail = False
+        (failures, events) = self.run_logs()
+        self.assertEqual(failures, 0)
+        self.assertEqual([e['timestamp'] for e in events],
+                         [e['timestamp'] for e in self.admin.events])
+        self.assertEqual(events[0]['user_email'], 'user0@example.com')
+        self.assertEqual(self.checkpoint()['timestamp'], 1004)
+
+
+class TestRunBackfill(unittest.TestCase):
+    def setUp(self):
+        self.tmpdirs = [tempfile.mkdtemp() for _ in range(2)]
+        for tmpdir in self.tmpdirs:
+            self.addCleanup(shutil.rmtree, tmpdir)
+        self.stderr = StringIO()
+        self.addCleanup(setattr, sys, 'stderr', sys.stderr)
+        sys.stderr = self.stderr
+
+    def test_failed_tenant_does_not_stop_others(self):
+        (failing, working) = (FakeAdmin(), FakeAdmin())
+        failing.log_fails = True
+        output = StringIO()
+        failures = splunk.run_backfill(
+            [(failing, self.tmpdirs[0]), (working, self.tmpdirs[1])],
+            1000, 1005, shards=2, workers=2,
+            sink=splunk.make_sink('ndjson', output))
+        self.assertEqual(failures, 1)
+        self.assertTrue('429' in self.stderr.getvalue())
+        events = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual([e['timestamp'] for e in events],
+                         [e['timestamp'] for e in working.events])
+
+
+class TestClientOptions(unittest.TestCase):
+    def test_retry_policy(self):
+        options = splunk.client_options_from_config(
+            {'read_timeout': '30', 'max_retries': '7'})
+        self.assertEqual(options['read_timeout'], 30)
+        self.assertEqual(options['retry_policy'].max_retries, 7)
+        options = splunk.client_options_from_config({})
+        self.assertTrue(options['retry_policy'] is not None)
+
+
+if __name__ == '__main__':
+    unittest.main()
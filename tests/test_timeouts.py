@@ -0,0 +1,139 @@
+import BaseHTTPServer
+import socket
+import SocketServer
+import threading
+import time
+import unittest
+
+import duo_client.client
+from duo_client.ratelimit import RetryPolicy
+from duo_client.ratelimit import TokenBucket
+from fakes import FakeTransport
+
+
+class FailingClient(FakeTransport, duo_client.client.Client):
+    def respond(self, method, path, params):
+        raise socket.error('connection reset')
+
+
+class TestDeadline(unittest.TestCase):
+    def test_with_timeout_shares_connections(self):
+        client = duo_client.client.Client('ikey', 'skey', 'example.com',
+                                          read_timeout=30)
+        fast = client.with_timeout(read_timeout=2, deadline=5)
+        self.assertEqual((fast.read_timeout, fast.deadline), (2, 5))
+        self.assertEqual((client.read_timeout, client.deadline), (30, None))
+        self.assertTrue(fast._get_pool() is client._get_pool())
+        fast.submit(lambda: None).result()
+        self.assertEqual(len(client._executors), 1)
+        client.close()
+
+    def test_retries_stop_at_deadline(self):
+        client = FailingClient(
+            retry_policy=RetryPolicy(max_retries=100, backoff_factor=0.05,
+                                     max_backoff=0.05),
+            deadline=0.3)
+        start = time.time()
+        self.assertRaises(socket.error, client.api_call,
+                          'GET', '/admin/v1/users', {})
+        # Well short of the 100 retries' backoff, with slack for a busy
+        # machine.
+        self.assertTrue(time.time() - start < 1.5)
+        self.assertTrue(1 < len(client.requests) < 100)
+
+    def test_expired(self):
+        client = FailingClient().with_deadline(0)
+        self.assertRaises(duo_client.client.DeadlineExceeded,
+                          client.api_call, 'GET', '/auth/v2/check', {})
+        self.assertEqual(client.requests, [])
+
+    def test_rate_limit_wait_bounded(self):
+        limiter = TokenBucket(rate=10)
+        limiter.penalize(3)
+        client = FailingClient(rate_limiter=limiter, deadline=0.5)
+        start = time.time()
+        self.assertRaises(duo_client.client.DeadlineExceeded,
+                          client.api_call, 'GET', '/admin/v1/users', {})
+        self.assertTrue(time.time() - start < 0.1)
+        self.assertEqual(client.requests, [])
+
+    def test_with_deadline_spans_calls(self):
+        client = FailingClient(deadline=60)
+        bounded = client.with_deadline(10)
+        self.assertTrue(bounded._call_expires() <= time.time() + 10)
+        # An earlier expiry is kept.
+        self.assertEqual(bounded.with_deadline(20).expires, bounded.expires)
+        self.assertEqual(client.expires, None)
+
+
+class StallingHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests += 1
+        if self.server.answers <= 0:
+            self.server.stalled.wait(5)
+            return
+        self.server.answers -= 1
+        body = '{"stat": "OK", "response": "pong"}'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingHTTPServer(SocketServer.ThreadingMixIn,
+                          BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class TestStalledServer(unittest.TestCase):
+    def setUp(self):
+        # Threaded, so that a resent request would be seen.
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StallingHandler)
+        self.server.stalled = threading.Event()
+        self.server.requests = 0
+        self.server.answers = 0
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.client = duo_client.client.Client(
+            'ikey', 'skey', '127.0.0.1:%d' % self.server.server_port,
+            ca_certs='HTTP', read_timeout=30)
+
+    def tearDown(self):
+        self.server.stalled.set()
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_deadline_bounds_read(self):
+        start = time.time()
+        self.assertRaises(socket.timeout,
+                          self.client.with_timeout(deadline=0.2).api_call,
+                          'GET', '/auth/v2/ping', {})
+        self.assertTrue(0.15 < time.time() - start < 2)
+
+    def test_timeout_on_reused_connection_not_resent(self):
+        self.server.answers = 1
+        self.client.api_call('GET', '/auth/v2/ping', {})
+        start = time.time()
+        self.assertRaises(socket.timeout,
+                          self.client.with_timeout(deadline=0.3).api_call,
+                          'GET', '/auth/v2/ping', {})
+        self.assertTrue(time.time() - start < 0.6)
+        self.assertEqual(self.server.requests, 2)
+
+    def test_read_timeout(self):
+        start = time.time()
+        self.assertRaises(socket.timeout,
+                          self.client.with_timeout(read_timeout=0.2).api_call,
+                          'GET', '/auth/v2/ping', {})
+        self.assertTrue(time.time() - start < 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+import socket
+import threading
+import time
+import unittest
+
+import duo_client.auth
+import duo_client.auth_v1
+from duo_client import txwatch
+from fakes import FakeTransport
+from fakes import json_response
+
+
+class FakeAuth(FakeTransport, duo_client.auth.Auth):
+    """
+    Transactions named 'txN-K' are allowed on the Kth status poll;
+    'never' ones keep waiting. Each poll takes a few milliseconds,
+    except for 'blocked' transactions: like a real long-poll whose user
+    does not answer, they hold the request until the call's deadline
+    and time out.
+
+    State is kept in mutable objects shared by with_deadline() copies.
+    """
+    def __init__(self):
+        super(FakeAuth, self).__init__()
+        self.lock = threading.Lock()
+        self.polls = {}
+        self.in_flight = {'now': 0, 'max': 0}
+        self.expiries = []
+
+    def _response(self, path, params):
+        if path == '/auth/v2/auth':
+            return {'txid': 'tx0-2'}
+        self.expiries.append(self.expires)
+        txid = params['txid']
+        with self.lock:
+            self.polls[txid] = self.polls.get(txid, 0) + 1
+            polls = self.polls[txid]
+        if txid != 'never' and polls >= int(txid.split('-')[1]):
+            return {'result': 'allow', 'status': 'allow',
+                    'status_msg': 'Success.'}
+        return {'result': 'waiting', 'status': 'pushed',
+                'status_msg': 'Pushed a login request to your phone.'}
+
+    def respond(self, method, path, params):
+        with self.lock:
+            self.in_flight['now'] += 1
+            self.in_flight['max'] = max(self.in_flight['max'],
+                                        self.in_flight['now'])
+        try:
+            if params.get('txid', '').startswith('blocked'):
+                time.sleep(max(0, self.expires - time.time()))
+                raise socket.timeout('timed out')
+            time.sleep(0.002)
+            return json_response(self._response(path, params))
+        finally:
+            with self.lock:
+                self.in_flight['now'] -= 1
+
+
+class FakeAuthV1(FakeTransport, duo_client.auth_v1.AuthV1):
+    def respond(self, method, path, params):
+        response = {'status': 'Pushed'}
+        if len(self.requests) == 2:
+            response = {'status': 'Success', 'result': 'allow'}
+        return json_response(response)
+
+
+class TestTransactionWatcher(unittest.TestCase):
+    def test_many_transactions(self):
+        auth = FakeAuth()
+        watcher = txwatch.TransactionWatcher(auth, max_workers=4)
+        done = []
+        futures = [watcher.watch('tx%d-%d' % (i, i % 4 + 1),
+                                 callback=done.append)
+                   for i in range(40)]
+        for future in futures:
+            self.assertEqual(future.result(timeout=10)['success'], True)
+        self.assertEqual(len(done), 40)
+        self.assertTrue(auth.in_flight['max'] <= 4)
+        self.assertEqual(auth.polls['tx3-4'], 4)
+        self.assertEqual(watcher.pending(), 0)
+        watcher.close()
+
+    def test_auth(self):
+        watcher = txwatch.TransactionWatcher(FakeAuth())
+        future = watcher.auth('push', username='alice', device='auto')
+        self.assertEqual(future.result(timeout=10)['status'], 'allow')
+        watcher.close()
+
+    def test_timeout(self):
+        watcher = txwatch.TransactionWatcher(FakeAuth(), timeout=0.02)
+        future = watcher.watch('never')
+        error = future.exception(timeout=10)
+        self.assertTrue(isinstance(error, txwatch.TransactionTimeout))
+        self.assertEqual(error.txid, 'never')
+        watcher.close()
+
+    def test_long_poll_deadline(self):
+        # Each long-poll is bounded by its transaction's remaining time.
+        auth = FakeAuth()
+        watcher = txwatch.TransactionWatcher(auth, timeout=5)
+        watcher.watch('tx1-3').result(timeout=10)
+        self.assertEqual(len(auth.expiries), 3)
+        for expires in auth.expiries:
+            self.assertTrue(time.time() < expires < time.time() + 5)
+        watcher.close()
+
+    def test_blocked_polls_share_workers(self):
+        # Transactions whose users never answer do not keep the workers
+        # from noticing another transaction's answer.
+        watcher = txwatch.TransactionWatcher(FakeAuth(), max_workers=2,
+                                             timeout=30, poll_slice=0.05)
+        for i in range(4):
+            watcher.watch('blocked%d' % i)
+        start = time.time()
+        status = watcher.watch('tx1-1').result(timeout=10)
+        self.assertTrue(status['success'])
+        self.assertTrue(time.time() - start < 1)
+        self.assertEqual(watcher.pending(), 4)
+        watcher.close()
+
+    def test_answer_noticed_within_max_poll_interval(self):
+        # With more waiting transactions than workers, long slices are
+        # cut so that each transaction is polled again in time.
+        watcher = txwatch.TransactionWatcher(FakeAuth(), max_workers=2,
+                                             timeout=60,
+                                             max_poll_interval=1.5)
+        for i in range(4):
+            watcher.watch('blocked%d' % i)
+        start = time.time()
+        # Answered on its second poll.
+        status = watcher.watch('tx1-2').result(timeout=30)
+        self.assertTrue(status['success'])
+        # Within twice max_poll_interval during a burst, with slack.
+        self.assertTrue(time.time() - start < 4.5)
+        watcher.close()
+
+    def test_close(self):
+        watcher = txwatch.TransactionWatcher(FakeAuth())
+        future = watcher.watch('never')
+        watcher.close()
+        self.assertTrue(isinstance(future.exception(timeout=10),
+                                   RuntimeError))
+        self.assertRaises(RuntimeError, watcher.watch, 'tx1-1')
+
+    def test_auth_v1(self):
+        watcher = txwatch.TransactionWatcher(FakeAuthV1())
+        status = watcher.watch('txid').result(timeout=10)
+        self.assertEqual((status['waiting'], status['success'],
+                          status['status']), (False, True, 'Success'))
+        watcher.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import socket
+import unittest
+
+import duo_client.client
+from duo_client import warmer
+from fakes import FakeTransport
+
+
+class FakeClient(FakeTransport, duo_client.client.Client):
+    def __init__(self):
+        super(FakeClient, self).__init__()
+        self.up = True
+        self.warmed = []
+
+    def warm_connections(self, count):
+        if not self.up:
+            raise socket.error('connection refused')
+        self.warmed.append(count)
+        return count
+
+    def respond(self, method, path, params):
+        raise socket.error('unused')
+
+    def ping(self):
+        return self.up
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        self.now += 0.5
+        return self.now
+
+
+class TestConnectionWarmer(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeClient()
+        self.warmer = warmer.ConnectionWarmer(
+            self.client, min_connections=3, interval=3600,
+            failure_threshold=2, clock=FakeClock())
+
+    def tearDown(self):
+        self.warmer.stop()
+
+    def test_rtt(self):
+        self.warmer.start()
+        self.assertEqual(self.client.warmed, [3])
+        self.assertEqual(self.warmer.rtt, 0.5)
+        self.assertEqual(self.warmer.srtt, 0.5)
+        self.assertTrue(self.warmer.healthy)
+
+    def test_fail_fast(self):
+        self.warmer.start()
+        self.client.up = False
+        self.assertFalse(self.warmer.probe())
+        # One failure is tolerated.
+        self.assertTrue(self.warmer.healthy)
+        self.assertRaises(socket.error, self.client.api_call,
+                          'GET', '/auth/v2/check', {})
+        self.assertFalse(self.warmer.probe())
+        self.assertFalse(self.warmer.healthy)
+        self.assertTrue(isinstance(self.warmer.last_error, socket.error))
+        requests = len(self.client.requests)
+        self.assertRaises(warmer.HostUnhealthy, self.client.api_call,
+                          'GET', '/auth/v2/check', {})
+        self.assertEqual(len(self.client.requests), requests)
+        # Recovers on the next successful ping.
+        self.client.up = True
+        self.assertTrue(self.warmer.probe())
+        self.assertTrue(self.warmer.healthy)
+        self.assertEqual(self.warmer.failures, 0)
+
+    def test_bad_ping_response(self):
+        # AuthV1.ping() returns False instead of raising.
+        self.client.ping = lambda: False
+        self.assertFalse(self.warmer.probe())
+        self.assertTrue(isinstance(self.warmer.last_error,
+                                   warmer.HostUnhealthy))
+
+    def test_stop(self):
+        self.warmer.start()
+        self.assertTrue(self.client.health is self.warmer)
+        self.warmer.stop()
+        self.assertTrue(self.client.health is None)
+
+
+if __name__ == '__main__':
+    unittest.main()